@@ -0,0 +1,136 @@
+# benchmarks/insert_rate.py
+#
+# Insert throughput in rows/s: one row at a time through SQL INSERT and
+# through Database.insert, and in batches through Database.insert_many.
+# The log runs with durability="async" so the numbers are the cost of
+# the insert path itself, not of fsync. The Table rows time the table's
+# own insert pipeline (checks, record build, indexes) without the log.
+# Each line is the best of REPEAT runs.
+#
+#     python -m benchmarks.insert_rate [rows] [batch]
+
+import gc
+import shutil
+import sys
+import tempfile
+import time
+
+from core.database import Database
+from core.table import Table
+from sql.executor import SQLExecutor
+from sql.parser import SQLParser
+
+
+SCHEMA = (
+    "CREATE TABLE users (id INT PRIMARY KEY, name TEXT, city TEXT, "
+    "age INT, email TEXT UNIQUE);"
+)
+
+CITIES = ("Nairobi", "Mombasa", "Kisumu", "Nakuru", "Eldoret")
+
+REPEAT = 3
+
+
+def make_row(i):
+    return {
+        "id": i,
+        "name": f"user{i}",
+        "city": CITIES[i % len(CITIES)],
+        "age": 20 + i % 50,
+        "email": f"user{i}@example.com",
+    }
+
+
+def run(label, count, fill):
+    best = min(_timed_db(count, fill) for _ in range(REPEAT))
+    print(f"{label:<28} {count / best:>10,.0f} rows/s")
+
+
+def _timed_db(count, fill):
+    data_dir = tempfile.mkdtemp(prefix="rdms-bench-")
+    db = Database(data_dir=data_dir, durability="async")
+    try:
+        executor = SQLExecutor(db)
+        executor.execute(SQLParser().parse(SCHEMA))
+
+        gc.collect()
+        start = time.perf_counter()
+        fill(db, executor, count)
+        return time.perf_counter() - start
+    finally:
+        db.close()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def run_table(label, count, fill):
+    rows = [make_row(i) for i in range(count)]
+    best = min(_timed_table(rows, fill) for _ in range(REPEAT))
+    print(f"{label:<28} {count / best:>10,.0f} rows/s")
+
+
+def _timed_table(rows, fill):
+    table = Table(
+        name="users",
+        columns={
+            "id": int, "name": str, "city": str, "age": int, "email": str
+        },
+        primary_key="id",
+        unique_keys=["email"],
+    )
+
+    gc.collect()
+    start = time.perf_counter()
+    fill(table, rows)
+    return time.perf_counter() - start
+
+
+def table_inserts(table, rows):
+    for row in rows:
+        table.insert(row)
+
+
+def table_batches(batch):
+    def fill(table, rows):
+        for start in range(0, len(rows), batch):
+            table.insert_many(rows[start : start + batch])
+    return fill
+
+
+def sql_inserts(db, executor, count):
+    parser = SQLParser()
+    for i in range(count):
+        row = make_row(i)
+        executor.execute(parser.parse(
+            f"INSERT INTO users VALUES ({row['id']}, '{row['name']}', "
+            f"'{row['city']}', {row['age']}, '{row['email']}');"
+        ))
+
+
+def api_inserts(db, executor, count):
+    for i in range(count):
+        db.insert("users", make_row(i))
+
+
+def batched_inserts(batch):
+    def fill(db, executor, count):
+        for start in range(0, count, batch):
+            db.insert_many(
+                "users",
+                [make_row(i) for i in range(start, min(start + batch, count))],
+            )
+    return fill
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    run("SQL INSERT, one row", count, sql_inserts)
+    run("Database.insert, one row", count, api_inserts)
+    run(f"Database.insert_many, {batch}", count, batched_inserts(batch))
+    run_table("Table.insert, one row", count, table_inserts)
+    run_table(f"Table.insert_many, {batch}", count, table_batches(batch))
+
+
+if __name__ == "__main__":
+    main()
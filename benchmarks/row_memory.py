@@ -0,0 +1,76 @@
+# benchmarks/row_memory.py
+#
+# Memory per stored row: plain dict rows (the previous representation)
+# against the compact records Table stores now, and the total per row
+# of a Table (records, segments, primary key index).
+#
+#     python -m benchmarks.row_memory [rows]
+
+import sys
+import tracemalloc
+
+from core.record import record_type
+from core.table import Table
+
+
+COLUMNS = {"id": int, "name": str, "city": str, "age": int, "email": str}
+
+
+def make_rows(count):
+    return [
+        {
+            "id": i,
+            "name": f"user{i}",
+            "city": ("Nairobi", "Mombasa", "Kisumu")[i % 3],
+            "age": 20 + i % 50,
+            "email": f"user{i}@example.com",
+        }
+        for i in range(count)
+    ]
+
+
+def measure(build, count):
+    """Bytes allocated per row by build(), values included."""
+    rows = make_rows(count)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(rows)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / count
+
+
+def dict_rows(rows):
+    # what Table.insert used to keep: a fresh full dict per row
+    return [{col: row.get(col) for col in COLUMNS} for row in rows]
+
+
+def record_rows(rows):
+    make = record_type(tuple(COLUMNS)).from_mapping
+    return [make(row) for row in rows]
+
+
+def table_rows(rows):
+    table = Table(name="users", columns=COLUMNS, primary_key="id")
+    table.insert_many(rows)
+    return table
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    as_dicts = measure(dict_rows, count)
+    as_records = measure(record_rows, count)
+    in_table = measure(table_rows, count)
+
+    print(f"{count} rows, {len(COLUMNS)} columns (values not counted)")
+    print(f"dict rows:   {as_dicts:7.1f} bytes/row")
+    print(f"record rows: {as_records:7.1f} bytes/row "
+          f"({100 * (1 - as_records / as_dicts):.0f}% less)")
+    print(f"table total: {in_table:7.1f} bytes/row "
+          f"(records, segments, PK index)")
+
+
+if __name__ == "__main__":
+    main()
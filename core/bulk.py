@@ -0,0 +1,160 @@
+# core/bulk.py
+
+import csv
+import json
+import os
+from itertools import islice
+
+
+DEFAULT_CHUNK_ROWS = 10000
+
+FORMATS = ("csv", "jsonl")
+
+
+class BulkError(Exception):
+    def __init__(self, message, row=None):
+        super().__init__(message)
+        # 0-based position of the offending row in its chunk, if known
+        self.row = row
+
+
+def detect_format(path, fmt=None):
+    """Explicit format, else from the file extension."""
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lower()
+        fmt = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}.get(ext)
+        if fmt is None:
+            raise BulkError(f"Cannot tell the format of '{path}'")
+
+    fmt = fmt.lower()
+    if fmt not in FORMATS:
+        raise BulkError(f"Unsupported format '{fmt}'")
+    return fmt
+
+
+# ================= COERCION =================
+
+def coerce_column(name, col_type, values):
+    """
+    Converts a whole column to col_type in one pass (NULLs kept).
+    Raises BulkError naming the first value that does not convert.
+    """
+    try:
+        if None not in values:
+            return list(map(col_type, values))
+        return [None if v is None else col_type(v) for v in values]
+    except (TypeError, ValueError):
+        pass
+
+    for i, v in enumerate(values):
+        try:
+            if v is not None:
+                col_type(v)
+        except (TypeError, ValueError):
+            raise BulkError(
+                f"Column '{name}' expects {col_type.__name__}", row=i
+            ) from None
+    raise BulkError(f"Column '{name}' expects {col_type.__name__}")
+
+
+def coerce_rows(columns, names, records):
+    """
+    Turns records (sequences of raw values in `names` order) into rows
+    typed by the `columns` schema, converting column by column.
+    """
+    for name in names:
+        if name not in columns:
+            raise BulkError(f"Unknown column '{name}'")
+
+    if not records:
+        return []
+
+    for i, record in enumerate(records):
+        if len(record) != len(names):
+            raise BulkError(
+                "Column count does not match value count", row=i
+            )
+
+    converted = [
+        coerce_column(name, columns[name], list(values))
+        for name, values in zip(names, zip(*records))
+    ]
+    return [dict(zip(names, values)) for values in zip(*converted)]
+
+
+# ================= READ =================
+
+def read_chunks(path, columns, fmt=None, header=True,
+                chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Streams (names, records) chunks of at most chunk_rows records.
+    CSV: the header names the columns (else the schema order is used)
+    and empty fields are NULL. JSON Lines: one object per line.
+    """
+    fmt = detect_format(path, fmt)
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            reader = csv.reader(f)
+            names = list(columns)
+            if header:
+                names = [n.strip() for n in next(reader, [])]
+
+            while True:
+                chunk = list(islice(reader, chunk_rows))
+                if not chunk:
+                    return
+                yield names, [
+                    [v if v != "" else None for v in record]
+                    for record in chunk if record
+                ]
+
+        names = list(columns)
+        known = set(names)
+        while True:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                return
+
+            records = []
+            for line in lines:
+                if not line.strip():
+                    continue
+                obj = json.loads(line)
+                unknown = obj.keys() - known
+                if unknown:
+                    raise BulkError(f"Unknown column '{min(unknown)}'")
+                records.append([obj.get(n) for n in names])
+            yield names, records
+
+
+# ================= WRITE =================
+
+def write_rows(path, columns, rows, fmt=None):
+    """
+    Writes an iterable of rows as it goes; returns the row count.
+    NULL is an empty field in CSV and null in JSON Lines.
+    """
+    fmt = detect_format(path, fmt)
+    names = list(columns)
+    count = 0
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(names)
+            for row in rows:
+                writer.writerow(
+                    ["" if row[n] is None else row[n] for n in names]
+                )
+                count += 1
+        else:
+            encode = json.JSONEncoder().encode
+            for row in rows:
+                f.write(encode({n: row[n] for n in names}))
+                f.write("\n")
+                count += 1
+
+    os.replace(tmp, path)
+    return count
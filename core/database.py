@@ -1,8 +1,35 @@
+from collections import OrderedDict
+from functools import partial
 from typing import Dict
 import os
+import threading
+import time
 
+from core import bulk, views
+from core.partition import PartitionedTable
 from core.table import Table
+from storage.checkpoint import (
+    Checkpointer,
+    DEFAULT_CHECKPOINT_INTERVAL,
+    DEFAULT_CHECKPOINT_BYTES,
+)
 from storage.persistence import PersistenceManager
+from storage.wal import (
+    DEFAULT_FLUSH_INTERVAL,
+    LogGapError,
+    LogLockedError,
+    LogTailer,
+    WriteAheadLog,
+)
+
+
+ROLES = ("writer", "follower", "auto")
+
+# how often a follower looks for new log records (seconds)
+DEFAULT_POLL_INTERVAL = 0.05
+
+# attempts at loading a snapshot that the writer replaces meanwhile
+SNAPSHOT_RETRIES = 5
 
 
 class DatabaseError(Exception):
@@ -18,28 +45,302 @@ class TableNotFoundError(DatabaseError):
 
 
 class Database:
-    def __init__(self, name="default_db", data_dir="data"):
+    """
+    Every change is appended to the write-ahead log and applied in
+    memory; table files are only written by checkpoints. On startup only
+    the schemas are read from the last checkpoint's manifest; a table's
+    segments are loaded on first access (or right away if the log tail
+    touches it).
+
+    With a memory_budget (bytes), the least recently used tables without
+    unflushed changes are unloaded whenever loading a table goes over it.
+
+    durability selects how writes reach the log: "sync" returns once the
+    change is fsynced (batched with concurrent writers), "async" returns
+    immediately and the log is flushed every flush_interval seconds.
+
+    role: one "writer" process owns the log (an exclusive lock on the
+    log directory) and writes checkpoints. A "follower" is read-only: it
+    loads the latest checkpoint and replays the writer's log as it
+    grows, polling every poll_interval seconds, so it trails the writer
+    by about poll_interval (plus flush_interval with async durability).
+    "auto" becomes the writer if the log is free, else a follower.
+    """
+
+    def __init__(
+        self,
+        name="default_db",
+        data_dir="data",
+        checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL,
+        checkpoint_bytes=DEFAULT_CHECKPOINT_BYTES,
+        memory_budget=None,
+        durability="sync",
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        role="writer",
+        poll_interval=DEFAULT_POLL_INTERVAL,
+    ):
+        if role not in ROLES:
+            raise DatabaseError(f"Unknown role '{role}'")
+
         self.name = name
         self._tables: Dict[str, Table] = {}
         self.persistence = PersistenceManager(data_dir)
-        self._load_tables()
+        self.wal = WriteAheadLog(
+            self.persistence.wal_dir,
+            durability=durability,
+            flush_interval=flush_interval,
+        )
+
+        self._lock = threading.RLock()
+        # tables changed (or dropped) since the last checkpoint
+        self._dirty = set()
+        # tables a running checkpoint is writing: not evicted until its
+        # manifest is published, as they would reload the old one
+        self._checkpointing = set()
+        self._manifest = None
+        self.recovery = None
+
+        self.memory_budget = memory_budget
+        # loaded tables that can be unloaded, least recently used first
+        self._lru = OrderedDict()
+
+        if role != "follower":
+            try:
+                self.wal.lock()
+                role = "writer"
+            except LogLockedError as e:
+                if role == "writer":
+                    raise DatabaseError(str(e)) from None
+                role = "follower"
+        self.role = role
+
+        self.checkpointer = None
+        self._tailer = None
+        self._stale = False
+        self._follower = None
+        self._closed = threading.Event()
+
+        # follower progress: last replayed LSN, time of the last poll
+        # and the error of the last failed poll, if any
+        self.applied_lsn = 0
+        self.caught_up_at = None
+        self.follower_error = None
+
+        if role == "follower":
+            if memory_budget is not None:
+                raise DatabaseError("Followers keep every table loaded")
+            self.poll_interval = poll_interval
+            self._start_follower()
+            return
+
+        self._recover()
+
+        self.checkpointer = Checkpointer(
+            self,
+            interval=checkpoint_interval,
+            max_bytes=checkpoint_bytes,
+        )
+        self.checkpointer.start()
+
+    def close(self):
+        """
+        Stops the checkpointer, writes a final checkpoint and flushes the
+        log (a follower stops tailing). Safe to call more than once.
+        """
+        if self.role == "follower":
+            self._closed.set()
+            if self._follower is not None:
+                self._follower.join()
+                self._follower = None
+            if self._tailer is not None:
+                self._tailer.close()
+            return
+
+        self.checkpointer.stop()
+        if self.wal.is_open:
+            self.checkpointer.checkpoint()
+            self.wal.close()
 
     # ================= LOAD =================
 
+    def _recover(self):
+        started = time.perf_counter()
+
+        self._manifest = self.persistence.read_manifest()
+        if self._manifest:
+            self._load_checkpoint(self._manifest)
+            checkpoint_lsn = self._manifest["lsn"]
+        else:
+            self._load_tables()
+            checkpoint_lsn = 0
+            # migrate legacy files at the first checkpoint
+            self._dirty.update(self._tables)
+
+        last_lsn = checkpoint_lsn
+        replayed = 0
+        for record in self.wal.read_from(checkpoint_lsn):
+            self._replay(record)
+            last_lsn = record["lsn"]
+            replayed += 1
+
+        self.wal.open(last_lsn)
+
+        self.recovery = {
+            "checkpoint_lsn": checkpoint_lsn,
+            "replayed": replayed,
+            "tables": len(self._tables),
+            "seconds": time.perf_counter() - started,
+        }
+
+    def _table_from_schema(self, schema, columns, loader=None):
+        options = dict(
+            name=schema["name"],
+            columns=columns,
+            primary_key=schema.get("primary_key"),
+            unique_keys=schema.get("unique_keys", []),
+            foreign_keys=schema.get("foreign_keys", []),
+            indexes=schema.get("indexes", []),
+            loader=loader,
+            compression=schema.get("compression"),
+            view=schema.get("view"),
+            secondary_indexes=schema.get("secondary_indexes", []),
+            bloom_filters=schema.get("bloom_filters", []),
+        )
+        if schema.get("partitioning"):
+            return PartitionedTable(
+                partitioning=schema["partitioning"], **options
+            )
+        return Table(**options)
+
+    def _register(self, table):
+        """Adds a new table, and a member table per partition."""
+        self._tables[table.name] = table
+        self._lru[table.name] = None
+        if table.partitioning is not None:
+            for partition in table.partitioning.names:
+                self._add_member(
+                    table.add_member(partition, loader=self._load_rows)
+                )
+
+    def _add_member(self, member):
+        self._tables[member.name] = member
+        self._lru[member.name] = None
+
+    def _forget_table(self, name):
+        """
+        Removes a table and its partitions; their files are deleted by
+        the next checkpoint.
+        """
+        table = self._tables.pop(name, None)
+        self._lru.pop(name, None)
+        if table is None or table.partitioning is None:
+            return
+
+        for member in table.members.values():
+            self._tables.pop(member.name, None)
+            self._lru.pop(member.name, None)
+            self._dirty.add(member.name)
+
+    def _load_checkpoint(self, manifest):
+        tail_tables = {
+            record["table"] for record in self.wal.read_from(manifest["lsn"])
+        }
+
+        for name, entry in manifest["tables"].items():
+            schema = entry["schema"]
+            if schema.get("partition_of"):
+                # made from the schema of the table it belongs to
+                continue
+
+            table = self._table_from_schema(
+                schema,
+                self.persistence.load_columns(schema),
+                loader=self._load_rows,
+            )
+            self._tables[name] = table
+
+            if "manifest" not in entry:
+                # single-file snapshot: rewritten as segments next time
+                data = self.persistence.read_file(entry["file"])
+                for row in data.get("rows", []):
+                    table.insert(row, validate_fk=False)
+                self._dirty.add(name)
+                self._lru[name] = None
+                continue
+
+            if table.partitioning is not None:
+                for partition in table.partitioning.names:
+                    member = table.add_member(
+                        partition, loader=self._load_rows
+                    )
+                    self._tables[member.name] = member
+                    member.unload()
+
+            table.unload()
+            if name in tail_tables:
+                self._load_rows(table)
+
+    def _load_rows(self, table):
+        """Loader for tables whose rows are in the checkpoint."""
+        with self._lock:
+            if table.loaded:
+                return
+
+            entry = self._manifest["tables"][table.name]
+            table_manifest = self.persistence.read_file(entry["manifest"])
+            try:
+                for seg in table_manifest["segments"]:
+                    columns, rows, images = self.persistence.read_segment(
+                        seg["file"]
+                    )
+                    if columns == table.columns:
+                        # written by a checkpoint of this very schema
+                        table.restore_segment(
+                            seg["id"], rows, seg["file"], images,
+                            seg.get("synopsis"),
+                        )
+                    else:
+                        table.load_segment(seg["id"], rows, seg["file"])
+                table.build_indexes()
+            except Exception:
+                table.unload()
+                raise
+
+            table.loaded = True
+            self._lru[table.name] = None
+            self._evict(keep=table.name)
+
+    def _evict(self, keep=None):
+        if self.memory_budget is None:
+            return
+
+        loaded = [self._tables[n] for n in self._lru if n in self._tables]
+        used = sum(t.memory_estimate() for t in loaded)
+
+        for table in loaded:
+            if used <= self.memory_budget:
+                break
+            if table.name == keep:
+                continue
+            if table.name in self._dirty or table.is_dirty():
+                continue
+            if table.name in self._checkpointing:
+                continue
+            if table.partition_of in self._dirty:
+                # may have changed with its table (see the snapshot)
+                continue
+
+            used -= table.memory_estimate()
+            table.unload()
+            del self._lru[table.name]
+
     def _load_tables(self):
         # 1. Load schemas first
         for filename in self.persistence.list_tables():
             path = os.path.join(self.persistence.data_dir, filename)
             meta, columns = self.persistence.load_table(path)
 
-            table = Table(
-                name=meta["name"],
-                columns=columns,
-                primary_key=meta.get("primary_key"),
-                unique_keys=meta.get("unique_keys", []),
-                foreign_keys=meta.get("foreign_keys", []),
-                indexes=meta.get("indexes", []),
-            )
+            table = self._table_from_schema(meta, columns)
 
             self._tables[table.name] = table
 
@@ -52,6 +353,265 @@ class Database:
             for row in meta.get("rows", []):
                 table.insert(row, validate_fk=False)
 
+    def _replay(self, record):
+        op = record["op"]
+        name = record["table"]
+
+        if op == "create_table":
+            schema = record["schema"]
+            table = self._table_from_schema(
+                schema,
+                self.persistence.load_columns(schema),
+                loader=self._load_rows,
+            )
+            self._register(table)
+            if table.view is not None:
+                # view contents are derived, never logged
+                self._fill_view(table)
+        elif op == "drop_table":
+            self._forget_table(name)
+        elif op == "add_partition":
+            self._add_member(self._tables[name].add_partition(
+                record["partition"], record["bound"], loader=self._load_rows
+            ))
+        elif op == "drop_partition":
+            self._drop_partition(self._tables[name], record["partition"])
+        elif op == "refresh":
+            self._fill_view(self._tables[name])
+        elif op == "create_index":
+            self._tables[name].create_index(**record["index"])
+        elif op == "drop_index":
+            self._tables[name].drop_index(record["name"])
+        elif op == "insert":
+            table = self._tables[name]
+            table.insert(record["row"], validate_fk=False)
+            self._maintain_views(
+                name, [], [self._full_row(table, record["row"])]
+            )
+        elif op == "insert_many":
+            table = self._tables[name]
+            table.insert_many(record["rows"])
+            self._maintain_views(
+                name, [], [self._full_row(table, r) for r in record["rows"]]
+            )
+        elif op == "update":
+            table = self._tables[name]
+            rows = table.find_rows(record["keys"])
+            old = [row.to_dict() for row in rows]
+            table.update_rows(rows, record["set"])
+            self._maintain_views(name, old, [row.to_dict() for row in rows])
+        elif op == "delete":
+            table = self._tables[name]
+            rows = table.find_rows(record["keys"])
+            old = [row.to_dict() for row in rows]
+            table.delete_rows(rows)
+            self._maintain_views(name, old, [])
+        else:
+            raise DatabaseError(f"Unknown log record '{op}'")
+
+        self._dirty.add(name)
+
+    # ================= LOG / CHECKPOINT =================
+
+    def _log(self, record):
+        lsn = self.wal.append(record)
+        self._dirty.add(record["table"])
+        self.checkpointer.notify()
+        return lsn
+
+    def _commit(self, lsn):
+        """Waits for durability outside the lock, so fsyncs are shared."""
+        if lsn is not None and self.wal.durability == "sync":
+            self.wal.wait_durable(lsn)
+
+    def _mark_dirty(self, names):
+        with self._lock:
+            self._dirty.update(names)
+            for name in names:
+                if name in self._tables:
+                    self._tables[name].mark_dirty()
+
+    def _checkpoint_snapshot(self):
+        """
+        Returns (lsn, {table: (schema, segments)}, dirty) taken under the
+        lock, so all tables reflect the same LSN. segments lists
+        (segment, rows, file, synopsis) in storage order, where rows is a
+        copy of the segment if it changed since its file was written,
+        else None and synopsis the segment's current one (persisted
+        form), if any.
+        """
+        with self._lock:
+            if not self._dirty:
+                return None
+
+            lsn = self.wal.begin_checkpoint()
+            dirty, self._dirty = self._dirty, set()
+
+            # a changed partitioned table is logged under its own name:
+            # any of its loaded partitions may have changed with it
+            for name in list(dirty):
+                table = self._tables.get(name)
+                if table is not None and table.partitioning is not None:
+                    dirty.update(
+                        member.name for member in table.members.values()
+                        if member.loaded
+                    )
+            self._checkpointing = set(dirty)
+
+            tables = {}
+            for name, table in self._tables.items():
+                if not table.loaded:
+                    # unloaded tables are never dirty
+                    tables[name] = (None, None)
+                    continue
+
+                segments = []
+                for segment in table.segments():
+                    rows = synopsis = None
+                    if segment.dirty:
+                        rows = [row.copy() for row in segment.rows]
+                        segment.dirty = False
+                    elif segment.synopsis is not None:
+                        synopsis = segment.synopsis.to_json()
+                    segments.append((segment, rows, segment.file, synopsis))
+
+                tables[name] = (self.persistence.table_schema(table), segments)
+
+            return lsn, tables, dirty
+
+    def _checkpoint_done(self, manifest=None):
+        """
+        Publishes the manifest of a finished checkpoint, or re-marks its
+        tables dirty if it failed; either way they may be evicted again.
+        """
+        with self._lock:
+            if manifest is None:
+                self._mark_dirty(self._checkpointing)
+            else:
+                self._manifest = manifest
+            self._checkpointing = set()
+
+    def checkpoint(self, full=False):
+        """Writes a checkpoint now; full rewrites every segment."""
+        self._require_writer()
+        if full:
+            self._mark_dirty(list(self._tables))
+        return self.checkpointer.checkpoint()
+
+    def storage_stats(self):
+        """
+        Compression ratio and throughput of segment reads so far and of
+        the last checkpoint's writes.
+        """
+        read = dict(self.persistence.read_stats)
+        read["compression_ratio"] = (
+            read["raw_bytes"] / read["stored_bytes"]
+            if read["stored_bytes"] else None
+        )
+        read["mb_per_s"] = (
+            read["raw_bytes"] / read["seconds"] / 1e6
+            if read["seconds"] else None
+        )
+        write = self.checkpointer.last_stats if self.checkpointer else None
+        return {"read": read, "write": write}
+
+    # ================= FOLLOWER =================
+
+    def _start_follower(self):
+        started = time.perf_counter()
+        self._load_snapshot()
+        replayed = self.catch_up()
+
+        self.recovery = {
+            "checkpoint_lsn": self._manifest["lsn"] if self._manifest else 0,
+            "replayed": replayed,
+            "tables": len(self._tables),
+            "seconds": time.perf_counter() - started,
+        }
+
+        self._follower = threading.Thread(
+            target=self._follow, name="log-follower", daemon=True
+        )
+        self._follower.start()
+
+    def _load_snapshot(self):
+        """
+        Loads every table of the latest checkpoint and starts tailing
+        the log after it. The writer may replace the snapshot's files
+        while they are read; then the new one is loaded.
+        """
+        for attempt in range(SNAPSHOT_RETRIES):
+            with self._lock:
+                self._tables = {}
+                self._lru = OrderedDict()
+                self._dirty = set()
+                self._manifest = self.persistence.read_manifest()
+                try:
+                    if self._manifest:
+                        self._load_checkpoint(self._manifest)
+                        for table in self._tables.values():
+                            self._load_rows(table)
+                    else:
+                        self._load_tables()
+                except FileNotFoundError:
+                    if attempt + 1 == SNAPSHOT_RETRIES:
+                        raise
+                    continue
+
+                lsn = self._manifest["lsn"] if self._manifest else 0
+                if self._tailer is not None:
+                    self._tailer.close()
+                self._tailer = LogTailer(self.persistence.wal_dir, lsn)
+                self.applied_lsn = lsn
+                return
+
+    def catch_up(self):
+        """
+        Follower: replays the log records written since the last call
+        and returns how many. Reloads the latest snapshot first if the
+        writer truncated records that were not read yet.
+        """
+        if self.role != "follower":
+            return 0
+
+        with self._lock:
+            if self._stale:
+                self._load_snapshot()
+                self._stale = False
+
+            try:
+                records = self._tailer.poll()
+            except LogGapError:
+                self._load_snapshot()
+                records = self._tailer.poll()
+
+            try:
+                for record in records:
+                    self._replay(record)
+                    self.applied_lsn = record["lsn"]
+            except Exception:
+                # the tailer is past the failed records: start over
+                self._stale = True
+                raise
+
+            self.caught_up_at = time.time()
+            return len(records)
+
+    def _follow(self):
+        while not self._closed.wait(self.poll_interval):
+            try:
+                self.catch_up()
+                self.follower_error = None
+            except Exception as e:
+                # keep serving the last state; retried at the next poll
+                self.follower_error = e
+
+    def _require_writer(self):
+        if self.role != "writer":
+            raise DatabaseError(
+                "Read-only follower: send changes to the writer process"
+            )
+
     # ================= SCHEMA =================
 
     def create_table(
@@ -62,80 +622,499 @@ class Database:
         unique_keys=None,
         foreign_keys=None,
         indexes=None,
+        compression=None,
+        partitioning=None,
+        bloom_filters=None,
     ):
-        if table_name in self._tables:
-            raise TableAlreadyExistsError(
-                f"Table '{table_name}' already exists"
+        """
+        bloom_filters lists columns whose block synopses keep a Bloom
+        filter, for equality and join lookups on them.
+        partitioning spreads the rows over partitions (core.partition):
+        {"kind": "range", "column": c, "bounds": [[name, bound], ...]}
+        with a last bound of None for MAXVALUE, or {"kind": "hash",
+        "column": c, "count": n}.
+        """
+        self._require_writer()
+
+        with self._lock:
+            if table_name in self._tables:
+                raise TableAlreadyExistsError(
+                    f"Table '{table_name}' already exists"
+                )
+
+            options = dict(
+                name=table_name,
+                columns=columns,
+                primary_key=primary_key,
+                unique_keys=unique_keys or [],
+                foreign_keys=foreign_keys or [],
+                indexes=indexes or [],
+                loader=self._load_rows,
+                compression=compression,
+                bloom_filters=bloom_filters,
             )
+            if partitioning is None:
+                table = Table(**options)
+            else:
+                table = PartitionedTable(
+                    partitioning=partitioning, **options
+                )
 
-        table = Table(
-            name=table_name,
-            columns=columns,
-            primary_key=primary_key,
-            unique_keys=unique_keys or [],
-            foreign_keys=foreign_keys or [],
-            indexes=indexes or [],
-        )
+            self._register(table)
+            lsn = self._log({
+                "op": "create_table",
+                "table": table_name,
+                "schema": self.persistence.table_schema(table),
+            })
 
-        self._tables[table_name] = table
-        self.persistence.save_table(table)
+        self._commit(lsn)
 
     def drop_table(self, table_name):
-        if table_name not in self._tables:
-            raise TableNotFoundError(
-                f"Table '{table_name}' does not exist"
-            )
+        self._require_writer()
 
-        del self._tables[table_name]
+        with self._lock:
+            if table_name not in self._tables:
+                raise TableNotFoundError(
+                    f"Table '{table_name}' does not exist"
+                )
+            self._check_not_member(self._tables[table_name])
 
-        path = os.path.join(
-            self.persistence.data_dir, f"{table_name}.json"
-        )
-        if os.path.exists(path):
-            os.remove(path)
+            dependents = self._views_on(table_name)
+            if dependents:
+                raise DatabaseError(
+                    f"Table '{table_name}' is used by materialized view "
+                    f"'{dependents[0].name}'"
+                )
+
+            self._forget_table(table_name)
+            lsn = self._log({"op": "drop_table", "table": table_name})
+
+        self._commit(lsn)
 
     def list_tables(self):
-        return list(self._tables.keys())
+        # partitions are listed by their table only
+        return [
+            name for name, table in self._tables.items()
+            if table.partition_of is None
+        ]
+
+    # ================= PARTITIONS =================
+
+    def add_partition(self, table_name, partition, bound):
+        """
+        Adds an empty RANGE partition for values from the current last
+        bound up to bound (None for MAXVALUE).
+        """
+        self._require_writer()
+
+        with self._lock:
+            table = self._partitioned(table_name)
+            self._add_member(table.add_partition(
+                partition, bound, loader=self._load_rows
+            ))
+            lsn = self._log({
+                "op": "add_partition",
+                "table": table_name,
+                "partition": partition,
+                "bound": table.partitioning.bounds[-1],
+            })
+
+        self._commit(lsn)
+
+    def drop_partition(self, table_name, partition):
+        """
+        Drops a RANGE partition with all its rows without reading them:
+        its table is forgotten and its files are removed by the next
+        checkpoint. Materialized views on the table are recomputed.
+        """
+        self._require_writer()
+
+        with self._lock:
+            table = self._partitioned(table_name)
+            self._drop_partition(table, partition)
+            lsn = self._log({
+                "op": "drop_partition",
+                "table": table_name,
+                "partition": partition,
+            })
+
+        self._commit(lsn)
+
+    def _drop_partition(self, table, partition):
+        member = table.drop_partition(partition)
+        self._tables.pop(member.name, None)
+        self._lru.pop(member.name, None)
+        self._dirty.add(member.name)
+
+        for view in self._views_on(table.name):
+            self._fill_view(view)
+
+    def _partitioned(self, table_name):
+        table = self._writable(table_name)
+        if table.partitioning is None:
+            raise DatabaseError(f"Table '{table_name}' is not partitioned")
+        return table
+
+    def _check_not_member(self, table):
+        if table.partition_of is not None:
+            raise DatabaseError(
+                f"'{table.name}' is a partition of '{table.partition_of}'"
+                f": change it through '{table.partition_of}'"
+            )
+
+    # ================= INDEXES =================
+
+    def create_index(
+        self, table_name, columns, name=None, include=None, where=None
+    ):
+        """
+        Adds a secondary index (see core.index) and returns its name.
+        where is a bound WHERE tree: only matching rows are indexed.
+        """
+        self._require_writer()
+
+        with self._lock:
+            table = self.get_table(table_name)
+            name = name or f"{table_name}_{'_'.join(columns)}_idx"
+            if self._index_owner(name) is not None:
+                raise DatabaseError(f"Index '{name}' already exists")
+
+            index = table.create_index(name, columns, include, where)
+            lsn = self._log({
+                "op": "create_index",
+                "table": table_name,
+                "index": index.definition(),
+            })
+
+        self._commit(lsn)
+        return name
+
+    def drop_index(self, name):
+        self._require_writer()
+
+        with self._lock:
+            table = self._index_owner(name)
+            if table is None:
+                raise DatabaseError(f"Index '{name}' does not exist")
+
+            table.drop_index(name)
+            lsn = self._log({
+                "op": "drop_index", "table": table.name, "name": name
+            })
+
+        self._commit(lsn)
+
+    def _index_owner(self, name):
+        for table in self._tables.values():
+            # partitions carry copies of their table's indexes
+            if name in table.secondary and table.partition_of is None:
+                return table
+        return None
+
+    # ================= MATERIALIZED VIEWS =================
+
+    def create_materialized_view(self, view_name, query):
+        """
+        Stores the result of query (a parsed SELECT with an optional
+        JOIN and a WHERE already bound to the left table) as a table
+        that is kept up to date from the changes of its base tables.
+        """
+        self._require_writer()
+
+        if query.get("aggregates") or query.get("group_by"):
+            raise DatabaseError(
+                "Materialized views support SELECT ... [JOIN] [WHERE] only"
+            )
+
+        with self._lock:
+            if view_name in self._tables:
+                raise TableAlreadyExistsError(
+                    f"Table '{view_name}' already exists"
+                )
+
+            query = {
+                key: query.get(key)
+                for key in ("table", "join", "where", "fields")
+            }
+            columns = views.view_columns(query, self.get_table)
+            index = views.index_column(query, self.get_table, columns)
+
+            table = Table(
+                name=view_name,
+                columns=columns,
+                indexes=[index] if index else [],
+                loader=self._load_rows,
+                view=query,
+            )
+            self._fill_view(table)
+
+            self._tables[view_name] = table
+            self._lru[view_name] = None
+            lsn = self._log({
+                "op": "create_table",
+                "table": view_name,
+                "schema": self.persistence.table_schema(table),
+            })
+
+        self._commit(lsn)
+
+    def refresh_materialized_view(self, view_name):
+        """Recomputes a view from scratch."""
+        self._require_writer()
+
+        with self._lock:
+            table = self.get_table(view_name)
+            if table.view is None:
+                raise DatabaseError(
+                    f"'{view_name}' is not a materialized view"
+                )
+
+            self._fill_view(table)
+            lsn = self._log({"op": "refresh", "table": view_name})
+
+        self._commit(lsn)
+
+    def _views_on(self, table_name):
+        return [
+            table for table in self._tables.values()
+            if table.view is not None
+            and table_name in views.base_tables(table.view)
+        ]
+
+    def _fill_view(self, table):
+        rows = views.compute(table.view, table.columns, self.get_table)
+        table.delete_rows(table.rows)
+        table.insert_many(rows)
+        self._dirty.add(table.name)
+
+    def _maintain_views(self, table_name, old_rows, new_rows):
+        """Applies a change of a base table to the views defined on it."""
+        for table in self._views_on(table_name):
+            change = views.delta(
+                table.view, table.columns, self.get_table,
+                table_name, old_rows, new_rows,
+            )
+            if change is None:
+                self._fill_view(table)
+                continue
+
+            removed, added = change
+            if removed:
+                table.delete_rows(table.find_rows(removed))
+            if added:
+                table.insert_many(added)
+            self._dirty.add(table.name)
+
+    def _full_row(self, table, row):
+        return {col: row.get(col) for col in table.columns}
+
+    def _writable(self, table_name):
+        self._require_writer()
+        table = self.get_table(table_name)
+        if table.view is not None:
+            raise DatabaseError(
+                f"Cannot modify materialized view '{table_name}'"
+            )
+        self._check_not_member(table)
+        return table
 
     def get_table(self, table_name):
         if table_name not in self._tables:
             raise TableNotFoundError(
                 f"Table '{table_name}' does not exist"
             )
+
+        with self._lock:
+            if table_name in self._lru:
+                self._lru.move_to_end(table_name)
         return self._tables[table_name]
 
     # ================= DATA =================
 
-    def insert(self, table_name, row):
+    def insert(self, table_name, row, coerce=False):
+        """
+        Inserts one row. With coerce, values are converted to the column
+        types (SQL literals) rather than type-checked.
+        """
+        with self._lock:
+            table = self._writable(table_name)
+
+            check = None
+            if table.foreign_keys:
+                check = partial(self._check_foreign_keys, table)
+
+            record = table.insert(row, coerce=coerce, check=check)
+            if coerce:
+                row = record.to_dict()
+            if self._views_on(table_name):
+                self._maintain_views(
+                    table_name, [], [self._full_row(table, row)]
+                )
+            lsn = self._log({"op": "insert", "table": table_name, "row": row})
+
+        self._commit(lsn)
+
+    def insert_many(self, table_name, rows):
+        """Inserts a batch of rows with one log record, all or nothing."""
+        if not rows:
+            return 0
+
+        with self._lock:
+            table = self._writable(table_name)
+
+            self._check_foreign_keys_many(table, rows)
+
+            count = table.insert_many(rows)
+            self._maintain_views(
+                table_name, [], [self._full_row(table, r) for r in rows]
+            )
+            lsn = self._log({
+                "op": "insert_many", "table": table_name, "rows": rows
+            })
+
+        self._commit(lsn)
+        return count
+
+    def cursor(self, table_name):
+        """
+        Yields the rows of a table one segment at a time; only the
+        current segment's row list is copied, under the lock.
+        """
         table = self.get_table(table_name)
+        for part in table.partitions():
+            for segment in part.segments():
+                with self._lock:
+                    rows = [row.to_dict() for row in segment.rows]
+                yield from rows
 
-        self._check_foreign_keys(table, row)
+    # ================= COPY =================
 
-        table.insert(row)
-        self.persistence.save_table(table)
+    def copy_from(self, table_name, path, fmt=None, header=True,
+                  chunk_rows=bulk.DEFAULT_CHUNK_ROWS):
+        """
+        Streams a CSV or JSON Lines file into a table, one chunk per
+        batch insert. A failing chunk is not applied; earlier chunks
+        stay. Returns the number of rows imported.
+        """
+        table = self.get_table(table_name)
+        imported = 0
 
-    def update(self, table_name, updates, where):
+        for names, records in bulk.read_chunks(
+            path, table.columns, fmt, header, chunk_rows
+        ):
+            try:
+                rows = bulk.coerce_rows(table.columns, names, records)
+            except bulk.BulkError as e:
+                if e.row is None:
+                    raise
+                raise bulk.BulkError(
+                    f"{e} (record {imported + e.row + 1})"
+                ) from None
+
+            imported += self.insert_many(table_name, rows)
+
+        return imported
+
+    def copy_to(self, table_name, path, fmt=None):
+        """Streams a table to a CSV or JSON Lines file."""
         table = self.get_table(table_name)
+        return bulk.write_rows(
+            path, table.columns, self.cursor(table_name), fmt
+        )
 
-        def wrapped_where(row):
-            return True if where is None else where(row)
+    def update(self, table_name, updates, where):
+        """
+        Updates the rows matching where: None (all rows), a row -> bool
+        function, or a bound WHERE tree, which is compiled for the
+        stored records and prunes partitions. Returns the row count.
+        """
+        lsn = None
+        try:
+            with self._lock:
+                table = self._writable(table_name)
+                if (
+                    table.partitioning is not None
+                    and table.partitioning.column in updates
+                ):
+                    raise DatabaseError(
+                        f"Cannot update partition column "
+                        f"'{table.partitioning.column}'"
+                    )
 
-        count = table.update(updates, wrapped_where)
-        self.persistence.save_table(table)
-        return count
+                matched = []
+                keys = []
+                updated = 0
+                try:
+                    for part, test in self._row_tests(table, where):
+                        updated += part.update(
+                            updates, _collecting(test, matched), changed=keys
+                        )
+                    return updated
+                finally:
+                    # log whatever was applied, even if a later row failed
+                    if keys:
+                        old = matched[: len(keys)]
+                        self._maintain_views(
+                            table_name, old, [{**r, **updates} for r in old]
+                        )
+                        lsn = self._log({
+                            "op": "update",
+                            "table": table_name,
+                            "keys": keys,
+                            "set": updates,
+                        })
+        finally:
+            self._commit(lsn)
 
     def delete(self, table_name, where):
-        table = self.get_table(table_name)
+        """Deletes the rows matching where (see update)."""
+        lsn = None
+        with self._lock:
+            table = self._writable(table_name)
+            matched = []
 
-        def wrapped_where(row):
-            return True if where is None else where(row)
+            keys = []
+            count = sum(
+                part.delete(_collecting(test, matched), changed=keys)
+                for part, test in self._row_tests(table, where)
+            )
+            if keys:
+                self._maintain_views(table_name, matched, [])
+                lsn = self._log({
+                    "op": "delete", "table": table_name, "keys": keys
+                })
 
-        count = table.delete(wrapped_where)
-        self.persistence.save_table(table)
+        self._commit(lsn)
         return count
 
+    def _row_tests(self, table, where):
+        """(table, row test) for each partition where can match."""
+        if where is None or callable(where):
+            return [(part, where) for part in table.partitions()]
+        return [
+            (part, part.predicate(where)) for part in table.partitions(where)
+        ]
+
     # ================= FOREIGN KEYS =================
 
+    def _check_foreign_keys_many(self, table: Table, rows: list):
+        for fk in table.foreign_keys:
+            col = fk["column"]
+            values = {row.get(col) for row in rows} - {None}
+            if not values:
+                continue
+
+            parent = self.get_table(fk["ref_table"])
+            ref_col = fk["ref_column"]
+            existing = parent.values_of(ref_col)
+
+            if not all(v in existing for v in values):
+                raise DatabaseError(
+                    f"Foreign key violation: "
+                    f"{table.name}.{col} references "
+                    f"{fk['ref_table']}.{ref_col}"
+                )
+
     def _check_foreign_keys(self, table: Table, row: dict):
         for fk in table.foreign_keys:
             col = fk["column"]
@@ -148,9 +1127,10 @@ class Database:
 
             parent = self.get_table(ref_table)
 
-            exists = any(
-                r.get(ref_col) == value for r in parent.rows
-            )
+            if parent.is_indexed(ref_col):
+                exists = value in parent.values_of(ref_col)
+            else:
+                exists = any(r.get(ref_col) == value for r in parent.rows)
 
             if not exists:
                 raise DatabaseError(
@@ -158,3 +1138,13 @@ class Database:
                     f"{table.name}.{col} references "
                     f"{ref_table}.{ref_col}"
                 )
+
+
+def _collecting(test, matched):
+    """test (None: every row) that also records the rows it accepts."""
+    def wrapped_where(row):
+        hit = True if test is None else test(row)
+        if hit:
+            matched.append(row.to_dict())
+        return hit
+    return wrapped_where
@@ -0,0 +1,290 @@
+# core/index.py
+
+from bisect import bisect_left, bisect_right, insort
+
+from sql.expressions import equalities, evaluate_where, ranges
+
+
+# a range is looked up in an index only if it spans at most this share
+# of the index's distinct keys; wider ones are cheaper to scan
+RANGE_INDEX_FRACTION = 0.25
+
+
+class SecondaryIndexError(Exception):
+    pass
+
+
+class SecondaryIndex:
+    """
+    Ordered index on one or more columns, created with CREATE INDEX.
+
+    Distinct keys are kept sorted so that any leading prefix of the key
+    columns can be looked up with a binary search; each key maps to its
+    rows. Every entry also carries the values of the key and INCLUDE
+    columns, so queries reading only those are answered from the index
+    (covering). With a predicate only matching rows are indexed
+    (partial). Rows with a NULL key column are not indexed.
+    """
+
+    def __init__(self, name, columns, include=None, where=None):
+        if not columns:
+            raise SecondaryIndexError(f"Index '{name}' has no columns")
+
+        self.name = name
+        self.columns = list(columns)
+        self.include = [c for c in include or [] if c not in self.columns]
+        self.where = where
+
+        # column names of the values stored with each entry
+        self.covered = self.columns + self.include
+
+        self._keys = []       # sorted distinct key tuples
+        self._entries = {}    # key -> [(row, covered values)]
+        self._size = 0
+
+        # lookups served, for spotting unused indexes
+        self.lookups = 0
+
+    def definition(self):
+        return {
+            "name": self.name,
+            "columns": self.columns,
+            "include": self.include,
+            "where": self.where,
+        }
+
+    def __len__(self):
+        return self._size
+
+    # ================= MAINTENANCE =================
+
+    def _key(self, row):
+        key = tuple(row[c] for c in self.columns)
+        if None in key:
+            return None
+        if self.where is not None and not evaluate_where(self.where, row):
+            return None
+        return key
+
+    def build(self, rows):
+        """Bulk build: sort (key, row) pairs once and group them."""
+        pairs = []
+        for row in rows:
+            key = self._key(row)
+            if key is not None:
+                pairs.append((key, row))
+        pairs.sort(key=lambda pair: pair[0])
+
+        self._keys = []
+        self._entries = {}
+        covered = self.covered
+        for key, row in pairs:
+            entry = (row, tuple(row[c] for c in covered))
+            bucket = self._entries.get(key)
+            if bucket is None:
+                self._keys.append(key)
+                self._entries[key] = [entry]
+            else:
+                bucket.append(entry)
+        self._size = len(pairs)
+
+    def clear(self):
+        self._keys = []
+        self._entries = {}
+        self._size = 0
+
+    def add(self, row):
+        key = self._key(row)
+        if key is None:
+            return
+
+        entry = (row, tuple(row[c] for c in self.covered))
+        bucket = self._entries.get(key)
+        if bucket is None:
+            insort(self._keys, key)
+            self._entries[key] = [entry]
+        else:
+            bucket.append(entry)
+        self._size += 1
+
+    def remove(self, row):
+        key = self._key(row)
+        bucket = self._entries.get(key) if key is not None else None
+        if bucket is None:
+            return
+
+        for i, (existing, _) in enumerate(bucket):
+            if existing is row:
+                del bucket[i]
+                self._size -= 1
+                break
+
+        if not bucket:
+            del self._entries[key]
+            del self._keys[bisect_left(self._keys, key)]
+
+    # ================= LOOKUP =================
+
+    def _buckets(self, prefix):
+        prefix = tuple(prefix)
+        if len(prefix) == len(self.columns):
+            bucket = self._entries.get(prefix)
+            return [bucket] if bucket else []
+
+        n = len(prefix)
+        buckets = []
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i][:n] == prefix:
+            buckets.append(self._entries[self._keys[i]])
+            i += 1
+        return buckets
+
+    def lookup(self, prefix):
+        """Rows whose leading key columns equal prefix."""
+        self.lookups += 1
+        return [row for bucket in self._buckets(prefix) for row, _ in bucket]
+
+    def _span(self, low, high):
+        """
+        Positions in _keys of the keys whose first column lies strictly
+        between low and high (None: unbounded).
+        """
+        keys = self._keys
+        first = _first
+        start = 0 if low is None else bisect_right(keys, low, key=first)
+        end = len(keys) if high is None else bisect_left(
+            keys, high, key=first
+        )
+        return start, max(start, end)
+
+    def range_lookup(self, low=None, high=None):
+        """Rows whose leading key column lies between low and high."""
+        self.lookups += 1
+        start, end = self._span(low, high)
+        entries = self._entries
+        return [
+            row for key in self._keys[start:end] for row, _ in entries[key]
+        ]
+
+    def lookup_covered(self, prefix):
+        """Like lookup, but dicts of the covered columns only."""
+        self.lookups += 1
+        covered = self.covered
+        return [
+            dict(zip(covered, values))
+            for bucket in self._buckets(prefix)
+            for _, values in bucket
+        ]
+
+    # ================= PLANNING =================
+
+    def usable_prefix(self, where):
+        """
+        Values for the longest leading prefix of the key fixed by
+        equalities in where, or None if the index cannot answer where
+        (no prefix, or a partial index whose predicate is not implied).
+        """
+        terms = equalities(where)
+
+        if self.where is not None and not _implies(where, self.where):
+            return None
+
+        prefix = []
+        for col in self.columns:
+            if col not in terms:
+                break
+            prefix.append(terms[col])
+        return prefix or None
+
+    def covers(self, columns):
+        return set(columns) <= set(self.covered)
+
+
+def _conjuncts(where):
+    """The terms ANDed at the top of where."""
+    if where is None:
+        return []
+    if where["op"] == "AND":
+        return _conjuncts(where["left"]) + _conjuncts(where["right"])
+    return [where]
+
+
+def _implies(where, predicate):
+    """
+    True if every row matching where matches predicate: each term of
+    predicate is one of where's ANDed terms or follows from its
+    equalities and < / > bounds.
+    """
+    terms = _conjuncts(where)
+    fixed = equalities(where)
+    bounds = ranges(where)
+    return all(
+        term in terms or _term_implied(term, fixed, bounds)
+        for term in _conjuncts(predicate)
+    )
+
+
+def _term_implied(term, fixed, bounds):
+    op, col, value = term["op"], term.get("left"), term.get("right")
+    if op not in ("=", "!=", "<", ">") or value is None:
+        return False
+
+    try:
+        if col in fixed:
+            known = fixed[col]
+            if known is None:
+                return False
+            if op == "=":
+                return known == value
+            if op == "!=":
+                return known != value
+            return known < value if op == "<" else known > value
+
+        # exclusive bounds: v > low implies v > value when low >= value
+        low, high = bounds.get(col) or (None, None)
+        if op == "<":
+            return high is not None and high <= value
+        if op == ">":
+            return low is not None and low >= value
+        if op == "!=":
+            return (high is not None and high <= value) or (
+                low is not None and low >= value
+            )
+    except TypeError:
+        # bound of another type than the predicate's
+        return False
+    return False
+
+
+def _first(key):
+    return key[0]
+
+
+def choose_range_index(indexes, where):
+    """
+    (index, low, high) of a full index whose leading column where
+    bounds with < and > to a narrow enough range, or (None, None, None).
+    """
+    bounds = ranges(where)
+    for index in indexes:
+        if index.where is not None or not bounds.get(index.columns[0]):
+            continue
+        low, high = bounds[index.columns[0]]
+        try:
+            start, end = index._span(low, high)
+        except TypeError:
+            # bound of another type than the column's values
+            continue
+        if end - start <= len(index._keys) * RANGE_INDEX_FRACTION:
+            return index, low, high
+    return None, None, None
+
+
+def choose_index(indexes, where):
+    """(index, prefix) with the longest usable prefix, or (None, None)."""
+    best, best_prefix = None, None
+    for index in indexes:
+        prefix = index.usable_prefix(where)
+        if prefix and (best is None or len(prefix) > len(best_prefix)):
+            best, best_prefix = index, prefix
+    return best, best_prefix
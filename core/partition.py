@@ -0,0 +1,450 @@
+# core/partition.py
+
+from bisect import bisect_right
+from typing import Dict, List
+import zlib
+
+from core.table import SchemaError, Table, TableError, _convert, _mistyped
+
+
+PARTITION_KINDS = ("range", "hash")
+
+
+class PartitionError(TableError):
+    pass
+
+
+def member_name(table_name, partition):
+    """Name of the table holding one partition of table_name."""
+    return f"{table_name}.{partition}"
+
+
+class Partitioning:
+    """
+    How the rows of a table are spread over its partitions, by the
+    value of one column:
+
+    range: partition i holds values below bounds[i] (and at or above
+        the bound before it); a last bound of None is MAXVALUE.
+        NULLs go to the first partition.
+    hash:  count partitions p0 .. p<count-1>, chosen by a hash of the
+        value that is stable across processes. NULLs go to p0.
+
+    Maps values and WHERE trees to partition names only; the
+    partitions themselves are tables (see PartitionedTable).
+    """
+
+    def __init__(self, kind, column, bounds=None, count=None):
+        if kind not in PARTITION_KINDS:
+            raise SchemaError(f"Unknown partitioning '{kind}'")
+
+        self.kind = kind
+        self.column = column
+
+        if kind == "hash":
+            if not isinstance(count, int) or count < 1:
+                raise SchemaError("HASH partitioning needs PARTITIONS n > 0")
+            self.count = count
+            self.names = [f"p{i}" for i in range(count)]
+            self.bounds = None
+            return
+
+        self.count = None
+        self.names = []
+        self.bounds = []
+        if not bounds:
+            raise SchemaError("RANGE partitioning needs partitions")
+        for name, bound in bounds:
+            self.add(name, bound)
+
+    def definition(self):
+        if self.kind == "hash":
+            return {"kind": "hash", "column": self.column, "count": self.count}
+        return {
+            "kind": "range",
+            "column": self.column,
+            "bounds": [list(pair) for pair in zip(self.names, self.bounds)],
+        }
+
+    # ================= RANGE PARTITIONS =================
+
+    def add(self, name, bound):
+        """Appends a range partition above the current last one."""
+        if self.kind != "range":
+            raise PartitionError("Only RANGE partitions can be added")
+        if name in self.names:
+            raise PartitionError(f"Partition '{name}' already exists")
+        if self.bounds and self.bounds[-1] is None:
+            raise PartitionError(
+                f"Partition '{self.names[-1]}' already holds every "
+                f"value up to MAXVALUE"
+            )
+        if self.bounds and bound is not None and bound <= self.bounds[-1]:
+            raise PartitionError(
+                f"Partition '{name}': bound must be above "
+                f"{self.bounds[-1]!r}"
+            )
+
+        self.names.append(name)
+        self.bounds.append(bound)
+        self._bounds_changed()
+
+    def drop(self, name):
+        """
+        Forgets a range partition; its values map to the next partition
+        from now on.
+        """
+        if self.kind != "range":
+            raise PartitionError("Only RANGE partitions can be dropped")
+        if name not in self.names:
+            raise PartitionError(f"Partition '{name}' does not exist")
+
+        i = self.names.index(name)
+        del self.names[i]
+        del self.bounds[i]
+        self._bounds_changed()
+
+    def _bounds_changed(self):
+        # bounds searched by route(): all but MAXVALUE
+        self._finite = [bound for bound in self.bounds if bound is not None]
+
+    # ================= ROUTING =================
+
+    def route(self, value):
+        """Name of the partition that holds value."""
+        if self.kind == "hash":
+            return self.names[partition_hash(value) % self.count]
+
+        if not self.names:
+            self._missing(value)
+        if value is None:
+            return self.names[0]
+
+        i = bisect_right(self._finite, value)
+        if i == len(self.names):
+            self._missing(value)
+        return self.names[i]
+
+    def _missing(self, value):
+        raise PartitionError(
+            f"No partition of column '{self.column}' for value {value!r}"
+        )
+
+    def prune(self, where):
+        """
+        Names of the partitions that can hold rows matching a bound
+        WHERE tree: = on the partition column keeps one partition, and
+        for RANGE partitioning < and > keep the partitions overlapping
+        the range. AND intersects, OR unites, anything else keeps all.
+        """
+        found = self._prune(where)
+        if found is None:
+            return list(self.names)
+        return [name for name in self.names if name in found]
+
+    def _prune(self, where):
+        # set of names, or None for "all partitions"
+        if where is None:
+            return None
+
+        op = where["op"]
+        if op in ("AND", "OR"):
+            left = self._prune(where["left"])
+            right = self._prune(where["right"])
+            if op == "AND":
+                if left is None or right is None:
+                    return right if left is None else left
+                return left & right
+            if left is None or right is None:
+                return None
+            return left | right
+
+        if where["left"] != self.column:
+            return None
+
+        value = where["right"]
+        try:
+            if op == "=":
+                return {self.route(value)}
+            if self.kind != "range" or value is None:
+                return None
+            if op == "<":
+                # partition i starts at bounds[i - 1]
+                return {
+                    name for i, name in enumerate(self.names)
+                    if i == 0 or self.bounds[i - 1] < value
+                }
+            if op == ">":
+                return {
+                    name for name, bound in zip(self.names, self.bounds)
+                    if bound is None or bound > value
+                }
+        except PartitionError:
+            # no partition can hold the value: nothing matches
+            return set()
+        except TypeError:
+            # literal of another type: leave it to the scan
+            return None
+        return None
+
+    def aligned(self, other):
+        """
+        True if both place equal values at the same position, so
+        equal join keys meet in partitions of the same index.
+        """
+        if other is None or self.kind != other.kind:
+            return False
+        if self.kind == "hash":
+            return self.count == other.count
+        return self.bounds == other.bounds
+
+
+def partition_hash(value):
+    """Hash of a partition key, the same in every process."""
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    return zlib.crc32(str(value).encode("utf-8"))
+
+
+class _RoutedValues:
+    """Values of the partition column, looked up in one partition."""
+
+    def __init__(self, table, column):
+        self.table = table
+        self.column = column
+
+    def __contains__(self, value):
+        try:
+            member = self.table.member_for(value)
+        except PartitionError:
+            return False
+        return value in member.values_of(self.column)
+
+
+class PartitionedTable(Table):
+    """
+    A table whose rows live in member tables, one per partition, each
+    with its own storage, indexes and persisted files. The parent holds
+    the schema and no rows: it routes written rows by the partition
+    column, and partitions(where) lists the members a query must read.
+
+    Keys are checked within a partition, so the primary key and UNIQUE
+    columns can only be the partition column. The Database registers
+    the members as tables of their own (member_name()), which is how
+    they are checkpointed, loaded and unloaded one by one.
+    """
+
+    def __init__(self, name: str, columns: Dict[str, type],
+                 partitioning: dict, **schema):
+        # partition name -> member table, in partition order; set first
+        # as Table.__init__ replays the saved indexes into it
+        self.members: Dict[str, Table] = {}
+        super().__init__(name, columns, **schema)
+
+        spec = dict(partitioning)
+        column = spec.get("column")
+        col_type = columns.get(column)
+        if col_type is None:
+            raise SchemaError(f"Partition column '{column}' not in schema")
+
+        for key in self._key_columns():
+            if key != column:
+                raise SchemaError(
+                    f"Key '{key}' of partitioned table '{name}' must be "
+                    f"the partition column '{column}'"
+                )
+
+        if spec.get("bounds") is not None:
+            spec["bounds"] = [
+                (part, self._bound(column, bound))
+                for part, bound in spec["bounds"]
+            ]
+        self.partitioning = Partitioning(**spec)
+
+    def _bound(self, column, bound):
+        # SQL gives bounds as literals: convert to the column type
+        if bound is None:
+            return None
+        return _convert(column, self.columns[column], bound)
+
+    # ================= MEMBERS =================
+
+    def add_member(self, partition, loader=None):
+        """Creates the (empty) member table of a partition."""
+        member = Table(
+            name=member_name(self.name, partition),
+            columns=self.columns,
+            primary_key=self.primary_key,
+            unique_keys=self.unique_keys,
+            indexes=self.indexes,
+            loader=loader,
+            compression=self.compression,
+            secondary_indexes=[
+                index.definition() for index in self.secondary.values()
+            ],
+            partition_of=self.name,
+            bloom_filters=self.bloom_filters,
+        )
+        self.members[partition] = member
+        return member
+
+    def add_partition(self, partition, bound, loader=None):
+        """ALTER TABLE ... ADD PARTITION: a new, empty RANGE partition."""
+        self.partitioning.add(
+            partition, self._bound(self.partitioning.column, bound)
+        )
+        return self.add_member(partition, loader)
+
+    def drop_partition(self, partition):
+        """
+        ALTER TABLE ... DROP PARTITION: forgets a RANGE partition and
+        returns its member table, rows and all, without reading them.
+        """
+        self.partitioning.drop(partition)
+        self.version += 1
+        return self.members.pop(partition)
+
+    def partitions(self, where=None):
+        return [
+            self.members[name] for name in self.partitioning.prune(where)
+        ]
+
+    def member_for(self, value):
+        return self.members[self.partitioning.route(value)]
+
+    def partition_for(self, row, coerce=False):
+        """Member table for a row about to be inserted."""
+        column = self.partitioning.column
+        col_type = self.columns[column]
+        value = row.get(column)
+        if value is not None and value.__class__ is not col_type:
+            if coerce:
+                value = _convert(column, col_type, value)
+            elif not isinstance(value, col_type):
+                _mistyped(column, col_type)
+        return self.member_for(value)
+
+    def _by_member(self, rows):
+        # rows (or row keys) grouped by the member holding them
+        column = self.partitioning.column
+        groups = {}
+        for row in rows:
+            groups.setdefault(self.member_for(row[column]), []).append(row)
+        return groups.items()
+
+    # ================= CRUD =================
+
+    def insert(self, row, validate_fk=True, coerce=False, check=None):
+        member = self.partition_for(row, coerce)
+        return member.insert(row, validate_fk, coerce, check)
+
+    def insert_many(self, rows: List[Dict], coerce: bool = False):
+        """All or nothing over every partition the batch touches."""
+        groups = {}
+        for row in rows:
+            groups.setdefault(self.partition_for(row, coerce), []).append(row)
+
+        # check every partition's share before storing any of them
+        batches = [
+            (member, member._prepare_many(group, coerce))
+            for member, group in groups.items()
+        ]
+        return sum(member._store_many(batch) for member, batch in batches)
+
+    def select(self, where=None):
+        # a WHERE tree prunes partitions, a function is tried on all
+        prune = where if isinstance(where, dict) else None
+        rows = []
+        for member in self.partitions(prune):
+            rows.extend(member.select(where))
+        return rows
+
+    def update(self, updates, where, changed=None):
+        if self.partitioning.column in updates:
+            raise PartitionError(
+                f"Cannot update partition column "
+                f"'{self.partitioning.column}'"
+            )
+        return sum(
+            member.update(updates, where, changed)
+            for member in self.partitions()
+        )
+
+    def delete(self, where, changed=None):
+        return sum(
+            member.delete(where, changed) for member in self.partitions()
+        )
+
+    def delete_rows(self, rows):
+        return sum(
+            member.delete_rows(group)
+            for member, group in self._by_member(rows)
+        )
+
+    # ================= LOG REPLAY =================
+
+    def find_rows(self, keys):
+        found = []
+        for member, group in self._by_member(keys):
+            found.extend(member.find_rows(group))
+        return found
+
+    def update_rows(self, rows, updates):
+        for member, group in self._by_member(rows):
+            member.update_rows(group, updates)
+
+    # ================= SECONDARY INDEXES =================
+
+    def create_index(self, name, columns, include=None, where=None):
+        index = super().create_index(name, columns, include, where)
+        for member in self.members.values():
+            member.create_index(name, columns, include, where)
+        return index
+
+    def drop_index(self, name):
+        super().drop_index(name)
+        for member in self.members.values():
+            member.drop_index(name)
+
+    # ================= ACCESS =================
+
+    def values_of(self, column):
+        if column == self.partitioning.column:
+            return _RoutedValues(self, column)
+
+        values = set()
+        for member in self.members.values():
+            values.update(member.values_of(column))
+        return values
+
+    def blocks(self, where=None, keys=None, stats=None):
+        return [
+            segment
+            for member in self.partitions(where)
+            for segment in member.blocks(where, keys, stats)
+        ]
+
+    def candidates(self, where=None, keys=None, stats=None):
+        rows = []
+        for member in self.partitions(where):
+            rows.extend(member.candidates(where, keys, stats))
+        return rows
+
+    def scan(self, where=None, keys=None, stats=None):
+        rows = []
+        for member in self.partitions(where):
+            rows.extend(member.scan(where, keys, stats))
+        return rows
+
+    @property
+    def rows(self):
+        rows = []
+        for member in self.members.values():
+            rows.extend(member.rows)
+        return rows
+
+    def unload(self):
+        # no rows of its own; the members are unloaded one by one
+        pass
@@ -0,0 +1,234 @@
+# core/record.py
+
+from functools import lru_cache
+from operator import attrgetter
+
+
+class Record:
+    """
+    Base of the compact row classes made by record_type(). A record
+    keeps one value per column in `__slots__` (no per-row dict, no
+    repeated column names) and reads like a dict, so stored rows can be
+    handed to code written for dicts. Pickles as a plain dict.
+
+    `_segment` is not a column: MemoryStorage keeps the segment holding
+    the row there instead of in a per-row map.
+    """
+
+    __slots__ = ("_segment",)
+
+    # set on each generated class
+    _columns = ()
+    _getters = {}
+    _slot_of = {}
+    _values = staticmethod(lambda record: ())
+    # coded columns: column -> ValueDictionary / getter of the code
+    _dictionaries = {}
+    _raw = {}
+
+    @classmethod
+    def from_mapping(cls, row):
+        return cls(*map(row.get, cls._columns))
+
+    def __getitem__(self, column):
+        try:
+            return self._getters[column](self)
+        except KeyError:
+            raise KeyError(column) from None
+
+    def __setitem__(self, column, value):
+        try:
+            slot = self._slot_of[column]
+        except KeyError:
+            raise KeyError(column) from None
+        dictionary = self._dictionaries.get(column)
+        if dictionary is not None:
+            value = dictionary.intern(value)
+        setattr(self, slot, value)
+
+    def get(self, column, default=None):
+        getter = self._getters.get(column)
+        return default if getter is None else getter(self)
+
+    def __contains__(self, column):
+        return column in self._getters
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def keys(self):
+        return self._columns
+
+    def values(self):
+        return self._values(self)
+
+    def items(self):
+        return zip(self._columns, self.values())
+
+    def update(self, other):
+        for column, value in other.items():
+            self[column] = value
+
+    def copy(self):
+        return type(self)(*self.values())
+
+    def to_dict(self):
+        return dict(zip(self._columns, self.values()))
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return (
+                self._columns == other._columns
+                and self.values() == other.values()
+            )
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def __reduce__(self):
+        return dict, (list(self.items()),)
+
+
+# ================= VALUE DICTIONARIES =================
+
+# distinct values coded per column; past this new values are stored as is
+DICTIONARY_LIMIT = 1 << 12
+
+
+class ValueDictionary:
+    """
+    Codes for the values of one TEXT column. Each distinct value is
+    kept once and rows store its small integer code, so repeated values
+    (city names, statuses, ...) share one string and equality tests and
+    join keys compare integers. Once `limit` values have codes, new
+    values are stored as themselves: a stored int is a code, a stored
+    str is the value. Codes are never reused.
+    """
+
+    def __init__(self, limit=DICTIONARY_LIMIT):
+        self.limit = limit
+        self.code_of = {}     # value -> code
+        self.values = []      # code -> value
+
+    def __len__(self):
+        return len(self.values)
+
+    def intern(self, value):
+        """Stored form of value, giving it a code while there is room."""
+        if value is None:
+            return None
+        code = self.code_of.get(value)
+        if code is not None:
+            return code
+        if len(self.values) >= self.limit:
+            return value
+        code = len(self.values)
+        self.values.append(value)
+        self.code_of[value] = code
+        return code
+
+    def stored(self, value):
+        """Stored form of value without adding it."""
+        code = self.code_of.get(value)
+        return value if code is None else code
+
+    def decode(self, stored):
+        return self.values[stored] if stored.__class__ is int else stored
+
+
+# ================= RECORD CLASSES =================
+
+@lru_cache(maxsize=None)
+def record_type(columns: tuple):
+    """
+    Returns the record class for a tuple of column names. Slots are
+    named _0, _1, ... so any column name works, including ones that
+    clash with the dict-like methods.
+    """
+    return _build(columns, {})
+
+
+def coded_record_type(columns: tuple, dictionaries: dict):
+    """
+    Like record_type, but the columns in dictionaries (column ->
+    ValueDictionary) store codes. Not cached: the class is bound to
+    the dictionaries of one table.
+    """
+    return _build(columns, dictionaries)
+
+
+def _build(columns, dictionaries):
+    slots = tuple(f"_{i}" for i in range(len(columns)))
+    coded = [i for i, col in enumerate(columns) if col in dictionaries]
+
+    namespace = {}
+    for i in coded:
+        dictionary = dictionaries[columns[i]]
+        namespace[f"code{i}"] = dictionary.code_of.get
+        namespace[f"intern{i}"] = dictionary.intern
+        namespace[f"vals{i}"] = dictionary.values
+
+    # generated so that building and reading a row are single calls
+    args = "".join(f", v{i}" for i in range(len(columns)))
+    body = []
+    for i in range(len(columns)):
+        if i in coded:
+            body.append(f"    c = code{i}(v{i})")
+            body.append(
+                f"    self._{i} = c if c is not None else intern{i}(v{i})"
+            )
+        else:
+            body.append(f"    self._{i} = v{i}")
+    source = [f"def __init__(self{args}):"] + (body or ["    pass"])
+
+    decoded = [
+        f"(vals{i}[c] if (c := self._{i}).__class__ is int else c)"
+        if i in coded else f"self._{i}"
+        for i in range(len(columns))
+    ]
+    source.append("def values(self):")
+    source.append(f"    return ({', '.join(decoded)}{',' if decoded else ''})")
+    for i in coded:
+        source.append(f"def get{i}(self):")
+        source.append(f"    return {decoded[i]}")
+
+    exec("\n".join(source), namespace)
+
+    if not coded and len(slots) > 1:
+        values = attrgetter(*slots)
+    else:
+        values = namespace["values"]
+
+    getters = {}
+    for i, (col, slot) in enumerate(zip(columns, slots)):
+        getters[col] = namespace[f"get{i}"] if i in coded else attrgetter(slot)
+
+    return type(
+        "Record",
+        (Record,),
+        {
+            "__slots__": slots,
+            "__init__": namespace["__init__"],
+            "_columns": columns,
+            "_getters": getters,
+            "_slot_of": dict(zip(columns, slots)),
+            "_values": staticmethod(values),
+            "_dictionaries": dict(dictionaries),
+            "_raw": {
+                columns[i]: attrgetter(slots[i]) for i in coded
+            },
+        },
+    )
+
+
+def as_dict(row):
+    """Result boundary: plain dicts for callers."""
+    return row.to_dict() if isinstance(row, Record) else row
@@ -1,5 +1,18 @@
+import sys
+from collections import Counter
 from typing import Dict, List, Callable, Any
+from core.index import (
+    SecondaryIndex,
+    SecondaryIndexError,
+    choose_index,
+    choose_range_index,
+)
+from core.record import ValueDictionary, coded_record_type, record_type
+from sql import cancel
+from sql.expressions import compile_where, where_columns
+from storage.disk import DiskStorageError, codec_code
 from storage.memory import MemoryStorage
+from storage.synopsis import Synopsis, summarize
 
 
 class TableError(Exception):
@@ -15,6 +28,10 @@ class ConstraintViolationError(TableError):
 
 
 class Table:
+    # how rows are spread over partitions (core.partition), None = not
+    # partitioned
+    partitioning = None
+
     def __init__(
         self,
         name: str,
@@ -23,6 +40,12 @@ class Table:
         unique_keys: List[str] = None,
         foreign_keys: List[dict] = None,
         indexes: List[str] = None,
+        loader: Callable = None,
+        compression: str = None,
+        view: dict = None,
+        secondary_indexes: List[dict] = None,
+        partition_of: str = None,
+        bloom_filters: List[str] = None,
     ):
         self.name = name
         self.columns = columns
@@ -30,15 +53,61 @@ class Table:
         self.unique_keys = unique_keys or []
         self.foreign_keys = foreign_keys or []
         self.indexes = indexes or []
+        # codec for persisted segments (storage.disk.CODECS), None = off
+        self.compression = compression
+        # query of a materialized view (see core.views), None for tables
+        self.view = view
+        # name of the partitioned table this one is a partition of
+        self.partition_of = partition_of
+        # columns whose block synopses carry a Bloom filter
+        self.bloom_filters = list(bloom_filters or [])
+        for col in self.bloom_filters:
+            if col not in columns:
+                raise SchemaError(f"Unknown BLOOM column '{col}'")
 
         self._storage = MemoryStorage()
 
+        # TEXT column -> ValueDictionary; its rows store integer codes.
+        # Keys are left out: their values are all distinct.
+        keys = {primary_key, *self.unique_keys}
+        self.dictionaries = {
+            col: ValueDictionary()
+            for col, col_type in columns.items()
+            if col_type is str and col not in keys
+        }
+
+        # compact per-schema row class; stored rows are records, not dicts
+        if self.dictionaries:
+            self._record = coded_record_type(
+                tuple(columns), self.dictionaries
+            )
+        else:
+            self._record = record_type(tuple(columns))
+
+        # loader(table) refills the table on first access after unload()
+        self._loader = loader
+        self.loaded = True
+
+        # bumped on every mutation, lets caches detect stale snapshots
+        self.version = 0
+
+        # bumped when indexes or storage are replaced, which drops the
+        # compiled insert functions (cached by coerce flag)
+        self.schema_version = 0
+        self._compiled = {}
+
         # column -> { value -> [rows] }
         self._indexes: Dict[str, Dict[Any, List[dict]]] = {}
 
+        # name -> SecondaryIndex (CREATE INDEX)
+        self.secondary: Dict[str, SecondaryIndex] = {}
+
         self._validate_schema()
         self._init_indexes()
 
+        for definition in secondary_indexes or []:
+            self.create_index(**definition)
+
     # ================= SCHEMA =================
 
     def _validate_schema(self):
@@ -59,6 +128,12 @@ class Table:
                     f"Index '{key}' not in schema"
                 )
 
+        if self.compression is not None:
+            try:
+                codec_code(self.compression)
+            except DiskStorageError as e:
+                raise SchemaError(str(e)) from None
+
         for fk in self.foreign_keys:
             if fk["column"] not in self.columns:
                 raise SchemaError(
@@ -88,11 +163,11 @@ class Table:
                     f"Column '{col}' expects {col_type.__name__}"
                 )
 
-    def _check_constraints(self, row: Dict, ignore_row=None):
-        for key in [self.primary_key] + self.unique_keys:
-            if not key:
-                continue
+    def _key_columns(self):
+        return [key for key in [self.primary_key] + self.unique_keys if key]
 
+    def _check_constraints(self, row: Dict, ignore_row=None):
+        for key in self._key_columns():
             value = row.get(key)
             if value is None:
                 continue
@@ -111,27 +186,189 @@ class Table:
                 continue
             index.setdefault(value, []).append(row)
 
+        for index in self.secondary.values():
+            index.add(row)
+
     def _remove_indexes(self, row: Dict):
+        for index in self.secondary.values():
+            index.remove(row)
+
         for col, index in self._indexes.items():
             value = row.get(col)
-            if value in index:
-                index[value].remove(row)
-                if not index[value]:
-                    del index[value]
+            bucket = index.get(value)
+            if bucket is None:
+                continue
+
+            # by identity: equal rows may be stored more than once
+            for i, existing in enumerate(bucket):
+                if existing is row:
+                    del bucket[i]
+                    break
+            if not bucket:
+                del index[value]
+
+    # ================= COMPILED INSERT =================
+
+    def _schema_changed(self):
+        """Indexes or storage were replaced: drop compiled inserts."""
+        self.schema_version += 1
+        self._compiled = {}
+
+    def _compiled_insert(self, coerce):
+        """
+        (insert_one, build_many) generated for the current schema and
+        indexes, cached until _schema_changed(). insert_one(row, check)
+        coerces or type-checks each value, builds the record, runs
+        check, checks keys, stores the record and updates every index
+        in one straight-line function. build_many(rows) does the first
+        part for a batch and returns (records, {indexed column:
+        values}) for the batched key checks and index updates.
+        """
+        compiled = self._compiled.get(coerce)
+        if compiled is None:
+            compiled = _compile_insert(self, coerce)
+            self._compiled[coerce] = compiled
+        return compiled
 
     # ================= CRUD =================
 
-    def insert(self, row: Dict, validate_fk: bool = True):
-        self._validate_row(row)
+    def insert(
+        self,
+        row: Dict,
+        validate_fk: bool = True,
+        coerce: bool = False,
+        check: Callable = None,
+    ):
+        """
+        Inserts one row and returns the stored record. With coerce,
+        values are converted to the column types (SQL literals) instead
+        of type-checked. check(record) runs before the key checks and
+        may raise to reject the row (Database passes foreign keys).
+        """
+        self._ensure_loaded()
+
+        record = self._compiled_insert(coerce)[0](row, check)
+        self.version += 1
+        return record
+
+    def insert_many(self, rows: List[Dict], coerce: bool = False):
+        """
+        Inserts a batch of rows, all or nothing. Types are checked per
+        row in one pass and keys against the indexes once for the whole
+        batch.
+        """
+        return self._store_many(self._prepare_many(rows, coerce))
+
+    def _prepare_many(self, rows, coerce=False):
+        # first half of insert_many: build and check, store nothing
+        self._ensure_loaded()
+
+        records, values = self._compiled_insert(coerce)[1](rows)
+        self._check_batch_keys(values)
+        return records, values
+
+    def _store_many(self, batch):
+        records, values = batch
+        self._storage.insert_many(records)
+        self._index_batch(records, values)
+
+        self.version += 1
+        return len(records)
+
+    def _check_batch_keys(self, values):
+        for key in self._key_columns():
+            index = self._indexes[key]
+            seen = set()
+            for value in values[key]:
+                if value is None:
+                    continue
+                if value in seen or value in index:
+                    raise ConstraintViolationError(
+                        f"Duplicate value '{value}' for key '{key}'"
+                    )
+                seen.add(value)
+
+    def _index_batch(self, records, values):
+        for col, index in self._indexes.items():
+            for value, record in zip(values[col], records):
+                if value is not None:
+                    bucket = index.get(value)
+                    if bucket is None:
+                        index[value] = [record]
+                    else:
+                        bucket.append(record)
+
+        for index in self.secondary.values():
+            if len(records) > len(index):
+                # cheaper to re-sort everything than to insert one by one
+                index.build(self._storage.all())
+            else:
+                for record in records:
+                    index.add(record)
+
+    def load_segment(self, segment_id: int, rows: List[Dict], file=None):
+        """Loads one persisted segment, validating rows like insert."""
+        records, values = self._compiled_insert(False)[1](rows)
+        self._check_batch_keys(values)
+
+        self._storage.load_segment(segment_id, records, file)
+        self._index_batch(records, values)
+        self.version += 1
+
+    def restore_segment(
+        self, segment_id: int, rows: List[Dict], file=None, images=None,
+        synopsis=None,
+    ):
+        """
+        Trusted bulk load of a segment written by a checkpoint: rows are
+        complete, typed and constraint-checked already, so they go
+        straight into storage. Indexes are filled from the persisted
+        images (keys with their row ids) where available, the block
+        synopsis from its persisted form.
+        """
+        rows = list(map(self._record.from_mapping, rows))
+        images = images or {}
+        unique = {self.primary_key, *self.unique_keys}
+
+        for col, index in self._indexes.items():
+            if col not in images:
+                for row in rows:
+                    value = row[col]
+                    if value is not None:
+                        index.setdefault(value, []).append(row)
+                continue
 
-        full_row = {col: row.get(col) for col in self.columns}
+            keys, ids, bounds = images[col]
+            if bounds is not None:
+                buckets = [
+                    [rows[i] for i in ids[start:end]]
+                    for start, end in zip(bounds, bounds[1:])
+                ]
+            elif ids is None:
+                buckets = ([row] for row in rows)
+            else:
+                buckets = ([rows[i]] for i in ids)
+
+            if col in unique:
+                index.update(zip(keys, buckets))
+                continue
 
-        self._check_constraints(full_row)
+            for key, bucket in zip(keys, buckets):
+                existing = index.get(key)
+                if existing is None:
+                    index[key] = bucket
+                else:
+                    existing.extend(bucket)
 
-        self._storage.insert(full_row)
-        self._add_indexes(full_row)
+        self._storage.load_segment(
+            segment_id, rows, file,
+            Synopsis.from_json(synopsis) if synopsis else None,
+        )
+        self.version += 1
 
     def select(self, where=None):
+        self._ensure_loaded()
+
         if where is None:
             return self._storage.all()
 
@@ -147,39 +384,479 @@ class Table:
         if callable(where):
             return self._storage.filter(where)
 
+        if isinstance(where, dict):
+            # bound WHERE tree: skips blocks that cannot match
+            return self.scan(where)
+
         raise TableError("Unsupported WHERE condition")
 
-    def update(self, updates: Dict, where: Callable):
+    def predicate(self, where):
+        """
+        where compiled against this table's stored records; equality
+        tests on dictionary coded columns compare codes.
+        """
+        coded = {
+            col: (self._record._raw[col], dictionary.stored)
+            for col, dictionary in self.dictionaries.items()
+        }
+        return compile_where(where, self._record._getters, coded)
+
+    def getter(self, column):
+        """Value getter for a column of this table's stored records."""
+        return self._record._getters[column]
+
+    def code_getter(self, column):
+        """Getter of the stored code of a coded column, else None."""
+        return self._record._raw.get(column)
+
+    def update(self, updates: Dict, where: Callable, changed: List = None):
+        """
+        Applies updates to every row matching where. If given, `changed`
+        receives the key (see row_key) of each row before it is modified.
+        """
+        self._ensure_loaded()
+
         updated = 0
 
-        for row in list(self._storage.all()):
-            if not where(row):
-                continue
+        try:
+            # block by block, so a cancelled statement stops in between
+            for segment in self._storage.segments():
+                cancel.check()
+                for row in list(segment.rows):
+                    if not where(row):
+                        continue
 
-            new_row = row.copy()
-            new_row.update(updates)
+                    key = self.row_key(row)
+                    self._apply_update(row, updates)
+                    if changed is not None:
+                        changed.append(key)
 
-            self._validate_row(new_row)
-            self._check_constraints(new_row, ignore_row=row)
+                    updated += 1
+        finally:
+            if updated:
+                self.version += 1
 
-            self._remove_indexes(row)
-            row.update(updates)
-            self._add_indexes(row)
+        return updated
 
-            updated += 1
+    def delete(self, where: Callable, changed: List = None):
+        self._ensure_loaded()
 
-        return updated
+        to_delete = []
+        for segment in self._storage.segments():
+            cancel.check()
+            to_delete.extend(filter(where, segment.rows))
+
+        if changed is not None:
+            changed.extend(self.row_key(row) for row in to_delete)
+
+        return self.delete_rows(to_delete)
+
+    def _apply_update(self, row: Dict, updates: Dict):
+        # the other columns of row are valid already: check updates only
+        self._validate_row(updates)
+        self._check_constraints(updates, ignore_row=row)
 
-    def delete(self, where: Callable):
-        to_delete = [row for row in self._storage.all() if where(row)]
+        self._remove_indexes(row)
+        row.update(updates)
+        self._add_indexes(row)
+        self._storage.touch(row, updates)
 
-        for row in to_delete:
+    def delete_rows(self, rows: List[Dict]):
+        if not rows:
+            return 0
+
+        for row in rows:
             self._remove_indexes(row)
 
-        return self._storage.delete(where)
+        self.version += 1
+        return self._storage.remove(rows)
+
+    # ================= LOG REPLAY =================
+
+    def row_key(self, row: Dict) -> Dict:
+        """Smallest image that identifies a row: its PK, else every column."""
+        if self.primary_key and row[self.primary_key] is not None:
+            return {self.primary_key: row[self.primary_key]}
+        return row.to_dict()
+
+    def find_rows(self, keys: List[Dict]) -> List[Dict]:
+        """Returns one stored row per key (as produced by row_key)."""
+        self._ensure_loaded()
+
+        found = []
+        taken = set()
+        cols = list(self.columns)
+        wanted = Counter()
+
+        for key in keys:
+            if len(key) == 1 and key.get(self.primary_key) is not None:
+                bucket = self._indexes[self.primary_key].get(
+                    key[self.primary_key]
+                )
+                if not bucket:
+                    raise TableError(f"Row with key {key} not found")
+                found.append(bucket[0])
+                continue
+
+            # full row image: narrow down through any index it hits
+            col = next(
+                (c for c in self._indexes if key.get(c) is not None), None
+            )
+            if col is None:
+                wanted[tuple(key.get(c) for c in cols)] += 1
+                continue
+
+            for row in self._indexes[col].get(key[col], ()):
+                if id(row) not in taken and all(
+                    row[c] == key.get(c) for c in cols
+                ):
+                    taken.add(id(row))
+                    found.append(row)
+                    break
+
+        if wanted:
+            for row in self._storage.all():
+                image = tuple(row[c] for c in cols)
+                if wanted[image] > 0:
+                    wanted[image] -= 1
+                    found.append(row)
+
+        if len(found) != len(keys):
+            raise TableError("Rows to replay not found")
+        return found
+
+    def update_rows(self, rows: List[Dict], updates: Dict):
+        self._ensure_loaded()
+
+        for row in rows:
+            self._apply_update(row, updates)
+        if rows:
+            self.version += 1
+
+    # ================= SECONDARY INDEXES =================
+
+    def create_index(self, name, columns, include=None, where=None):
+        """Adds a CREATE INDEX index, built in bulk over current rows."""
+        if name in self.secondary:
+            raise SchemaError(f"Index '{name}' already exists")
+
+        referenced = list(columns) + list(include or [])
+        if where is not None:
+            referenced += sorted(where_columns(where))
+        for col in referenced:
+            if col not in self.columns:
+                raise SchemaError(f"Index '{name}': unknown column '{col}'")
+
+        try:
+            index = SecondaryIndex(name, columns, include, where)
+        except SecondaryIndexError as e:
+            raise SchemaError(str(e)) from None
+
+        if self.loaded:
+            index.build(self._storage.all())
+        self.secondary[name] = index
+        self._schema_changed()
+        self.version += 1
+        return index
+
+    def drop_index(self, name):
+        if name not in self.secondary:
+            raise SchemaError(f"Index '{name}' does not exist")
+        del self.secondary[name]
+        self._schema_changed()
+        self.version += 1
+
+    def choose_index(self, where, covering=None):
+        """
+        (index, key prefix) of the secondary index that narrows where
+        the most, or (None, None). With covering, only indexes holding
+        all of those columns are considered.
+        """
+        self._ensure_loaded()
+
+        candidates = self.secondary.values()
+        if covering is not None:
+            candidates = [i for i in candidates if i.covers(covering)]
+        return choose_index(candidates, where)
+
+    def choose_range_index(self, where):
+        """(index, low, high) serving a range of where (see core.index)."""
+        self._ensure_loaded()
+        return choose_range_index(self.secondary.values(), where)
+
+    def value_lookup(self, column):
+        """
+        Function from a value to the rows holding it in column, through
+        a key or full secondary index on it, or None if not indexed.
+        """
+        self._ensure_loaded()
+        if column in self._indexes:
+            index = self._indexes[column]
+            return lambda value: index.get(value, ())
+
+        for index in self.secondary.values():
+            if index.columns[0] == column and index.where is None:
+                return lambda value: index.lookup((value,))
+        return None
+
+    def build_indexes(self):
+        """Rebuilds every secondary index from the stored rows."""
+        rows = self._storage.all()
+        for index in self.secondary.values():
+            index.build(rows)
+
+    # ================= BLOCK SYNOPSES =================
+
+    def _synopsis(self, segment):
+        """
+        Synopsis of a storage segment. Built once the segment is full:
+        until then inserts keep changing it and reading it is as cheap.
+        """
+        synopsis = segment.synopsis
+        if synopsis is None and (
+            len(segment.rows) >= self._storage.segment_rows
+        ):
+            synopsis = summarize(
+                segment.rows, self.columns, self.bloom_filters
+            )
+            segment.synopsis = synopsis
+        return synopsis
+
+    def blocks(self, where=None, keys=None, stats=None):
+        """
+        Storage segments whose synopses do not rule out a row matching
+        where (a bound WHERE tree) and, with keys=(column, sorted
+        values), holding one of values in column. stats, a dict,
+        receives the number of blocks, of blocks skipped and of rows in
+        the blocks kept (rows_read).
+        """
+        self._ensure_loaded()
+
+        segments = self._storage.segments()
+        if where is None and keys is None:
+            kept = segments
+        else:
+            kept = []
+            for segment in segments:
+                synopsis = self._synopsis(segment)
+                if synopsis is None or (
+                    synopsis.may_match(where)
+                    and (keys is None or synopsis.may_contain(*keys))
+                ):
+                    kept.append(segment)
+
+        if stats is not None:
+            stats["blocks"] = stats.get("blocks", 0) + len(segments)
+            stats["blocks_skipped"] = (
+                stats.get("blocks_skipped", 0) + len(segments) - len(kept)
+            )
+            stats["rows_read"] = stats.get("rows_read", 0) + sum(
+                len(segment.rows) for segment in kept
+            )
+        return kept
+
+    def candidates(self, where=None, keys=None, stats=None):
+        """Rows of the blocks that may match (see blocks), unfiltered."""
+        rows = []
+        for segment in self.blocks(where, keys, stats):
+            cancel.check()
+            rows.extend(segment.rows)
+        return rows
+
+    def scan(self, where=None, keys=None, stats=None):
+        """Rows matching where, read from the blocks that may match."""
+        segments = self.blocks(where, keys, stats)
+        predicate = self.predicate(where) if where is not None else None
+
+        # checked for cancellation block by block
+        rows = []
+        for segment in segments:
+            cancel.check()
+            if predicate is None:
+                rows.extend(segment.rows)
+            else:
+                rows.extend(filter(predicate, segment.rows))
+        return rows
 
     # ================= ACCESS =================
 
+    def partitions(self, where=None):
+        """Tables holding the rows that can match where: just this one."""
+        return [self]
+
+    def is_indexed(self, column: str) -> bool:
+        return column in self._indexes
+
+    def values_of(self, column: str):
+        """Container of the values in column: index keys if indexed."""
+        self._ensure_loaded()
+        index = self._indexes.get(column)
+        if index is not None:
+            return index.keys()
+        return {row.get(column) for row in self._storage.all()}
+
+    def segments(self):
+        self._ensure_loaded()
+        return self._storage.segments()
+
+    def mark_dirty(self):
+        self._storage.mark_all_dirty()
+
     @property
     def rows(self):
+        self._ensure_loaded()
         return self._storage.all()
+
+    # ================= LOADING =================
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self._loader(self)
+
+    def unload(self):
+        """Drops rows and indexes from memory; reloaded on next access."""
+        if self._loader is None:
+            raise TableError(f"Table '{self.name}' cannot be reloaded")
+
+        self._storage = MemoryStorage()
+        self._indexes = {}
+        self._init_indexes()
+        for index in self.secondary.values():
+            index.clear()
+        self._schema_changed()
+        self.loaded = False
+        self.version += 1
+
+    def is_dirty(self):
+        return any(segment.dirty for segment in self._storage.segments())
+
+    def memory_estimate(self, sample_size=64) -> int:
+        """Approximate bytes held by rows, from a sample of them."""
+        count = len(self._storage)
+        if not self.loaded or not count:
+            return 0
+
+        sample = self._storage.all()[:sample_size]
+        per_row = sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+            for row in sample
+        ) / len(sample)
+        return int(per_row * count)
+
+
+# ================= INSERT COMPILER =================
+
+def _compile_insert(table, coerce):
+    columns = list(table.columns)
+    keys = table._key_columns()
+    indexed = list(table._indexes)
+
+    namespace = {
+        "known": frozenset(columns),
+        "Record": table._record,
+        "store": table._storage.insert,
+        "unknown": _unknown_column,
+        "mistyped": _mistyped,
+        "convert": _convert,
+        "duplicate": _duplicate,
+    }
+
+    values = []
+    row_lines = []
+    for i, (col, col_type) in enumerate(table.columns.items()):
+        namespace[f"t{i}"] = col_type
+        namespace[f"c{i}"] = col
+        values.append(f"v{i}")
+        row_lines.append(f"v{i} = get({col!r})")
+        if coerce:
+            row_lines += [
+                f"if v{i} is not None and v{i}.__class__ is not t{i}:",
+                f"    v{i} = convert(c{i}, t{i}, v{i})",
+            ]
+        else:
+            row_lines += [
+                f"if v{i} is not None and v{i}.__class__ is not t{i} "
+                f"and not isinstance(v{i}, t{i}):",
+                f"    mistyped(c{i}, t{i})",
+            ]
+    prologue = [
+        "if not known.issuperset(row):",
+        "    unknown(row, known)",
+        "get = row.get",
+    ]
+    build = f"Record({', '.join(values)})"
+    var = {col: f"v{columns.index(col)}" for col in columns}
+
+    one = ["def insert_one(row, check):"]
+    one += ["    " + line for line in prologue + row_lines]
+    one += [
+        f"    record = {build}",
+        "    if check is not None:",
+        "        check(record)",
+    ]
+    for n, col in enumerate(indexed):
+        namespace[f"index{n}"] = table._indexes[col]
+        if col in keys:
+            one += [
+                f"    if {var[col]} is not None and {var[col]} in index{n}:",
+                f"        duplicate({col!r}, {var[col]})",
+            ]
+    one.append("    store(record)")
+    for n, col in enumerate(indexed):
+        one += [
+            f"    if {var[col]} is not None:",
+            f"        bucket = index{n}.get({var[col]})",
+            "        if bucket is None:",
+            f"            index{n}[{var[col]}] = [record]",
+            "        else:",
+            "            bucket.append(record)",
+        ]
+    for n, index in enumerate(table.secondary.values()):
+        namespace[f"add{n}"] = index.add
+        one.append(f"    add{n}(record)")
+    one.append("    return record")
+
+    many = [
+        "def build_many(rows):",
+        "    records = []",
+        "    append = records.append",
+    ]
+    for n, col in enumerate(indexed):
+        many.append(f"    keys{n} = []")
+    many.append("    for row in rows:")
+    many += ["        " + line for line in prologue + row_lines]
+    many.append(f"        append({build})")
+    for n, col in enumerate(indexed):
+        many.append(f"        keys{n}.append({var[col]})")
+    indexed_values = ", ".join(
+        f"{col!r}: keys{n}" for n, col in enumerate(indexed)
+    )
+    many.append(f"    return records, {{{indexed_values}}}")
+
+    exec("\n".join(one + many), namespace)
+    return namespace["insert_one"], namespace["build_many"]
+
+
+def _unknown_column(row, known):
+    for col in row:
+        if col not in known:
+            raise SchemaError(f"Unknown column '{col}'")
+
+
+def _mistyped(col, col_type):
+    raise SchemaError(f"Column '{col}' expects {col_type.__name__}")
+
+
+def _convert(col, col_type, value):
+    try:
+        return col_type(value)
+    except (TypeError, ValueError):
+        raise SchemaError(
+            f"Column '{col}' expects {col_type.__name__}"
+        ) from None
+
+
+def _duplicate(key, value):
+    raise ConstraintViolationError(
+        f"Duplicate value '{value}' for key '{key}'"
+    )
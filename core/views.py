@@ -0,0 +1,136 @@
+# core/views.py
+
+from sql.expressions import evaluate_where
+
+
+class ViewError(Exception):
+    pass
+
+
+def _join_columns(query):
+    left_col, right_col = query["join"]["on"]
+    return left_col.split(".")[-1], right_col.split(".")[-1]
+
+
+def base_tables(query):
+    tables = [query["table"]]
+    if query.get("join"):
+        tables.append(query["join"]["table"])
+    return tables
+
+
+def view_columns(query, get_table):
+    """Output schema of a view: joined columns (right wins), projected."""
+    merged = dict(get_table(query["table"]).columns)
+    if query.get("join"):
+        merged.update(get_table(query["join"]["table"]).columns)
+
+    fields = query.get("fields")
+    if not fields:
+        return merged
+
+    columns = {}
+    for field in fields:
+        col = field.split(".")[-1]
+        if col not in merged:
+            raise ViewError(f"Unknown column '{field}'")
+        columns[col] = merged[col]
+    return columns
+
+
+def index_column(query, get_table, columns):
+    """
+    Column of the view to index, so that the rows derived from a
+    changed base row can be found without scanning the view.
+    """
+    candidates = [get_table(query["table"]).primary_key]
+    if query.get("join"):
+        candidates.extend(_join_columns(query))
+
+    for col in candidates:
+        if col and col in columns:
+            return col
+    return None
+
+
+# ================= EVALUATION =================
+
+def _derive(query, columns, left_rows, right_rows):
+    """Output rows of left_rows (filtered here) joined with right_rows."""
+    where = query.get("where")
+    if where is not None:
+        left_rows = [row for row in left_rows if evaluate_where(where, row)]
+
+    if query.get("join"):
+        left_col, right_col = _join_columns(query)
+        hash_table = {}
+        for r in right_rows:
+            key = r[right_col]
+            if key is not None:
+                hash_table.setdefault(key, []).append(r)
+
+        merged = [
+            {**l, **r}
+            for l in left_rows
+            for r in hash_table.get(l[left_col], ())
+        ]
+    else:
+        merged = left_rows
+
+    return [{col: row[col] for col in columns} for row in merged]
+
+
+def _matching(table, col, keys):
+    """Current rows of table whose col is in keys."""
+    keys = {k for k in keys if k is not None}
+    if not keys:
+        return []
+
+    if table.is_indexed(col):
+        rows = []
+        for key in keys:
+            rows.extend(table.select({"op": "=", "left": col, "right": key}))
+        return rows
+
+    return table.select(lambda row: row[col] in keys)
+
+
+def compute(query, columns, get_table):
+    """Full evaluation of a view query."""
+    left = get_table(query["table"])
+    right_rows = None
+    if query.get("join"):
+        right_rows = get_table(query["join"]["table"]).rows
+    return _derive(query, columns, left.rows, right_rows)
+
+
+def delta(query, columns, get_table, table_name, old_rows, new_rows):
+    """
+    Returns (removed, added) view rows for a change of table_name from
+    old_rows to new_rows, or None when the view has to be recomputed
+    (a table joined with itself).
+    """
+    join = query.get("join")
+    if join and join["table"] == query["table"]:
+        return None
+
+    if not join:
+        return (
+            _derive(query, columns, old_rows, None),
+            _derive(query, columns, new_rows, None),
+        )
+
+    left_col, right_col = _join_columns(query)
+    left = get_table(query["table"])
+    right = get_table(join["table"])
+
+    if table_name == query["table"]:
+        def joined(rows):
+            matches = _matching(right, right_col, (r[left_col] for r in rows))
+            return _derive(query, columns, rows, matches)
+    else:
+        def joined(rows):
+            matches = _matching(left, left_col, (r[right_col] for r in rows))
+            return _derive(query, columns, matches, rows)
+
+    return joined(old_rows), joined(new_rows)
@@ -1,9 +1,13 @@
 # repl.py
 
+import os
 
 from core.database import Database
 from sql.parser import SQLParser, SQLParseError
 from sql.executor import SQLExecutor, SQLExecutionError
+from sql.admission import DEFAULT_HEAVY_QUERIES
+from sql.cancel import parse_timeout
+from sql.spill import DEFAULT_MEMORY_LIMIT, DEFAULT_QUERY_MEMORY
 
 
 def print_result(result):
@@ -41,9 +45,37 @@ def print_result(result):
 
 
 def repl():
-    db = Database()
+    db = Database(
+        durability=os.environ.get("RDMS_DURABILITY", "sync"),
+        role=os.environ.get("RDMS_ROLE", "writer"),
+    )
     parser = SQLParser()
-    executor = SQLExecutor(db)
+    executor = SQLExecutor(
+        db,
+        parallelism=int(os.environ.get("RDMS_PARALLELISM", "1")),
+        query_memory=int(
+            os.environ.get("RDMS_QUERY_MEMORY", DEFAULT_QUERY_MEMORY)
+        ),
+        memory_limit=int(
+            os.environ.get("RDMS_MEMORY_LIMIT", DEFAULT_MEMORY_LIMIT)
+        ),
+        statement_timeout=parse_timeout(
+            os.environ.get("RDMS_STATEMENT_TIMEOUT", "0")
+        ),
+        heavy_queries=int(
+            os.environ.get("RDMS_HEAVY_QUERIES", DEFAULT_HEAVY_QUERIES)
+        ),
+        adaptive_indexes=os.environ.get("RDMS_ADAPTIVE_INDEXES") == "1",
+    )
+
+    rec = db.recovery
+    print(
+        f"Recovered {rec['tables']} table(s) from checkpoint LSN "
+        f"{rec['checkpoint_lsn']}, replayed {rec['replayed']} log "
+        f"record(s) in {rec['seconds'] * 1000:.1f} ms"
+    )
+    if db.role == "follower":
+        print("Read-only follower of the writer's log")
 
     print("RDBMS Interactive Shell")
     print("Type SQL statements ending with ';'")
@@ -58,6 +90,8 @@ def repl():
 
             if line.lower() in ("exit", "quit"):
                 print("Bye 👋")
+                executor.close()
+                db.close()
                 break
 
             buffer += " " + line
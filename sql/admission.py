@@ -0,0 +1,102 @@
+# sql/admission.py
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from sql.cancel import QueryCancelledError
+
+
+# heavy statements (scans, joins, bulk work) running at once
+DEFAULT_HEAVY_QUERIES = 2
+
+# rows a statement may have to read without an index and still count
+# as light
+HEAVY_SCAN_ROWS = 50_000
+
+
+class AdmissionController:
+    """
+    Caps the heavy statements running at once; the rest wait in arrival
+    order for a slot. Light statements (index lookups, small scans,
+    DDL) are never queued, so they are not held up behind a long join.
+    limit None runs everything at once.
+    """
+
+    def __init__(self, limit=DEFAULT_HEAVY_QUERIES):
+        self.limit = limit or None
+        self.running = 0
+        self.queued = 0
+        self.admitted = 0
+        self._waiting = deque()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+    @contextmanager
+    def admit(self, heavy, token=None):
+        """
+        Runs the block once a slot is free if heavy, else right away.
+        Waiting ends with QueryCancelledError when token (a CancelToken)
+        is cancelled or its deadline passes first. Re-entrant: a
+        statement run inside an admitted one takes no second slot.
+        """
+        if not heavy or self.limit is None or getattr(
+            self._local, "admitted", False
+        ):
+            yield
+            return
+
+        self._acquire(token)
+        self._local.admitted = True
+        try:
+            yield
+        finally:
+            self._local.admitted = False
+            with self._cond:
+                self.running -= 1
+                self._cond.notify_all()
+
+    def _acquire(self, token):
+        ticket = object()
+        with self._cond:
+            if self.running < self.limit and not self._waiting:
+                self.running += 1
+                self.admitted += 1
+                return
+
+            self._waiting.append(ticket)
+            self.queued += 1
+            try:
+                while (
+                    self._waiting[0] is not ticket
+                    or self.running >= self.limit
+                ):
+                    if token is not None:
+                        token.check()
+                        timeout = token.remaining()
+                    else:
+                        timeout = None
+                    # woken by every release; a cancel() is noticed
+                    # within a second
+                    self._cond.wait(1.0 if timeout is None else min(
+                        timeout, 1.0
+                    ))
+            except QueryCancelledError:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+                raise
+
+            self._waiting.popleft()
+            self.running += 1
+            self.admitted += 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "running": self.running,
+                "waiting": len(self._waiting),
+                "admitted": self.admitted,
+                "queued": self.queued,
+            }
@@ -0,0 +1,261 @@
+# sql/advisor.py
+
+import threading
+from collections import Counter, deque
+
+from sql.expressions import equalities, ranges
+
+
+# advice lists columns whose queries scanned at least this many rows
+ADVICE_MIN_ROWS = 10_000
+# adaptive mode: rows scanned on a column's behalf before it is indexed
+DEFAULT_INDEX_THRESHOLD = 1_000_000
+# adaptive mode: statements on a table after which an adaptive index
+# that none of them used is dropped
+DEFAULT_UNUSED_STATEMENTS = 1_000
+# statements kept in the recent workload
+RECENT_STATEMENTS = 256
+# name prefix of the indexes adaptive mode creates, and alone drops
+ADAPTIVE_PREFIX = "auto_"
+
+
+def adaptive_name(table, column):
+    return f"{ADAPTIVE_PREFIX}{table}_{column}_idx"
+
+
+def indexable_columns(where):
+    """Columns of the ANDed =, < and > terms an index could serve."""
+    return set(equalities(where)) | {
+        col for col, bounds in ranges(where).items() if bounds
+    }
+
+
+def _table_name(table):
+    # partitions are reported as the table they belong to
+    return table.partition_of or table.name
+
+
+class QueryProfile:
+    """
+    What one statement filtered and joined on, and the rows it read,
+    filled in by the executor as the statement runs.
+    """
+
+    __slots__ = ("tables", "predicates", "costs", "rows_scanned")
+
+    def __init__(self):
+        self.tables = set()
+        # (table, column, "equality" | "range" | "join")
+        self.predicates = set()
+        # (table, column) -> rows read that an index on it could spare
+        self.costs = Counter()
+        self.rows_scanned = 0
+
+    def filtered(self, table, where):
+        """Notes the predicates of a bound WHERE tree on table."""
+        name = _table_name(table)
+        self.tables.add(name)
+        for col in equalities(where):
+            self.predicates.add((name, col, "equality"))
+        for col, bounds in ranges(where).items():
+            if bounds:
+                self.predicates.add((name, col, "range"))
+
+    def joined(self, left, left_col, right, right_col):
+        self.tables.update((left, right))
+        self.predicates.add((left, left_col, "join"))
+        self.predicates.add((right, right_col, "join"))
+
+    def scanned(self, table, rows, columns=()):
+        """
+        Notes rows read from table that an index on one of columns could
+        have spared.
+        """
+        name = _table_name(table)
+        self.rows_scanned += rows
+        for col in columns:
+            self.costs[name, col] += rows
+
+
+class IndexAdvisor:
+    """
+    Workload statistics of an executor: per column, how often queries
+    filter on it by equality or range or join on it, and how many rows
+    were scanned for want of an index on it. advice() turns them into
+    CREATE INDEX (and DROP INDEX for unused indexes) recommendations.
+
+    With adaptive set, adaptations() names the columns whose scan cost
+    crossed threshold, to be indexed in the background, and the
+    adaptive indexes (ADAPTIVE_PREFIX) unused for unused_after
+    statements on their table, to be dropped.
+    """
+
+    def __init__(
+        self,
+        database,
+        adaptive=False,
+        threshold=DEFAULT_INDEX_THRESHOLD,
+        unused_after=DEFAULT_UNUSED_STATEMENTS,
+    ):
+        self.db = database
+        self.adaptive = adaptive
+        self.threshold = threshold
+        self.unused_after = unused_after
+
+        # (table, column) -> Counter of equality, range, join, rows
+        self.columns = {}
+        self.statements = Counter()
+        self.rows_scanned = 0
+        # recent statements: tables, columns and rows scanned
+        self.recent = deque(maxlen=RECENT_STATEMENTS)
+
+        # index name -> (lookups, table statements) when last seen used
+        self._seen = {}
+        # adaptive changes handed out and not yet done
+        self._pending = set()
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    # ================= RECORDING =================
+
+    def record(self, profile: QueryProfile):
+        with self._lock:
+            for table in profile.tables:
+                self.statements[table] += 1
+            for table, col, kind in profile.predicates:
+                self._use(table, col)[kind] += 1
+            for key, rows in profile.costs.items():
+                self._use(*key)["rows"] += rows
+            self.rows_scanned += profile.rows_scanned
+
+            self.recent.append({
+                "tables": sorted(profile.tables),
+                "columns": sorted(
+                    f"{table}.{col}" for table, col, _ in profile.predicates
+                ),
+                "rows_scanned": profile.rows_scanned,
+            })
+
+    def _use(self, table, col):
+        use = self.columns.get((table, col))
+        if use is None:
+            use = self.columns[table, col] = Counter()
+        return use
+
+    # ================= ADVICE =================
+
+    def _indexed(self, table, col, use):
+        """Whether table has an index serving col as it is used."""
+        if table not in self.db.list_tables():
+            # dropped since: nothing to advise
+            return True
+        table = self.db.get_table(table)
+        if use["range"] and not use["equality"] and not use["join"]:
+            # only ordered (secondary) indexes serve ranges
+            return any(
+                index.columns[0] == col and index.where is None
+                for index in table.secondary.values()
+            )
+        return table.value_lookup(col) is not None
+
+    def _unused(self):
+        """(table, index) of secondary indexes no recent statement used."""
+        unused = []
+        for name in self.db.list_tables():
+            table = self.db.get_table(name)
+            for index in list(table.secondary.values()):
+                lookups = self._lookups(table, index.name)
+                seen = self._seen.get(index.name)
+                statements = self.statements[table.name]
+                if seen is None or seen[0] != lookups:
+                    self._seen[index.name] = (lookups, statements)
+                elif statements - seen[1] >= self.unused_after:
+                    unused.append((table.name, index))
+        return unused
+
+    def _lookups(self, table, name):
+        # a partitioned table's index is used through its partitions
+        return sum(
+            part.secondary[name].lookups
+            for part in table.partitions()
+            if name in part.secondary
+        )
+
+    def advice(self):
+        """
+        Rows for SHOW INDEX ADVICE: columns worth indexing, costliest
+        first, then unused indexes worth dropping.
+        """
+        with self._lock:
+            rows = []
+            for (table, col), use in sorted(
+                self.columns.items(), key=lambda item: -item[1]["rows"]
+            ):
+                if use["rows"] < ADVICE_MIN_ROWS:
+                    break
+                if self._indexed(table, col, use):
+                    continue
+                rows.append(self._advice_row(
+                    table, col, use, f"CREATE INDEX ON {table} ({col})"
+                ))
+
+            for table, index in self._unused():
+                col = index.columns[0]
+                use = self.columns.get((table, col), Counter())
+                rows.append(self._advice_row(
+                    table, ", ".join(index.columns), use,
+                    f"DROP INDEX {index.name}",
+                ))
+            return rows
+
+    def _advice_row(self, table, column, use, advice):
+        return {
+            "table": table,
+            "column": column,
+            "equality": use["equality"],
+            "range": use["range"],
+            "join": use["join"],
+            "rows_scanned": use["rows"],
+            "advice": advice,
+        }
+
+    # ================= ADAPTIVE =================
+
+    def adaptations(self):
+        """
+        (columns to index, indexes to drop) for adaptive mode: columns
+        as (table, column) whose scan cost crossed the threshold, and
+        adaptive indexes left unused. Each is handed out once; call
+        done() when it has been applied.
+        """
+        if not self.adaptive or self.db.role == "follower":
+            return [], []
+
+        with self._lock:
+            create = []
+            for (table, col), use in self.columns.items():
+                if (
+                    use["rows"] >= self.threshold
+                    and (table, col) not in self._pending
+                    and not self._indexed(table, col, use)
+                ):
+                    # counted anew should the index be dropped again
+                    use["rows"] = 0
+                    create.append((table, col))
+
+            drop = [
+                index.name
+                for _, index in self._unused()
+                if index.name.startswith(ADAPTIVE_PREFIX)
+                and index.name not in self._pending
+            ]
+            self._pending.update(create)
+            self._pending.update(drop)
+            return create, drop
+
+    def done(self, change, error=None):
+        with self._lock:
+            self._pending.discard(change)
+            self._seen.pop(change, None)
+            if error is not None:
+                self.last_error = error
@@ -0,0 +1,133 @@
+# sql/aggregate.py
+
+# Aggregates are computed in two phases (partial states, then merge and
+# finalize) so the same code runs serially or per morsel in worker processes.
+
+AGGREGATE_FUNCS = ("COUNT", "SUM", "MIN", "MAX", "AVG")
+
+
+def _initial_state(func):
+    if func == "COUNT":
+        return 0
+    if func == "AVG":
+        return [0, 0]
+    return None
+
+
+def _step(func, state, value):
+    if func == "COUNT":
+        return state + 1
+
+    if value is None:
+        return state
+
+    if func == "SUM":
+        return value if state is None else state + value
+    if func == "MIN":
+        return value if state is None or value < state else state
+    if func == "MAX":
+        return value if state is None or value > state else state
+    if func == "AVG":
+        state[0] += value
+        state[1] += 1
+        return state
+
+    raise ValueError(f"Unknown aggregate '{func}'")
+
+
+def _combine(func, a, b):
+    if func == "COUNT":
+        return a + b
+    if func == "AVG":
+        return [a[0] + b[0], a[1] + b[1]]
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if func == "SUM":
+        return a + b
+    if func == "MIN":
+        return a if a <= b else b
+    if func == "MAX":
+        return a if a >= b else b
+
+    raise ValueError(f"Unknown aggregate '{func}'")
+
+
+# ================= PARTIAL =================
+
+def partial_aggregate(rows, aggregates, group_by=None, predicate=None):
+    """
+    Returns {group_key: [state, ...]} for the rows matching predicate.
+    COUNT(*) counts rows, COUNT(col) counts non-NULL values.
+    """
+    groups = {}
+
+    for row in rows:
+        if predicate is not None and not predicate(row):
+            continue
+
+        key = row[group_by] if group_by else None
+        states = groups.get(key)
+        if states is None:
+            states = [_initial_state(a["func"]) for a in aggregates]
+            groups[key] = states
+
+        for i, agg in enumerate(aggregates):
+            col = agg["column"]
+            if col == "*":
+                states[i] = _step(agg["func"], states[i], True)
+                continue
+
+            value = row[col]
+            if agg["func"] == "COUNT" and value is None:
+                continue
+            states[i] = _step(agg["func"], states[i], value)
+
+    return groups
+
+
+def merge_partials(partials, aggregates):
+    merged = {}
+
+    for groups in partials:
+        merge_into(merged, groups.items(), aggregates)
+
+    return merged
+
+
+def merge_into(merged, pairs, aggregates):
+    """Combines (group key, states) pairs into the groups of merged."""
+    for key, states in pairs:
+        current = merged.get(key)
+        if current is None:
+            merged[key] = states
+            continue
+
+        merged[key] = [
+            _combine(agg["func"], a, b)
+            for agg, a, b in zip(aggregates, current, states)
+        ]
+
+
+# ================= FINAL =================
+
+def finalize(groups, aggregates, group_by=None):
+    if not groups and not group_by:
+        # aggregates without GROUP BY always yield one row
+        groups = {None: [_initial_state(a["func"]) for a in aggregates]}
+
+    result = []
+    for key, states in groups.items():
+        out = {}
+        if group_by:
+            out[group_by] = key
+
+        for agg, state in zip(aggregates, states):
+            if agg["func"] == "AVG":
+                state = state[0] / state[1] if state[1] else None
+            out[agg["name"]] = state
+
+        result.append(out)
+
+    return result
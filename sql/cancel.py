@@ -0,0 +1,109 @@
+# sql/cancel.py
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from sql.expressions import SQLExecutionError
+
+
+# rows a loop without blocks (hash build, spill partitioning) handles
+# between two checks
+CHECK_ROWS = 4096
+
+
+class QueryCancelledError(SQLExecutionError):
+    pass
+
+
+class CancelToken:
+    """
+    Cancellation of one statement: cancel() from any thread, or a
+    deadline `timeout` seconds after creation. The statement's loops
+    call check() every block or chunk, which raises once it is
+    cancelled; work already done is kept as after any other error.
+    """
+
+    __slots__ = ("deadline", "reason")
+
+    def __init__(self, timeout=None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason = None
+
+    def cancel(self, reason="canceling statement due to user request"):
+        self.reason = reason
+
+    @property
+    def cancelled(self) -> bool:
+        try:
+            self.check()
+        except QueryCancelledError:
+            return True
+        return False
+
+    def remaining(self):
+        """Seconds until the deadline (0 once passed), None if none."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        if (
+            self.reason is None
+            and self.deadline is not None
+            and time.monotonic() >= self.deadline
+        ):
+            self.reason = "canceling statement due to statement timeout"
+        if self.reason is not None:
+            raise QueryCancelledError(self.reason)
+
+
+_TIMEOUT_UNITS = {"ms": 1, "s": 1000, "min": 60_000, "h": 3_600_000}
+
+
+def parse_timeout(value) -> int:
+    """
+    Milliseconds of a statement_timeout value: a number of milliseconds
+    or a number with a unit (ms, s, min, h), as in '2s'; 0 = none.
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*([a-z]*)\s*", str(value).lower())
+    if match is None or match.group(2) not in ("", *_TIMEOUT_UNITS):
+        raise SQLExecutionError(f"Invalid statement_timeout '{value}'")
+    return int(match.group(1)) * _TIMEOUT_UNITS.get(match.group(2), 1)
+
+
+# ================= CURRENT STATEMENT =================
+
+# token of the statement running on each thread; read by loops that do
+# not know the statement (table scans, updates, spill files)
+_local = threading.local()
+
+
+def current():
+    return getattr(_local, "token", None)
+
+
+def check():
+    """Raises QueryCancelledError if this thread's statement is."""
+    token = getattr(_local, "token", None)
+    if token is not None:
+        token.check()
+
+
+@contextmanager
+def cancellable(token):
+    """
+    Makes token the one check() tests on this thread while the block
+    runs. A statement run inside another keeps the outer token.
+    """
+    outer = current()
+    if token is None or outer is not None:
+        yield outer
+        return
+
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = None
@@ -1,7 +1,62 @@
 # sql/executor.py
 
-class SQLExecutionError(Exception):
-    pass
+import threading
+from contextlib import contextmanager
+from functools import partial
+from itertools import chain, islice
+from operator import itemgetter
+
+from core.bulk import BulkError, coerce_rows
+from core.record import as_dict
+from core.table import SchemaError
+from sql import cancel
+from sql.advisor import (
+    DEFAULT_INDEX_THRESHOLD,
+    IndexAdvisor,
+    QueryProfile,
+    adaptive_name,
+    indexable_columns,
+)
+from sql.admission import (
+    DEFAULT_HEAVY_QUERIES,
+    HEAVY_SCAN_ROWS,
+    AdmissionController,
+)
+from sql.cancel import CancelToken, cancellable, parse_timeout
+from sql.expressions import (
+    SQLExecutionError,
+    compile_where,
+    equalities,
+    evaluate_where,
+    where_columns,
+)
+from sql.aggregate import partial_aggregate, merge_partials, finalize
+from sql.parallel import ParallelExecutor, SharedRows
+from sql.spill import (
+    DEFAULT_MEMORY_LIMIT,
+    DEFAULT_QUERY_MEMORY,
+    HASH_ENTRY_BYTES,
+    GROUP_ENTRY_BYTES,
+    MemoryBudget,
+    QueryMemory,
+    external_sort,
+    grace_join,
+    merge_groups,
+    order_key,
+)
+
+
+# a join skips left blocks holding none of the right side's keys when
+# the right join column is indexed and has at most this many keys
+JOIN_FILTER_KEYS = 4096
+
+# rows aggregated at a time when the groups may outgrow the budget
+AGGREGATE_BATCH_ROWS = 8192
+# left rows probed (and joined rows produced) at a time
+JOIN_CHUNK_ROWS = 8192
+# a join looks up each left row in an index on the right column instead
+# of hashing the right side when that has this many times the left rows
+INDEX_JOIN_RATIO = 8
 
 
 class SQLExecutor:
@@ -9,12 +64,76 @@ class SQLExecutor:
     Executes parsed SQL ASTs against the Database.
     """
 
-    def __init__(self, database):
+    def __init__(
+        self,
+        database,
+        parallelism=1,
+        parallel_threshold=None,
+        query_memory=DEFAULT_QUERY_MEMORY,
+        memory_limit=DEFAULT_MEMORY_LIMIT,
+        spill_dir=None,
+        statement_timeout=0,
+        heavy_queries=DEFAULT_HEAVY_QUERIES,
+        adaptive_indexes=False,
+        index_threshold=DEFAULT_INDEX_THRESHOLD,
+    ):
         self.db = database
 
+        # workload statistics behind SHOW INDEX ADVICE; with
+        # adaptive_indexes, columns whose scans cost index_threshold
+        # rows are indexed in the background
+        self.advisor = IndexAdvisor(
+            database, adaptive_indexes, index_threshold
+        )
+
+        # milliseconds a statement may run (queueing included) before it
+        # is cancelled; 0 = no limit. SET statement_timeout changes it
+        self.statement_timeout = statement_timeout
+        self.default_timeout = statement_timeout
+
+        # heavy statements (see _is_heavy) running at once, the others
+        # queued; None = no limit
+        self.admission = AdmissionController(heavy_queries)
+
+        # bytes of operator state (hash tables, sort buffers, groups) one
+        # query and all queries together may hold before spilling to
+        # temporary files in spill_dir; None = no limit
+        self.query_memory = query_memory
+        self.memory = MemoryBudget(memory_limit)
+        self.spill_dir = spill_dir
+
+        # degree of parallelism; 1 keeps every query serial
+        self.parallel = None
+        if parallelism and parallelism > 1:
+            self.parallel = ParallelExecutor(workers=parallelism)
+            if parallel_threshold is not None:
+                self.parallel.threshold = parallel_threshold
+
+        # state of the running query (EXPLAIN steps, memory), per thread:
+        # one executor may serve many requests at once
+        self._local = threading.local()
+
+    def close(self):
+        if self.parallel:
+            self.parallel.close()
+
     # ================= ENTRY =================
 
-    def execute(self, ast: dict):
+    def execute(self, ast: dict, token=None):
+        """
+        Runs a statement. token, a CancelToken, lets the caller cancel
+        it; without one a statement_timeout creates one. Cancelled
+        statements raise QueryCancelledError. Heavy statements wait for
+        an admission slot first.
+        """
+        if token is None and self.statement_timeout:
+            token = CancelToken(self.statement_timeout / 1000)
+
+        with cancellable(token) as token, self._workload(ast):
+            with self.admission.admit(self._is_heavy(ast), token):
+                return self._execute(ast)
+
+    def _execute(self, ast: dict):
         stmt_type = ast["type"]
 
         if stmt_type == "create_table":
@@ -23,12 +142,42 @@ class SQLExecutor:
             return self._insert(ast)
         if stmt_type == "select":
             return self._select(ast)
+        if stmt_type == "explain":
+            return self._explain(ast)
         if stmt_type == "update":
             return self._update(ast)
         if stmt_type == "delete":
             return self._delete(ast)
         if stmt_type == "show_tables":
             return self._show_tables()
+        if stmt_type == "create_index":
+            return self._create_index(ast)
+        if stmt_type == "drop_index":
+            self.db.drop_index(ast["name"])
+            return "OK"
+        if stmt_type == "create_view":
+            return self._create_view(ast)
+        if stmt_type == "refresh_view":
+            self.db.refresh_materialized_view(ast["view"])
+            return "OK"
+        if stmt_type == "drop_view":
+            return self._drop_view(ast)
+        if stmt_type == "copy":
+            return self._copy(ast)
+        if stmt_type == "show_storage":
+            return self._show_storage()
+        if stmt_type == "add_partition":
+            self.db.add_partition(ast["table"], ast["partition"], ast["bound"])
+            return "OK"
+        if stmt_type == "drop_partition":
+            self.db.drop_partition(ast["table"], ast["partition"])
+            return "OK"
+        if stmt_type == "set":
+            return self._set(ast)
+        if stmt_type == "show_setting":
+            return self._show_setting(ast)
+        if stmt_type == "show_index_advice":
+            return self.advisor.advice()
 
         raise SQLExecutionError(
             f"Unknown SQL statement type '{stmt_type}'"
@@ -39,6 +188,99 @@ class SQLExecutor:
     def _show_tables(self):
         return self.db.list_tables()
 
+    def _show_storage(self):
+        """Compression ratio and throughput of segment reads and writes."""
+        stats = self.db.storage_stats()
+        result = []
+        for operation in ("read", "write"):
+            s = stats[operation] or {}
+            ratio = s.get("compression_ratio")
+            mb_per_s = s.get("mb_per_s")
+            result.append({
+                "operation": operation,
+                "raw_bytes": s.get("raw_bytes", 0),
+                "stored_bytes": s.get("stored_bytes", 0),
+                "ratio": None if ratio is None else round(ratio, 2),
+                "mb_per_s": None if mb_per_s is None else round(mb_per_s, 1),
+            })
+        return result
+
+    # ================= SETTINGS =================
+
+    def _set(self, ast):
+        if ast["name"].lower() != "statement_timeout":
+            raise SQLExecutionError(f"Unknown setting '{ast['name']}'")
+
+        value = ast["value"]
+        if value is None:
+            self.statement_timeout = self.default_timeout
+        else:
+            self.statement_timeout = parse_timeout(value)
+        return "OK"
+
+    def _show_setting(self, ast):
+        if ast["name"].lower() != "statement_timeout":
+            raise SQLExecutionError(f"Unknown setting '{ast['name']}'")
+        timeout = self.statement_timeout
+        return f"{timeout}ms" if timeout else "0"
+
+    # ================= ADMISSION =================
+
+    def _is_heavy(self, ast):
+        """
+        Whether a statement is expected to read many rows without an
+        index (more than HEAVY_SCAN_ROWS): scans that blocks cannot
+        skip, joins (the whole right side is hashed), UPDATE and DELETE
+        (which test every row), bulk work. Estimated from indexes and
+        block synopses before running; errors are left to execution.
+        """
+        stmt_type = ast["type"]
+        if stmt_type == "explain":
+            ast, stmt_type = ast["query"], "select"
+        if stmt_type in (
+            "copy", "create_index", "create_view", "refresh_view"
+        ):
+            return True
+        if stmt_type not in ("select", "update", "delete"):
+            return False
+
+        try:
+            table = self.db.get_table(ast["table"])
+            where = self._bind_where(ast.get("where"), table.columns)
+            parts = table.partitions(where)
+            if stmt_type != "select":
+                rows = sum(self._table_rows(part) for part in parts)
+            else:
+                rows = sum(
+                    self._scan_estimate(part, where) for part in parts
+                )
+            if ast.get("join"):
+                rows += self._table_rows(
+                    self.db.get_table(ast["join"]["table"])
+                )
+        except Exception:
+            return False
+        return rows > HEAVY_SCAN_ROWS
+
+    def _scan_estimate(self, table, where):
+        """Rows a scan of table for where reads; 0 if an index serves."""
+        if where is not None:
+            index, _ = table.choose_index(where)
+            if index is None:
+                index, _, _ = table.choose_range_index(where)
+            if index is not None or any(
+                table.is_indexed(col) for col in equalities(where)
+            ):
+                return 0
+        return sum(len(segment.rows) for segment in table.blocks(where))
+
+    def _table_rows(self, table):
+        return sum(
+            len(segment.rows)
+            for part in table.partitions()
+            for segment in part.segments()
+        )
+
     # ================= CREATE =================
 
     def _create_table(self, ast):
@@ -48,9 +290,44 @@ class SQLExecutor:
             primary_key=ast.get("primary_key"),
             unique_keys=ast.get("unique_keys", []),
             foreign_keys=ast.get("foreign_keys", []),
+            indexes=ast.get("indexes", []),
+            compression=ast.get("compression"),
+            partitioning=ast.get("partitioning"),
+            bloom_filters=ast.get("bloom_filters"),
         )
         return "OK"
 
+    # ================= INDEXES =================
+
+    def _create_index(self, ast):
+        table = self.db.get_table(ast["table"])
+        name = self.db.create_index(
+            ast["table"],
+            ast["columns"],
+            name=ast.get("name"),
+            include=ast.get("include"),
+            where=self._bind_where(ast.get("where"), table.columns),
+        )
+        return f"Index '{name}' created"
+
+    # ================= MATERIALIZED VIEWS =================
+
+    def _create_view(self, ast):
+        query = dict(ast["query"])
+        table = self.db.get_table(query["table"])
+        query["where"] = self._bind_where(query.get("where"), table.columns)
+
+        self.db.create_materialized_view(ast["view"], query)
+        return "OK"
+
+    def _drop_view(self, ast):
+        if self.db.get_table(ast["view"]).view is None:
+            raise SQLExecutionError(
+                f"'{ast['view']}' is not a materialized view"
+            )
+        self.db.drop_table(ast["view"])
+        return "OK"
+
     # ================= INSERT =================
 
     def _insert(self, ast):
@@ -69,142 +346,787 @@ class SQLExecutor:
         else:
             raw_row = values
 
-        # ✅ TYPE COERCION BASED ON TABLE SCHEMA
-        row = {}
-        for col, val in raw_row.items():
-            expected_type = table.columns[col]
+        # coerced, checked and indexed by the table's compiled insert
+        try:
+            self.db.insert(ast["table"], raw_row, coerce=True)
+        except SchemaError as e:
+            # a literal that does not convert, or an unknown column
+            raise SQLExecutionError(str(e)) from None
+        return "OK"
 
-            if val is None:
-                row[col] = None
-                continue
+    def _coerce_row(self, table, raw_row):
+        # ✅ TYPE COERCION BASED ON TABLE SCHEMA (shared with COPY)
+        if not raw_row:
+            return {}
 
-            try:
-                row[col] = expected_type(val)
-            except Exception:
-                raise SQLExecutionError(
-                    f"Column '{col}' expects {expected_type.__name__}"
-                )
+        try:
+            rows = coerce_rows(
+                table.columns, list(raw_row), [list(raw_row.values())]
+            )
+        except BulkError as e:
+            raise SQLExecutionError(str(e)) from None
+        return rows[0]
 
-        self.db.insert(ast["table"], row)
-        return "OK"
+    # ================= COPY =================
+
+    def _copy(self, ast):
+        try:
+            if ast["direction"] == "from":
+                return self.db.copy_from(
+                    ast["table"], ast["path"], ast["format"], ast["header"]
+                )
+            return self.db.copy_to(ast["table"], ast["path"], ast["format"])
+        except BulkError as e:
+            raise SQLExecutionError(str(e)) from None
+        except OSError as e:
+            raise SQLExecutionError(f"COPY failed: {e}") from None
 
     # ================= SELECT =================
 
     def _select(self, ast):
+        with self._query_memory() as memory:
+            rows = self._select_rows(ast)
+
+            order_by = ast.get("order_by")
+            if order_by:
+                runs = []
+                rows = self._sorted(rows, order_by, memory, runs)
+            if ast.get("limit") is not None:
+                rows = islice(rows, ast["limit"])
+            rows = rows if isinstance(rows, list) else list(rows)
+
+            if order_by and runs and runs[0]:
+                self._note(
+                    self.db.get_table(ast["table"]), "external sort",
+                    len(rows), {"blocks": runs[0], "blocks_skipped": 0},
+                )
+            return rows
+
+    def _sorted(self, rows, order_by, memory, runs):
+        key = order_key(order_by)
+        try:
+            yield from external_sort(rows, key, memory, runs)
+        except KeyError as e:
+            raise SQLExecutionError(f"Unknown column '{e.args[0]}'") from None
+
+    def _select_rows(self, ast):
+        """
+        Result rows of a SELECT before ORDER BY and LIMIT: a list, or an
+        iterator for joins, whose output is never held whole unless it
+        is the result.
+        """
         table = self.db.get_table(ast["table"])
+        where = self._bind_where(ast.get("where"), table.columns)
+        aggregates = ast.get("aggregates")
+        self._filtered(table, where)
 
-        # 🔥 Indexed WHERE optimization happens inside Table.select
-        rows = table.select(ast.get("where"))
+        # partitions that can hold matching rows (pruned from where);
+        # each one is scanned on its own, with its own indexes
+        parts = table.partitions(where)
+        if table.partitioning is not None:
+            total = len(table.partitions())
+            self._note(table, "partitions", stats={
+                "blocks": total, "blocks_skipped": total - len(parts),
+            })
 
-        if ast.get("join"):
-            rows = self._execute_join(rows, ast)
+        if aggregates and not ast.get("join"):
+            # filter and aggregate fused in a single pass over the table
+            return self._aggregate(parts, None, where, ast)
 
         fields = ast.get("fields")
+        if fields and not aggregates and not ast.get("join"):
+            covered = [
+                self._covering_scan(part, where, fields) for part in parts
+            ]
+            if parts and None not in covered:
+                for part, rows in zip(parts, covered):
+                    self._note(part, "covering index", len(rows))
+                return [row for rows in covered for row in rows]
+
+        if ast.get("join"):
+            keys = self._join_filter(ast)
+            scanned = [
+                (part, self._scan(part, where, keys)) for part in parts
+            ]
+            if fields and not aggregates and not ast.get("group_by"):
+                # build only the projected columns of each joined pair
+                return chain.from_iterable(self._execute_join(
+                    scanned, ast, [field.split(".")[-1] for field in fields]
+                ))
+            rows = chain.from_iterable(self._execute_join(scanned, ast))
+        elif len(parts) == 1:
+            rows = self._scan(parts[0], where)
+        else:
+            rows = [row for part in parts for row in self._scan(part, where)]
+
+        if aggregates or ast.get("group_by"):
+            return self._aggregate(None, rows, None, ast)
 
         if fields and fields != ["*"]:
-            projected = []
-
-            for row in rows:
-                out = {}
-                for field in fields:
-                    col = field.split(".")[-1]
-                    if col not in row:
-                        raise SQLExecutionError(
-                            f"Unknown column '{field}'"
-                        )
-                    out[col] = row[col]
-                projected.append(out)
+            return self._project(rows, fields)
+
+        # stored rows are compact records; callers get dicts
+        return map(as_dict, rows)
+
+    def _project(self, rows, fields):
+        for row in rows:
+            out = {}
+            for field in fields:
+                col = field.split(".")[-1]
+                if col not in row:
+                    raise SQLExecutionError(f"Unknown column '{field}'")
+                out[col] = row[col]
+            yield out
 
-            rows = projected
+    def _scan(self, table, where, keys=None):
+        """
+        Rows of table matching where. keys, (column, sorted values) of a
+        join, lets the scan skip blocks holding none of those values.
+        """
+        if where is not None:
+            # 🔥 Indexed equality lookups are served by Table.select
+            if where["op"] == "=" and table.is_indexed(where["left"]):
+                rows = table.select(where)
+                self._note(table, "index", len(rows))
+                self._scanned(table, len(rows))
+                return rows
 
+            candidates = self._index_scan(table, where)
+            if candidates is not None:
+                rows = list(filter(table.predicate(where), candidates))
+                self._note(table, "index", len(rows))
+                self._scanned(table, len(candidates))
+                return rows
+
+            if self.parallel and self.parallel.should_parallelize(
+                self._table_rows(table)
+            ):
+                # workers need a picklable predicate
+                with self.parallel.publish(table) as shared:
+                    rows = self.parallel.filter(
+                        shared, partial(evaluate_where, where)
+                    )
+                self._note(table, "parallel scan", len(rows))
+                self._scanned(
+                    table, self._table_rows(table), indexable_columns(where)
+                )
+                return rows
+
+        # blocks whose synopses rule out a match are not read
+        stats = {}
+        rows = table.scan(where, keys, stats)
+        self._note(table, "scan", len(rows), stats)
+        self._scanned(table, stats["rows_read"], indexable_columns(where))
         return rows
 
+    def _index_scan(self, table, where):
+        """
+        Candidate rows for where from the most selective index over its
+        ANDed equalities, else from an index over a narrow range of
+        where (the caller applies where to them), or None.
+        """
+        index, prefix = table.choose_index(where)
+        if index is not None and len(prefix) > 1:
+            return index.lookup(prefix)
+
+        for col, value in equalities(where).items():
+            if table.is_indexed(col):
+                return table.select({"op": "=", "left": col, "right": value})
+
+        if index is not None:
+            return index.lookup(prefix)
+
+        # a narrow range of the leading column of an ordered index
+        index, low, high = table.choose_range_index(where)
+        if index is not None:
+            return index.range_lookup(low, high)
+        return None
+
+    def _covering_scan(self, table, where, fields):
+        """Answers a projection from a covering index alone, or None."""
+        if where is None:
+            return None
+
+        columns = [field.split(".")[-1] for field in fields]
+        index, prefix = table.choose_index(
+            where, covering=columns + sorted(where_columns(where))
+        )
+        if index is None:
+            return None
+
+        return [
+            {col: entry[col] for col in columns}
+            for entry in index.lookup_covered(prefix)
+            if evaluate_where(where, entry)
+        ]
+
+    def _bind_where(self, expr, columns):
+        """
+        Returns a copy of the WHERE tree with column names stripped of
+        their table prefix and literals coerced to the column types.
+        """
+        if expr is None:
+            return None
+
+        if expr["op"] in ("AND", "OR"):
+            return {
+                "op": expr["op"],
+                "left": self._bind_where(expr["left"], columns),
+                "right": self._bind_where(expr["right"], columns),
+            }
+
+        col = expr["left"].split(".")[-1]
+        value = expr["right"]
+        col_type = columns.get(col)
+
+        if col_type is not None and value is not None:
+            try:
+                value = col_type(value)
+            except (TypeError, ValueError):
+                raise SQLExecutionError(
+                    f"Column '{col}' expects {col_type.__name__}"
+                )
+
+        return {"op": expr["op"], "left": col, "right": value}
+
+    # ================= AGGREGATE =================
+
+    def _aggregate(self, tables, rows, where, ast):
+        """
+        Aggregates rows, or the rows of each of tables (the partitions
+        of one table) matching where, merging the partial states.
+        """
+        aggregates = ast.get("aggregates") or []
+        group_by = ast.get("group_by")
+
+        memory = self._local.memory
+        if tables is None:
+            partials = self._partials(
+                None, rows, where, aggregates, group_by, memory
+            )
+        else:
+            partials = self._table_partials(
+                tables, where, aggregates, group_by, memory
+            )
+
+        if not group_by:
+            # a single group: nothing that could outgrow the budget
+            return finalize(merge_partials(partials, aggregates), aggregates)
+
+        # the group table spills by key hash once over budget
+        spilled = []
+        result = []
+        for groups in merge_groups(partials, aggregates, memory, spilled):
+            result.extend(finalize(groups, aggregates, group_by))
+
+        if spilled[0]:
+            self._note(
+                self.db.get_table(ast["table"]), "spilled aggregate",
+                len(result), {"blocks": spilled[0], "blocks_skipped": 0},
+            )
+        return result
+
+    def _table_partials(self, tables, where, aggregates, group_by, memory):
+        for table in tables:
+            # rows from an index or of the blocks that may match,
+            # filtered while aggregating
+            rows = self._index_scan(table, where) if where else None
+            if rows is not None:
+                self._note(table, "index", len(rows))
+                self._scanned(table, len(rows))
+            else:
+                stats = {}
+                rows = table.candidates(where, None, stats)
+                self._note(table, "scan", len(rows), stats)
+                self._scanned(table, len(rows), indexable_columns(where))
+            yield from self._partials(
+                table, rows, where, aggregates, group_by, memory
+            )
+
+    def _partials(self, table, rows, where, aggregates, group_by, memory):
+        """
+        Partial states of rows (a list or an iterator) in one piece, or
+        batch by batch when the groups might not fit in memory, so that
+        they can be spilled in between, or when the statement can be
+        cancelled.
+        """
+        if isinstance(rows, list):
+            room = memory.available()
+            whole = (
+                not group_by
+                or room is None
+                or len(rows) * GROUP_ENTRY_BYTES <= room
+            )
+            if (
+                # batches also let a cancelled statement stop early
+                (whole and cancel.current() is None)
+                or len(rows) <= AGGREGATE_BATCH_ROWS
+                or (self.parallel and self.parallel.should_parallelize(
+                    len(rows)
+                ))
+            ):
+                yield self._partial_aggregate(
+                    table, rows, where, aggregates, group_by
+                )
+                return
+
+        rows = iter(rows)
+        while True:
+            cancel.check()
+            batch = list(islice(rows, AGGREGATE_BATCH_ROWS))
+            if not batch:
+                return
+            yield self._partial_aggregate(
+                table, batch, where, aggregates, group_by
+            )
+
+    def _partial_aggregate(self, table, rows, where, aggregates, group_by):
+        """Partial states of rows, the rows of table if it is given."""
+        for col in [a["column"] for a in aggregates] + [group_by]:
+            if col and col != "*" and rows and col not in rows[0]:
+                raise SQLExecutionError(f"Unknown column '{col}'")
+
+        if self.parallel and self.parallel.should_parallelize(len(rows)):
+            # workers need a picklable predicate
+            predicate = partial(evaluate_where, where) if where else None
+            if table is not None:
+                with self.parallel.publish(table) as shared:
+                    groups = self.parallel.aggregate(
+                        shared, aggregates, group_by, predicate
+                    )
+            else:
+                shared = SharedRows(rows, self.parallel.morsel_size)
+                try:
+                    groups = self.parallel.aggregate(
+                        shared, aggregates, group_by, predicate
+                    )
+                finally:
+                    shared.close()
+        else:
+            predicate = None
+            if where and table is not None:
+                predicate = table.predicate(where)
+            elif where:
+                predicate = compile_where(where)
+            groups = partial_aggregate(rows, aggregates, group_by, predicate)
+        return groups
+
+    # ================= EXPLAIN =================
+
+    def _explain(self, ast):
+        """
+        Runs the query and returns one row per table access: how it was
+        read (index, covering index, scan, parallel scan), the blocks
+        (storage segments) it had and those skipped by their synopses,
+        and the rows it produced (read, for aggregates, which filter as
+        they go). A partitioned table adds a "partitions" row counting
+        partitions as its blocks. Operators that went over the memory
+        budget add a row each (grace hash join, external sort, spilled
+        aggregate) whose blocks are the spill files or sorted runs.
+        """
+        self._local.steps = []
+        try:
+            self._select(ast["query"])
+            return self._local.steps
+        finally:
+            self._local.steps = None
+
+    # ================= WORKLOAD =================
+
+    @contextmanager
+    def _workload(self, ast):
+        """
+        Profiles a query, UPDATE or DELETE for the index advisor and
+        records it once done (cancelled or failed ones included, their
+        scans cost just as much).
+        """
+        if ast["type"] not in ("select", "explain", "update", "delete") or (
+            self._profile() is not None
+        ):
+            yield
+            return
+
+        profile = QueryProfile()
+        self._local.profile = profile
+        try:
+            yield
+        finally:
+            self._local.profile = None
+            self.advisor.record(profile)
+            self._adapt()
+
+    def _profile(self):
+        return getattr(self._local, "profile", None)
+
+    def _filtered(self, table, where):
+        profile = self._profile()
+        if profile is not None:
+            profile.filtered(table, where)
+
+    def _scanned(self, table, rows, columns=()):
+        profile = self._profile()
+        if profile is not None:
+            profile.scanned(table, rows, columns)
+
+    def _scanned_all(self, table, where):
+        """UPDATE and DELETE test every row of the partitions they hit."""
+        self._scanned(table, sum(
+            self._table_rows(part) for part in table.partitions(where)
+        ))
+
+    def _adapt(self):
+        """Applies the advisor's adaptive changes in the background."""
+        create, drop = self.advisor.adaptations()
+        if create or drop:
+            threading.Thread(
+                target=self._apply_adaptations, args=(create, drop),
+                name="index-advisor", daemon=True,
+            ).start()
+
+    def _apply_adaptations(self, create, drop):
+        # as statements of their own: admitted as heavy ones
+        changes = [
+            ((table, col), {
+                "type": "create_index",
+                "table": table,
+                "columns": [col],
+                "name": adaptive_name(table, col),
+            })
+            for table, col in create
+        ] + [
+            (name, {"type": "drop_index", "name": name}) for name in drop
+        ]
+        for change, ast in changes:
+            error = None
+            try:
+                self.execute(ast)
+            except Exception as e:
+                # the table or index may be gone meanwhile
+                error = e
+            self.advisor.done(change, error)
+
+    # ================= MEMORY =================
+
+    @contextmanager
+    def _query_memory(self):
+        """
+        QueryMemory of the running query, opened by its outermost
+        statement and released once that one is done.
+        """
+        memory = getattr(self._local, "memory", None)
+        if memory is not None:
+            yield memory
+            return
+
+        memory = QueryMemory(self.memory, self.query_memory, self.spill_dir)
+        self._local.memory = memory
+        try:
+            yield memory
+        finally:
+            self._local.memory = None
+            memory.close()
+
+    def _note(self, table, access, rows=None, stats=None):
+        """Records a table access for EXPLAIN, if one is running."""
+        steps = getattr(self._local, "steps", None)
+        if steps is None:
+            return
+
+        stats = stats or {}
+        steps.append({
+            "table": table.name,
+            "access": access,
+            "blocks": stats.get("blocks"),
+            "blocks_skipped": stats.get("blocks_skipped"),
+            "rows": rows,
+        })
+
     # ================= UPDATE =================
 
     def _update(self, ast):
-        def where_fn(row):
-            if ast.get("where") is None:
-                return True
-            return self._eval_where(ast["where"], row)
+        table = self.db.get_table(ast["table"])
+        where = self._bind_where(ast.get("where"), table.columns)
+        self._filtered(table, where)
+        self._scanned_all(table, where)
 
+        # compiled per partition by the database, which also prunes
         return self.db.update(
             ast["table"],
-            ast["updates"],
-            where_fn
+            self._coerce_row(table, ast["updates"]),
+            where
         )
 
     # ================= DELETE =================
 
     def _delete(self, ast):
-        def where_fn(row):
-            if ast.get("where") is None:
-                return True
-            return self._eval_where(ast["where"], row)
+        table = self.db.get_table(ast["table"])
+        where = self._bind_where(ast.get("where"), table.columns)
+        self._filtered(table, where)
+        self._scanned_all(table, where)
 
         return self.db.delete(
             ast["table"],
-            where_fn
+            where
         )
 
     # ================= WHERE =================
 
     def _eval_where(self, expr, row):
-        op = expr["op"]
+        return evaluate_where(expr, row)
 
-        if op == "AND":
-            return (
-                self._eval_where(expr["left"], row)
-                and self._eval_where(expr["right"], row)
-            )
+    # ================= JOIN =================
 
-        if op == "OR":
-            return (
-                self._eval_where(expr["left"], row)
-                or self._eval_where(expr["right"], row)
-            )
+    def _execute_join(self, scanned, ast, columns=None):
+        """
+        Joined rows as dicts, in chunks (lists): every column of both
+        sides (right wins on a name clash), or just `columns` when given.
+        scanned lists (partition, rows) of the left table; each is
+        joined with the right table's partitions one pair at a time. A
+        build side over the memory budget is joined as a grace hash
+        join instead.
+        """
+        join = ast["join"]
+        right_table = self.db.get_table(join["table"])
 
-        left_col = expr["left"].split(".")[-1]
-        right_val = expr["right"]
+        left_col, right_col = join["on"]
+        left_col = left_col.split(".")[-1]
+        right_col = right_col.split(".")[-1]
 
-        if left_col not in row:
-            raise SQLExecutionError(
-                f"Unknown column '{left_col}'"
+        left_table = self.db.get_table(ast["table"])
+        right_parts = self._join_partitions(
+            left_table, left_col, right_table, right_col
+        )
+        profile = self._profile()
+        if profile is not None:
+            profile.joined(
+                left_table.name, left_col, right_table.name, right_col
             )
 
-        left_val = row[left_col]
+        memory = self._local.memory
+        # hash tables of right partitions, built once for every probe
+        # (None: over budget)
+        builds = {}
+        for left, left_rows in scanned:
+            for right in right_parts(left):
+                cancel.check()
+                right_count = self._table_rows(right)
+                small = len(left_rows) * INDEX_JOIN_RATIO <= right_count
 
-        if op == "=":
-            return left_val == right_val
-        if op == "!=":
-            return left_val != right_val
-        if op == "<":
-            return left_val < right_val
-        if op == ">":
-            return left_val > right_val
+                lookup = right.value_lookup(right_col) if small else None
+                if lookup is not None:
+                    # few left rows: fetch their matches by index
+                    self._note(right, "index join")
+                    yield from self._index_join(
+                        left_rows, left, left_col, right, lookup, columns
+                    )
+                    continue
 
-        raise SQLExecutionError(
-            f"Unsupported operator '{op}'"
-        )
+                if self.parallel and self.parallel.should_parallelize(
+                    len(left_rows)
+                ):
+                    pairs = self.parallel.hash_join(
+                        left_rows, left_col, right.select(), right_col
+                    )
+                    self._scanned(right, right_count)
+                    yield self._join_output(pairs, left, right, columns)
+                    continue
 
-    # ================= JOIN =================
+                left_key, right_key, translate = self._join_keys(
+                    left_rows, left, left_col, right, right_col
+                )
+                build_key = (right.name, translate is not None)
+                if build_key not in builds:
+                    right_rows = right.select()
+                    # an index on the right column would have spared
+                    # hashing the right side for this few left rows
+                    self._scanned(
+                        right, len(right_rows), [right_col] if small else ()
+                    )
+                    builds[build_key] = (
+                        self._hash_build(right_rows, right_key)
+                        if memory.reserve(len(right_rows) * HASH_ENTRY_BYTES)
+                        else None
+                    )
 
-    def _execute_join(self, left_rows, ast):
+                build = builds[build_key]
+                if build is not None:
+                    hash_table, step = build
+                    for start in range(0, len(left_rows), step):
+                        cancel.check()
+                        pairs = self._hash_probe(
+                            left_rows[start : start + step],
+                            hash_table, left_key, translate,
+                        )
+                        yield self._join_output(pairs, left, right, columns)
+                    continue
+
+                right_rows = right.select()
+                count = memory.partitions_for(
+                    len(right_rows) * HASH_ENTRY_BYTES
+                )
+                self._note(
+                    right, "grace hash join", None,
+                    {"blocks": count, "blocks_skipped": 0},
+                )
+                pairs = grace_join(
+                    left_rows, right_rows,
+                    left.getter(left_col), right.getter(right_col),
+                    count, memory.spill_dir,
+                )
+                while True:
+                    cancel.check()
+                    chunk = list(islice(pairs, JOIN_CHUNK_ROWS))
+                    if not chunk:
+                        break
+                    yield self._join_output(
+                        chunk, left, right, columns, stored=False
+                    )
+
+    def _index_join(self, left_rows, left, left_col, right, lookup,
+                    columns):
+        """Chunks of joined rows, looking up each left key in lookup."""
+        key = left.getter(left_col)
+        fetched = 0
+        for start in range(0, len(left_rows), JOIN_CHUNK_ROWS):
+            cancel.check()
+            pairs = [
+                (l, r)
+                for l in left_rows[start : start + JOIN_CHUNK_ROWS]
+                if (value := key(l)) is not None
+                for r in lookup(value)
+            ]
+            fetched += len(pairs)
+            yield self._join_output(pairs, left, right, columns)
+        self._scanned(right, fetched)
+
+    def _join_filter(self, ast):
+        """
+        (left column, sorted keys of the right column) for skipping left
+        blocks that cannot join, or None when the keys are not at hand
+        (right column not indexed) or too many.
+        """
         join = ast["join"]
         right_table = self.db.get_table(join["table"])
-        right_rows = right_table.select()
+        left_col, right_col = [col.split(".")[-1] for col in join["on"]]
 
-        left_col, right_col = join["on"]
-        left_col = left_col.split(".")[-1]
-        right_col = right_col.split(".")[-1]
+        keys = set()
+        for part in right_table.partitions():
+            if not part.is_indexed(right_col):
+                return None
+            values = part.values_of(right_col)
+            if len(keys) + len(values) > JOIN_FILTER_KEYS:
+                return None
+            keys.update(values)
+
+        keys.discard(None)
+        try:
+            return left_col, sorted(keys)
+        except TypeError:
+            return None
+
+    def _join_partitions(self, left_table, left_col, right_table, right_col):
+        """
+        left partition -> right partitions to join it with: only the
+        one at the same position when both tables are partitioned alike
+        on the join columns (equal keys live there), else all of them.
+        """
+        left_spec = left_table.partitioning
+        right_spec = right_table.partitioning
+        if (
+            left_spec is not None
+            and left_spec.column == left_col
+            and right_spec is not None
+            and right_spec.column == right_col
+            and left_spec.aligned(right_spec)
+        ):
+            position = {
+                member.name: i
+                for i, member in enumerate(left_table.partitions())
+            }
+            members = right_table.partitions()
+            return lambda left: [members[position[left.name]]]
+
+        parts = right_table.partitions()
+        return lambda left: parts
+
+    def _join_output(self, pairs, left_table, right_table, columns,
+                     stored=True):
+        """Output rows of joined pairs; stored=False for dict pairs."""
+        if columns is None:
+            return [{**as_dict(l), **as_dict(r)} for l, r in pairs]
+
+        sides = []
+        for col in columns:
+            if col in right_table.columns:
+                table, from_right = right_table, True
+            elif col in left_table.columns:
+                table, from_right = left_table, False
+            else:
+                raise SQLExecutionError(f"Unknown column '{col}'")
+            get = table.getter(col) if stored else itemgetter(col)
+            sides.append((col, from_right, get))
+
+        return [
+            {
+                col: get(r if from_right else l)
+                for col, from_right, get in sides
+            }
+            for l, r in pairs
+        ]
+
+    def _join_keys(self, left_rows, left_table, left_col,
+                   right_table, right_col):
+        """
+        (left key, right key, translate) for a hash join. When both
+        columns are dictionary coded the keys are codes: right codes
+        are hashed and translate maps each left code to the right code
+        of the same value, so probes compare integers.
+        """
+        left_code = left_table.code_getter(left_col)
+        right_code = right_table.code_getter(right_col)
+        if left_code is not None and right_code is not None:
+            left_dict = left_table.dictionaries[left_col]
+            right_dict = right_table.dictionaries[right_col]
+            # a full left dictionary leaves some values uncoded, and a
+            # translation larger than the probe side does not pay off
+            if len(left_dict) < left_dict.limit and len(left_dict) <= len(
+                left_rows
+            ):
+                translate = {
+                    code: right_dict.stored(value)
+                    for code, value in enumerate(left_dict.values)
+                }
+                return left_code, right_code, translate
+
+        return itemgetter(left_col), itemgetter(right_col), None
+
+    def _hash_build(self, right_rows, right_key):
+        """
+        (hash table, probe step): left rows to probe at a time for about
+        JOIN_CHUNK_ROWS output rows, fewer for many-to-many keys, so
+        chunks stay small between cancellation checks.
+        """
+        hash_table = {}
+        hashed = 0
+        for start in range(0, len(right_rows), cancel.CHECK_ROWS):
+            cancel.check()
+            for r in right_rows[start : start + cancel.CHECK_ROWS]:
+                key = right_key(r)
+                if key is not None:
+                    hash_table.setdefault(key, []).append(r)
+                    hashed += 1
 
-        joined = []
+        step = JOIN_CHUNK_ROWS * len(hash_table) // max(hashed, 1)
+        return hash_table, max(1, min(step, JOIN_CHUNK_ROWS))
 
-        for l in left_rows:
-            for r in right_rows:
-                if l[left_col] == r[right_col]:
-                    merged = {}
-                    merged.update(l)
-                    merged.update(r)
-                    joined.append(merged)
+    def _hash_probe(self, left_rows, hash_table, left_key, translate=None):
+        keys = map(left_key, left_rows)
+        if translate is not None:
+            keys = map(translate.get, keys)
 
-        return joined
+        probe = hash_table.get
+        return [
+            (l, r)
+            for l, key in zip(left_rows, keys)
+            for r in probe(key, ())
+        ]
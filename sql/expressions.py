@@ -0,0 +1,183 @@
+# sql/expressions.py
+
+import operator
+
+
+class SQLExecutionError(Exception):
+    pass
+
+
+def evaluate_where(expr, row):
+    """
+    Evaluates a parsed WHERE expression against a row. Module level so
+    it can be shipped to worker processes with functools.partial.
+    A comparison with NULL on either side is false, as in SQL.
+    """
+    op = expr["op"]
+
+    if op == "AND":
+        return evaluate_where(expr["left"], row) and evaluate_where(
+            expr["right"], row
+        )
+
+    if op == "OR":
+        return evaluate_where(expr["left"], row) or evaluate_where(
+            expr["right"], row
+        )
+
+    left_col = expr["left"].split(".")[-1]
+    right_val = expr["right"]
+
+    try:
+        left_val = row[left_col]
+    except KeyError:
+        raise SQLExecutionError(
+            f"Unknown column '{left_col}'"
+        ) from None
+
+    compare = _COMPARE.get(op)
+    if compare is None:
+        raise SQLExecutionError(
+            f"Unsupported operator '{op}'"
+        )
+
+    if left_val is None or right_val is None:
+        return False
+    try:
+        return compare(left_val, right_val)
+    except TypeError:
+        raise _mistyped(left_col, right_val) from None
+
+
+def _mistyped(col, value):
+    return SQLExecutionError(
+        f"Cannot compare column '{col}' with {value!r}"
+    )
+
+
+_COMPARE = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+}
+
+
+def compile_where(expr, getters=None, coded=None):
+    """
+    Turns a parsed WHERE expression into a row -> bool function, so the
+    tree is walked once per query instead of once per row. getters maps
+    column -> value getter (compact records pass their slot getters);
+    dict rows are read by key. coded maps dictionary coded columns to
+    (code getter, value -> stored form): their = and != compare the
+    stored codes. Same results as evaluate_where, NULLs included.
+    """
+    op = expr["op"]
+
+    if op in ("AND", "OR"):
+        left = compile_where(expr["left"], getters, coded)
+        right = compile_where(expr["right"], getters, coded)
+        if op == "AND":
+            return lambda row: left(row) and right(row)
+        return lambda row: left(row) or right(row)
+
+    compare = _COMPARE.get(op)
+    if compare is None:
+        raise SQLExecutionError(
+            f"Unsupported operator '{op}'"
+        )
+
+    left_col = expr["left"].split(".")[-1]
+    right_val = expr["right"]
+
+    if (
+        coded and left_col in coded and op in ("=", "!=")
+        and isinstance(right_val, str)
+    ):
+        get, stored = coded[left_col]
+        right_val = stored(right_val)
+        if op == "=":
+            return lambda row: get(row) == right_val
+        # NULL codes are None
+        return lambda row: (code := get(row)) is not None and (
+            code != right_val
+        )
+
+    if getters is None:
+        get = operator.itemgetter(left_col)
+    else:
+        get = getters.get(left_col)
+        if get is None:
+            def unknown(row):
+                raise SQLExecutionError(f"Unknown column '{left_col}'")
+            return unknown
+
+    def test(row):
+        try:
+            value = get(row)
+        except KeyError:
+            raise SQLExecutionError(
+                f"Unknown column '{left_col}'"
+            ) from None
+        if value is None or right_val is None:
+            return False
+        try:
+            return compare(value, right_val)
+        except TypeError:
+            raise _mistyped(left_col, right_val) from None
+
+    return test
+
+
+def equalities(where):
+    """col -> value for the `col = value` terms ANDed at the top of where."""
+    if where is None:
+        return {}
+    if where["op"] == "AND":
+        found = equalities(where["left"])
+        found.update(equalities(where["right"]))
+        return found
+    if where["op"] == "=":
+        return {where["left"]: where["right"]}
+    return {}
+
+
+def ranges(where):
+    """
+    col -> [low, high] for the `col > low` and `col < high` terms ANDed
+    at the top of where: exclusive bounds, None where unbounded.
+    """
+    found = {}
+    _collect_ranges(where, found)
+    return found
+
+
+def _collect_ranges(where, found):
+    if where is None:
+        return
+    op = where["op"]
+    if op == "AND":
+        _collect_ranges(where["left"], found)
+        _collect_ranges(where["right"], found)
+        return
+    if op not in ("<", ">") or where["right"] is None:
+        return
+
+    bounds = found.setdefault(where["left"], [None, None])
+    value = where["right"]
+    try:
+        if op == ">" and (bounds[0] is None or value > bounds[0]):
+            bounds[0] = value
+        elif op == "<" and (bounds[1] is None or value < bounds[1]):
+            bounds[1] = value
+    except TypeError:
+        # bounds of different types: not a range an index can serve
+        found[where["left"]] = None
+
+
+def where_columns(where):
+    if where is None:
+        return set()
+    if where["op"] in ("AND", "OR"):
+        return where_columns(where["left"]) | where_columns(where["right"])
+    return {where["left"]}
@@ -0,0 +1,279 @@
+# sql/parallel.py
+
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from sql.aggregate import partial_aggregate, merge_partials
+
+
+DEFAULT_MORSEL_SIZE = 20000
+DEFAULT_PARALLEL_THRESHOLD = 50000
+
+
+# ================= WORKERS =================
+# Run inside pool processes; only receive shared memory coordinates and a
+# picklable predicate, never the rows themselves.
+
+def _read_segment(shm_name, offset, size):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    view = shm.buf[offset : offset + size]
+    try:
+        return pickle.loads(view)
+    finally:
+        view.release()
+        shm.close()
+
+
+def _filter_morsel(shm_name, offset, size, predicate):
+    rows = _read_segment(shm_name, offset, size)
+    return [i for i, row in enumerate(rows) if predicate(row)]
+
+
+def _aggregate_morsel(shm_name, offset, size, predicate, aggregates, group_by):
+    rows = _read_segment(shm_name, offset, size)
+    return partial_aggregate(rows, aggregates, group_by, predicate)
+
+
+def _probe_morsel(shm_name, offset, size, build, column):
+    rows = _read_segment(shm_name, offset, size)
+    hash_table = _read_segment(*build)
+
+    matches = []
+    for i, row in enumerate(rows):
+        for r in hash_table.get(row[column], ()):
+            matches.append((i, r))
+    return matches
+
+
+# ================= SHARED SEGMENTS =================
+
+def _share(chunks):
+    size = sum(len(c) for c in chunks)
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+    pos = 0
+    for data in chunks:
+        shm.buf[pos : pos + len(data)] = data
+        pos += len(data)
+
+    return shm
+
+
+class SharedRows:
+    """
+    A list of rows pickled morsel by morsel into one shared memory block.
+    Workers unpickle only the morsel they are handed. morsels holds
+    (first row, block name, offset, size) of each.
+
+    `users` counts the holders of a published block (see
+    ParallelExecutor.publish); it is closed when the last one lets go.
+    """
+
+    def __init__(self, rows, morsel_size):
+        self.rows = rows
+        self.users = 1
+
+        chunks = []
+        spans = []
+        offset = 0
+        for start in range(0, len(rows), morsel_size):
+            data = pickle.dumps(
+                rows[start : start + morsel_size],
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+            chunks.append(data)
+            spans.append((start, offset, len(data)))
+            offset += len(data)
+
+        self.shm = _share(chunks)
+        self.morsels = [
+            (start, self.shm.name, offset, size)
+            for start, offset, size in spans
+        ]
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedSnapshot:
+    """
+    The rows of a published table: the blocks of its segments, in order.
+    The blocks stay open until release(); use it as a context manager.
+    """
+
+    def __init__(self, executor, blocks):
+        self._executor = executor
+        self._blocks = blocks
+        self.rows = []
+        self.morsels = []
+        for block in blocks:
+            base = len(self.rows)
+            self.rows.extend(block.rows)
+            self.morsels.extend(
+                (base + start, name, offset, size)
+                for start, name, offset, size in block.morsels
+            )
+
+    def release(self):
+        blocks, self._blocks = self._blocks, []
+        self._executor._release(blocks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+# ================= EXECUTOR =================
+
+class ParallelExecutor:
+    """
+    Morsel-driven evaluation of filters, partial aggregates and hash join
+    probes on a process pool. Inputs smaller than `threshold` rows are
+    evaluated serially by the caller (see `should_parallelize`).
+
+    Tables are published to shared memory one block per segment; later
+    queries reuse the blocks of the segments that have not changed.
+    """
+
+    def __init__(
+        self,
+        workers=None,
+        threshold=DEFAULT_PARALLEL_THRESHOLD,
+        morsel_size=DEFAULT_MORSEL_SIZE,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.threshold = threshold
+        self.morsel_size = morsel_size
+
+        self._pool = None
+        # table name -> {id(segment): (segment, version, SharedRows)}
+        self._published = {}
+        self._lock = threading.Lock()
+
+    def should_parallelize(self, row_count):
+        return self.workers > 1 and row_count >= self.threshold
+
+    # ================= POOL =================
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def close(self):
+        with self._lock:
+            for blocks in self._published.values():
+                self._release_locked(
+                    [shared for _, _, shared in blocks.values()]
+                )
+            self._published.clear()
+
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    # ================= PUBLISH =================
+
+    def publish(self, table) -> SharedSnapshot:
+        """
+        Snapshot of table's rows in shared memory. Segments unchanged
+        since the last publish keep their block; the blocks of changed
+        or dropped segments are closed once no snapshot holds them.
+        """
+        with self._lock:
+            cached = self._published.get(table.name, {})
+            current = {}
+            for part in table.partitions():
+                for segment in part.segments():
+                    entry = cached.get(id(segment))
+                    if (
+                        entry is None
+                        or entry[0] is not segment
+                        or entry[1] != segment.version
+                    ):
+                        entry = (segment, segment.version, SharedRows(
+                            list(segment.rows), self.morsel_size
+                        ))
+                    current[id(segment)] = entry
+
+            self._release_locked([
+                shared
+                for key, (_, _, shared) in cached.items()
+                if current.get(key, (None, None, None))[2] is not shared
+            ])
+            self._published[table.name] = current
+
+            blocks = [shared for _, _, shared in current.values()]
+            for shared in blocks:
+                shared.users += 1
+            return SharedSnapshot(self, blocks)
+
+    def _release(self, blocks):
+        with self._lock:
+            self._release_locked(blocks)
+
+    def _release_locked(self, blocks):
+        for shared in blocks:
+            shared.users -= 1
+            if shared.users == 0:
+                shared.close()
+
+    def _run(self, shared, fn, *args):
+        pool = self._get_pool()
+        futures = [
+            (start, pool.submit(fn, name, offset, size, *args))
+            for start, name, offset, size in shared.morsels
+        ]
+        return [(start, f.result()) for start, f in futures]
+
+    # ================= OPERATORS =================
+
+    def filter(self, shared, predicate):
+        result = []
+        for start, indices in self._run(shared, _filter_morsel, predicate):
+            result.extend(shared.rows[start + i] for i in indices)
+        return result
+
+    def aggregate(self, shared, aggregates, group_by=None, predicate=None):
+        partials = self._run(
+            shared, _aggregate_morsel, predicate, aggregates, group_by
+        )
+        return merge_partials([p for _, p in partials], aggregates)
+
+    def hash_join(self, left_rows, left_col, right_rows, right_col):
+        """
+        Builds a hash table of right row ids serially, then probes it with
+        left morsels in parallel. Returns (left_row, right_row) pairs.
+        """
+        hash_table = {}
+        for i, row in enumerate(right_rows):
+            key = row[right_col]
+            if key is not None:
+                hash_table.setdefault(key, []).append(i)
+
+        data = pickle.dumps(hash_table, protocol=pickle.HIGHEST_PROTOCOL)
+        build = _share([data])
+        left = SharedRows(left_rows, self.morsel_size)
+        try:
+            pairs = []
+            for start, matches in self._run(
+                left, _probe_morsel, (build.name, 0, len(data)), left_col
+            ):
+                pairs.extend(
+                    (left_rows[start + i], right_rows[r]) for i, r in matches
+                )
+            return pairs
+        finally:
+            left.close()
+            build.close()
+            build.unlink()
@@ -1,14 +1,44 @@
+import re
 import shlex
 
+from sql.aggregate import AGGREGATE_FUNCS
+
 
 class SQLParseError(Exception):
     pass
 
 
+# PARTITION p VALUES LESS THAN (bound) | MAXVALUE
+_RANGE_PARTITION = re.compile(
+    r"PARTITION\s+(\w+)\s+VALUES\s+LESS\s+THAN\s*"
+    r"(?:\(\s*([^)]*?)\s*\)|(MAXVALUE))",
+    re.IGNORECASE,
+)
+
+
+def _tokenize(sql):
+    """
+    shlex.split(sql), and for each token whether it was quoted: a quoted
+    'limit' is a value, never the LIMIT keyword.
+    """
+    lexer = shlex.shlex(sql, posix=True)
+    lexer.whitespace_split = True
+    lexer.commenters = ""
+
+    tokens, quoted = [], []
+    start = 0
+    while (token := lexer.get_token()) is not None:
+        end = lexer.instream.tell()
+        tokens.append(token)
+        quoted.append(sql[start:end].lstrip()[:1] in ("'", '"'))
+        start = end
+    return tokens, quoted
+
+
 class SQLParser:
     def parse(self, sql: str) -> dict:
         sql = sql.strip().rstrip(";")
-        tokens = shlex.split(sql)
+        tokens, quoted = _tokenize(sql)
 
         if not tokens:
             raise SQLParseError("Empty SQL statement")
@@ -16,17 +46,31 @@ class SQLParser:
         cmd = tokens[0].upper()
 
         if cmd == "CREATE":
-            return self._parse_create(tokens)
+            if len(tokens) > 1 and tokens[1].upper() == "INDEX":
+                return self._parse_create_index(sql)
+            return self._parse_create(tokens, quoted)
         if cmd == "INSERT":
             return self._parse_insert(sql)
         if cmd == "SELECT":
-            return self._parse_select(tokens)
+            return self._parse_select(tokens, quoted)
+        if cmd == "EXPLAIN":
+            return self._parse_explain(tokens, quoted)
         if cmd == "UPDATE":
             return self._parse_update(tokens)
         if cmd == "DELETE":
             return self._parse_delete(tokens)
         if cmd == "SHOW":
             return self._parse_show(tokens)
+        if cmd == "COPY":
+            return self._parse_copy(tokens)
+        if cmd == "REFRESH":
+            return self._parse_refresh(tokens)
+        if cmd == "DROP":
+            return self._parse_drop(tokens)
+        if cmd == "ALTER":
+            return self._parse_alter(tokens)
+        if cmd == "SET":
+            return self._parse_set(tokens)
 
         raise SQLParseError(f"Unsupported command '{cmd}'")
 
@@ -35,17 +79,97 @@ class SQLParser:
     def _parse_show(self, tokens):
         if len(tokens) == 2 and tokens[1].upper() == "TABLES":
             return {"type": "show_tables"}
+        if len(tokens) == 2 and tokens[1].upper() == "STORAGE":
+            return {"type": "show_storage"}
+        if [t.upper() for t in tokens[1:]] == ["INDEX", "ADVICE"]:
+            return {"type": "show_index_advice"}
+        if len(tokens) == 2:
+            return {"type": "show_setting", "name": tokens[1]}
         raise SQLParseError("Invalid SHOW command")
 
+    # ================= SET =================
+
+    def _parse_set(self, tokens):
+        # SET name = value | SET name TO value | SET name TO DEFAULT
+        match = re.fullmatch(
+            r"(\w+)\s*(?:=|\s+TO\s+)\s*(.+)",
+            " ".join(tokens[1:]),
+            re.IGNORECASE,
+        )
+        if match is None:
+            raise SQLParseError("Invalid SET syntax")
+
+        value = match.group(2).strip()
+        if value.upper() == "DEFAULT":
+            value = None
+        return {"type": "set", "name": match.group(1), "value": value}
+
+    # ================= COPY =================
+
+    def _parse_copy(self, tokens):
+        # COPY t FROM|TO 'path' [FORMAT csv|jsonl] [HEADER|NOHEADER]
+        if len(tokens) < 4 or tokens[2].upper() not in ("FROM", "TO"):
+            raise SQLParseError("Invalid COPY syntax")
+
+        ast = {
+            "type": "copy",
+            "table": tokens[1],
+            "direction": tokens[2].lower(),
+            "path": tokens[3],
+            "format": None,
+            "header": True,
+        }
+
+        rest = tokens[4:]
+        while rest:
+            option = rest[0].upper()
+            if option == "FORMAT" and len(rest) >= 2:
+                ast["format"] = rest[1].lower()
+                rest = rest[2:]
+            elif option in ("HEADER", "NOHEADER"):
+                ast["header"] = option == "HEADER"
+                rest = rest[1:]
+            else:
+                raise SQLParseError(f"Unknown COPY option '{rest[0]}'")
+
+        return ast
+
     # ================= CREATE =================
 
-    def _parse_create(self, tokens):
+    def _parse_create(self, tokens, quoted=None):
+        if len(tokens) >= 3 and [t.upper() for t in tokens[1:3]] == [
+            "MATERIALIZED", "VIEW"
+        ]:
+            return self._parse_create_view(tokens, quoted)
+
         if len(tokens) < 4 or tokens[1].upper() != "TABLE":
             raise SQLParseError("Invalid CREATE TABLE syntax")
 
         table = tokens[2]
+
+        # CREATE TABLE t (...) WITH COMPRESSION zlib
+        compression = None
+        if (
+            len(tokens) >= 6
+            and tokens[-3].upper() == "WITH"
+            and tokens[-2].upper() == "COMPRESSION"
+        ):
+            compression = tokens[-1].lower()
+            tokens = tokens[:-3]
+
         raw = " ".join(tokens[3:])
 
+        # CREATE TABLE t (...) PARTITION BY RANGE|HASH (col) ...
+        partitioning = None
+        match = re.search(
+            r"\s+PARTITION\s+BY\s+(\w+)\s*\(\s*(\w+)\s*\)\s*(.*)$",
+            raw,
+            re.IGNORECASE | re.DOTALL,
+        )
+        if match:
+            partitioning = self._parse_partitioning(*match.groups())
+            raw = raw[: match.start()]
+
         if not raw.startswith("(") or not raw.endswith(")"):
             raise SQLParseError("CREATE TABLE requires column definitions")
 
@@ -56,6 +180,8 @@ class SQLParser:
         primary_key = None
         unique_keys = []
         foreign_keys = []
+        indexes = []
+        bloom_filters = []
 
         for part in parts:
             up = part.upper()
@@ -70,6 +196,16 @@ class SQLParser:
                 unique_keys.append(col.strip())
                 continue
 
+            if up.startswith("INDEX"):
+                col = part[part.find("(") + 1 : part.find(")")]
+                indexes.append(col.strip())
+                continue
+
+            if up.startswith("BLOOM"):
+                col = part[part.find("(") + 1 : part.find(")")]
+                bloom_filters.append(col.strip())
+                continue
+
             if up.startswith("FOREIGN KEY"):
                 col = part[part.find("(") + 1 : part.find(")")]
                 ref = part[up.find("REFERENCES") + 10 :].strip()
@@ -106,8 +242,148 @@ class SQLParser:
             "primary_key": primary_key,
             "unique_keys": unique_keys,
             "foreign_keys": foreign_keys,
+            "indexes": indexes,
+            "compression": compression,
+            "partitioning": partitioning,
+            "bloom_filters": bloom_filters,
+        }
+
+    def _parse_partitioning(self, kind, column, rest):
+        # RANGE (col) (PARTITION p VALUES LESS THAN (v), ...)
+        # HASH (col) PARTITIONS n
+        kind = kind.lower()
+
+        if kind == "hash":
+            match = re.fullmatch(r"PARTITIONS\s+(\d+)", rest, re.IGNORECASE)
+            if not match:
+                raise SQLParseError("HASH partitioning requires PARTITIONS n")
+            return {
+                "kind": "hash",
+                "column": column,
+                "count": int(match.group(1)),
+            }
+
+        if kind != "range":
+            raise SQLParseError(f"Unknown partitioning '{kind.upper()}'")
+
+        rest = rest.strip()
+        if not rest.startswith("(") or not rest.endswith(")"):
+            raise SQLParseError("RANGE partitioning requires (PARTITION ...)")
+
+        bounds = []
+        for part in rest[1:-1].split(","):
+            match = _RANGE_PARTITION.fullmatch(part.strip())
+            if not match:
+                raise SQLParseError(f"Invalid partition '{part.strip()}'")
+            bounds.append(self._partition_bound(match))
+
+        return {"kind": "range", "column": column, "bounds": bounds}
+
+    def _partition_bound(self, match):
+        # [name, bound]; None stands for MAXVALUE
+        name, value, maxvalue = match.groups()
+        if maxvalue or value.upper() == "MAXVALUE":
+            return [name, None]
+        return [name, self._parse_value(value)]
+
+    # ================= INDEXES =================
+
+    def _parse_create_index(self, sql: str):
+        # CREATE INDEX [name] ON t (cols) [INCLUDE (cols)] [WHERE ...]
+        match = re.fullmatch(
+            r"CREATE\s+INDEX\s+(?:(\w+)\s+)?ON\s+(\w+)\s*\(([^)]*)\)"
+            r"\s*(?:INCLUDE\s*\(([^)]*)\))?\s*(?:WHERE\s+(.+))?",
+            sql,
+            re.IGNORECASE | re.DOTALL,
+        )
+        if not match:
+            raise SQLParseError("Invalid CREATE INDEX syntax")
+
+        name, table, columns, include, where = match.groups()
+
+        def names(raw):
+            return [c.strip() for c in raw.split(",") if c.strip()]
+
+        if not names(columns):
+            raise SQLParseError("CREATE INDEX requires at least one column")
+
+        return {
+            "type": "create_index",
+            "name": name,
+            "table": table,
+            "columns": names(columns),
+            "include": names(include or ""),
+            "where": self._parse_where(shlex.split(where)) if where else None,
+        }
+
+    # ================= MATERIALIZED VIEWS =================
+
+    def _parse_create_view(self, tokens, quoted=None):
+        # CREATE MATERIALIZED VIEW v AS SELECT ...
+        if (
+            len(tokens) < 6
+            or tokens[4].upper() != "AS"
+            or tokens[5].upper() != "SELECT"
+        ):
+            raise SQLParseError(
+                "Invalid CREATE MATERIALIZED VIEW syntax"
+            )
+
+        return {
+            "type": "create_view",
+            "view": tokens[3],
+            "query": self._parse_select(
+                tokens[5:], quoted and quoted[5:]
+            ),
         }
 
+    def _parse_refresh(self, tokens):
+        if len(tokens) != 4 or [t.upper() for t in tokens[1:3]] != [
+            "MATERIALIZED", "VIEW"
+        ]:
+            raise SQLParseError("Invalid REFRESH syntax")
+        return {"type": "refresh_view", "view": tokens[3]}
+
+    # ================= DROP =================
+
+    def _parse_drop(self, tokens):
+        upper = [t.upper() for t in tokens]
+        if len(tokens) == 4 and upper[1:3] == ["MATERIALIZED", "VIEW"]:
+            return {"type": "drop_view", "view": tokens[3]}
+        if len(tokens) == 3 and upper[1] == "INDEX":
+            return {"type": "drop_index", "name": tokens[2]}
+        raise SQLParseError("Invalid DROP syntax")
+
+    # ================= ALTER =================
+
+    def _parse_alter(self, tokens):
+        # ALTER TABLE t ADD PARTITION p VALUES LESS THAN (v) | MAXVALUE
+        # ALTER TABLE t DROP PARTITION p
+        upper = [t.upper() for t in tokens]
+        if len(tokens) < 6 or upper[1] != "TABLE" or upper[4] != "PARTITION":
+            raise SQLParseError("Invalid ALTER TABLE syntax")
+
+        table = tokens[2]
+        if upper[3] == "DROP" and len(tokens) == 6:
+            return {
+                "type": "drop_partition",
+                "table": table,
+                "partition": tokens[5],
+            }
+
+        if upper[3] == "ADD":
+            match = _RANGE_PARTITION.fullmatch(" ".join(tokens[4:]))
+            if match:
+                name, bound = self._partition_bound(match)
+                return {
+                    "type": "add_partition",
+                    "table": table,
+                    "partition": name,
+                    "bound": bound,
+                }
+
+        raise SQLParseError("Invalid ALTER TABLE syntax")
+
     # ================= INSERT =================
 
     def _parse_insert(self, sql: str):
@@ -145,7 +421,8 @@ class SQLParser:
 
     # ================= SELECT =================
 
-    def _parse_select(self, tokens):
+    def _parse_select(self, tokens, quoted=None):
+        """quoted flags the tokens that were quoted (see _tokenize)."""
         i = 1
         fields = []
 
@@ -162,8 +439,47 @@ class SQLParser:
         if fields == ["*"]:
             fields = None
 
+        aggregates = []
+        for field in fields or []:
+            agg = self._parse_aggregate(field)
+            if agg:
+                aggregates.append(agg)
+
         join = None
         where = None
+        group_by = None
+
+        # clause keywords, with quoted values blanked out
+        quoted = quoted or [False] * len(tokens)
+        upper = [
+            "" if was_quoted else t.upper()
+            for t, was_quoted in zip(tokens, quoted)
+        ]
+        end = len(tokens)
+
+        # ... [ORDER BY col [ASC|DESC], ...] [LIMIT n]
+        limit = None
+        if "LIMIT" in upper[i:]:
+            l = upper.index("LIMIT", i)
+            if l + 2 != len(tokens) or not tokens[l + 1].isdigit():
+                raise SQLParseError("LIMIT requires a row count")
+            limit = int(tokens[l + 1])
+            end = l
+
+        order_by = None
+        if "ORDER" in upper[i:end]:
+            o = upper.index("ORDER", i)
+            if o + 2 >= end or upper[o + 1] != "BY":
+                raise SQLParseError("ORDER requires BY <column>")
+            order_by = self._parse_order_by(" ".join(tokens[o + 2 : end]))
+            end = o
+
+        if "GROUP" in upper[i:end]:
+            g = upper.index("GROUP", i)
+            if g + 2 >= end or upper[g + 1] != "BY":
+                raise SQLParseError("GROUP requires BY <column>")
+            group_by = tokens[g + 2].split(".")[-1]
+            end = g
 
         if i < len(tokens) and tokens[i].upper() == "JOIN":
             join_table = tokens[i + 1]
@@ -180,8 +496,17 @@ class SQLParser:
             join = {"table": join_table, "on": (left, right)}
             i += 6
 
-        if i < len(tokens) and tokens[i].upper() == "WHERE":
-            where = self._parse_where(tokens[i + 1 :])
+        if i < end and tokens[i].upper() == "WHERE":
+            where = self._parse_where(tokens[i + 1 : end])
+
+        if aggregates or group_by:
+            for field in fields or []:
+                if not self._parse_aggregate(field) and (
+                    field.split(".")[-1] != group_by
+                ):
+                    raise SQLParseError(
+                        f"Column '{field}' must appear in GROUP BY"
+                    )
 
         return {
             "type": "select",
@@ -189,6 +514,57 @@ class SQLParser:
             "table": table,
             "join": join,
             "where": where,
+            "aggregates": aggregates,
+            "group_by": group_by,
+            "order_by": order_by,
+            "limit": limit,
+        }
+
+    def _parse_order_by(self, raw):
+        # col [ASC|DESC], ...; aggregates sort by their output name
+        order_by = []
+        for item in raw.split(","):
+            pieces = item.split()
+            if not pieces or len(pieces) > 2:
+                raise SQLParseError(f"Invalid ORDER BY item '{item.strip()}'")
+
+            direction = pieces[1].upper() if len(pieces) == 2 else "ASC"
+            if direction not in ("ASC", "DESC"):
+                raise SQLParseError(f"Invalid sort direction '{pieces[1]}'")
+
+            agg = self._parse_aggregate(pieces[0])
+            column = agg["name"] if agg else pieces[0].split(".")[-1]
+            order_by.append((column, direction == "DESC"))
+        return order_by
+
+    def _parse_explain(self, tokens, quoted=None):
+        # EXPLAIN SELECT ...
+        if len(tokens) < 2 or tokens[1].upper() != "SELECT":
+            raise SQLParseError("EXPLAIN supports SELECT only")
+        return {
+            "type": "explain",
+            "query": self._parse_select(tokens[1:], quoted and quoted[1:]),
+        }
+
+    def _parse_aggregate(self, field):
+        match = re.fullmatch(r"(\w+)\((\*|[\w.]+)\)", field)
+        if not match:
+            return None
+
+        func = match.group(1).upper()
+        if func not in AGGREGATE_FUNCS:
+            raise SQLParseError(f"Unknown aggregate '{func}'")
+
+        column = match.group(2)
+        if column != "*":
+            column = column.split(".")[-1]
+        elif func != "COUNT":
+            raise SQLParseError(f"{func}(*) is not supported")
+
+        return {
+            "func": func,
+            "column": column,
+            "name": f"{func}({column})",
         }
 
     # ================= UPDATE =================
@@ -264,10 +640,10 @@ class SQLParser:
             raise SQLParseError("Invalid WHERE clause")
 
         col, op, val = tokens
-        if op != "=":
-            raise SQLParseError("Only '=' operator supported")
+        if op not in ("=", "!=", "<", ">"):
+            raise SQLParseError(f"Unsupported operator '{op}'")
 
-        return {"op": "=", "left": col, "right": self._parse_value(val)}
+        return {"op": op, "left": col, "right": self._parse_value(val)}
 
     # ================= VALUES =================
 
@@ -0,0 +1,344 @@
+# sql/spill.py
+
+import heapq
+import pickle
+import sys
+import tempfile
+import threading
+
+from sql import cancel
+from sql.aggregate import merge_into
+
+
+# operator state a query may hold, and all queries together (bytes)
+DEFAULT_QUERY_MEMORY = 64 * 1024 * 1024
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+
+# rough state per entry on top of the rows, which live in table storage
+HASH_ENTRY_BYTES = 120     # dict slot, key, bucket list
+GROUP_ENTRY_BYTES = 160    # dict slot, key, list of states
+SORT_ENTRY_BYTES = 120     # list slot, key tuple
+
+# buffered rows reserved (and spilled) at a time
+RESERVE_ROWS = 1024
+# rows pickled per chunk of a spill file
+SPILL_CHUNK_ROWS = 1024
+# spill files of one partitioned operator
+MAX_SPILL_PARTITIONS = 64
+GROUP_SPILL_PARTITIONS = 16
+
+
+# ================= BUDGETS =================
+
+class MemoryBudget:
+    """
+    Bytes of operator state (hash tables, sort buffers, aggregation
+    groups) that all running queries together may hold; None is no
+    limit.
+    """
+
+    def __init__(self, limit=DEFAULT_MEMORY_LIMIT):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, nbytes) -> bool:
+        with self._lock:
+            if self.limit is not None and self.used + nbytes > self.limit:
+                return False
+            self.used += nbytes
+            return True
+
+    def release(self, nbytes):
+        with self._lock:
+            self.used -= nbytes
+
+
+class QueryMemory:
+    """
+    Operator memory of one query: at most `limit` bytes (None: only the
+    shared budget applies), drawn from a MemoryBudget. Operators reserve
+    before they grow and spill to files under spill_dir when refused;
+    close() gives back whatever the query still holds.
+    """
+
+    def __init__(self, budget, limit=DEFAULT_QUERY_MEMORY, spill_dir=None):
+        self.budget = budget
+        self.limit = limit
+        self.spill_dir = spill_dir
+        self.held = 0
+
+    def available(self):
+        """Bytes the query may still reserve, None if unbounded."""
+        room = []
+        if self.limit is not None:
+            room.append(self.limit - self.held)
+        if self.budget.limit is not None:
+            room.append(self.budget.limit - self.budget.used)
+        return max(0, min(room)) if room else None
+
+    def reserve(self, nbytes) -> bool:
+        if self.limit is not None and self.held + nbytes > self.limit:
+            return False
+        if not self.budget.reserve(nbytes):
+            return False
+        self.held += nbytes
+        return True
+
+    def release(self, nbytes):
+        nbytes = min(nbytes, self.held)
+        self.held -= nbytes
+        self.budget.release(nbytes)
+
+    def close(self):
+        self.release(self.held)
+
+    def partitions_for(self, nbytes):
+        """Spill partitions for nbytes of state to fit in what is left."""
+        room = self.available() or 1
+        count = -(-nbytes // max(room, 1)) + 1
+        return max(2, min(count, MAX_SPILL_PARTITIONS))
+
+
+def row_bytes(rows, sample_size=32):
+    """Approximate bytes per row (dict or record), from a sample."""
+    sample = rows[:sample_size]
+    if not sample:
+        return 0
+    return sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+        for row in sample
+    ) // len(sample)
+
+
+# ================= SPILL FILES =================
+
+class SpillFile:
+    """
+    Anonymous temporary file of pickled items, appended in chunks and
+    read back in order. The OS removes it once closed. Records pickle
+    as dicts, so stored rows come back as plain dicts.
+    """
+
+    def __init__(self, directory=None):
+        self._file = tempfile.TemporaryFile(
+            prefix="rdms-spill-", dir=directory
+        )
+        self._buffer = []
+        self.count = 0
+
+    def append(self, item):
+        self._buffer.append(item)
+        self.count += 1
+        if len(self._buffer) >= SPILL_CHUNK_ROWS:
+            self._flush()
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def _flush(self):
+        if self._buffer:
+            pickle.dump(self._buffer, self._file, pickle.HIGHEST_PROTOCOL)
+            self._buffer = []
+
+    def __iter__(self):
+        self._flush()
+        self._file.seek(0)
+        while True:
+            try:
+                chunk = pickle.load(self._file)
+            except EOFError:
+                return
+            yield from chunk
+
+    def close(self):
+        self._file.close()
+
+
+def _partition(pairs, count, directory):
+    """Spills (key, item) pairs into count files by hash of key."""
+    files = [SpillFile(directory) for _ in range(count)]
+    try:
+        for i, pair in enumerate(pairs):
+            if not i % cancel.CHECK_ROWS:
+                cancel.check()
+            files[hash(pair[0]) % count].append(pair)
+    except BaseException:
+        for f in files:
+            f.close()
+        raise
+    return files
+
+
+# ================= GRACE HASH JOIN =================
+
+def grace_join(left, right, left_key, right_key, count, directory=None):
+    """
+    Yields (l, r) for rows with equal non-NULL keys, one hash partition
+    at a time: both sides are first spilled into count files by key,
+    so only one partition's hash table is in memory at once. Rows come
+    back from the files as dicts.
+    """
+    right_files = _partition(
+        ((key, r) for r in right if (key := right_key(r)) is not None),
+        count, directory,
+    )
+    left_files = []
+    try:
+        left_files = _partition(
+            ((key, l) for l in left if (key := left_key(l)) is not None),
+            count, directory,
+        )
+        for left_file, right_file in zip(left_files, right_files):
+            cancel.check()
+            if not left_file.count or not right_file.count:
+                continue
+
+            hash_table = {}
+            for key, r in right_file:
+                hash_table.setdefault(key, []).append(r)
+            for key, l in left_file:
+                for r in hash_table.get(key, ()):
+                    yield l, r
+    finally:
+        for f in left_files + right_files:
+            f.close()
+
+
+# ================= EXTERNAL MERGE SORT =================
+
+class _Descending:
+    """Sort key wrapper that inverts the order of the value it holds."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def order_key(order_by):
+    """
+    Sort key for [(column, descending)]: NULLs sort after every value
+    ascending and before them descending.
+    """
+    def key(row):
+        parts = []
+        for col, descending in order_by:
+            value = row[col]
+            part = (value is None, value)
+            parts.append(_Descending(part) if descending else part)
+        return parts
+
+    return key
+
+
+def external_sort(rows, key, memory, runs=None):
+    """
+    Iterator over rows (any iterable) sorted by key. Rows are buffered
+    while memory grants room; a full buffer is sorted and spilled as a
+    run, and the runs are merged lazily at the end. runs, a list,
+    receives the number of runs spilled.
+    """
+    files = []
+    buffer = []
+    held = 0
+    per_row = None
+    try:
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) % RESERVE_ROWS:
+                continue
+
+            cancel.check()
+            if per_row is None:
+                per_row = row_bytes(buffer) + SORT_ENTRY_BYTES
+            step = RESERVE_ROWS * per_row
+            if memory.reserve(step):
+                held += step
+                continue
+
+            buffer.sort(key=key)
+            run = SpillFile(memory.spill_dir)
+            run.extend(buffer)
+            files.append(run)
+            buffer = []
+            memory.release(held)
+            held = 0
+
+        buffer.sort(key=key)
+        if runs is not None:
+            runs.append(len(files))
+        if not files:
+            yield from buffer
+            return
+        yield from heapq.merge(*files, buffer, key=key)
+    finally:
+        memory.release(held)
+        for run in files:
+            run.close()
+
+
+# ================= SPILLING AGGREGATION =================
+
+def merge_groups(partials, aggregates, memory, spilled=None):
+    """
+    Merges partial group states ({key: states} each) while memory
+    grants room for the groups. Past that the groups held are spilled
+    by key hash, and each partition is merged on its own at the end.
+    Yields the merged groups, one dict per partition (a single one if
+    nothing spilled). spilled, a list, receives the partition count.
+    """
+    merged = {}
+    held = 0
+    files = None
+    try:
+        for groups in partials:
+            cancel.check()
+            merge_into(merged, groups.items(), aggregates)
+
+            need = len(merged) * GROUP_ENTRY_BYTES
+            if need <= held:
+                continue
+            if memory.reserve(need - held):
+                held = need
+                continue
+
+            if files is None:
+                files = [
+                    SpillFile(memory.spill_dir)
+                    for _ in range(GROUP_SPILL_PARTITIONS)
+                ]
+            for pair in merged.items():
+                files[hash(pair[0]) % len(files)].append(pair)
+            merged = {}
+            memory.release(held)
+            held = 0
+
+        if spilled is not None:
+            spilled.append(len(files) if files else 0)
+        if files is None:
+            yield merged
+            return
+
+        for pair in merged.items():
+            files[hash(pair[0]) % len(files)].append(pair)
+        merged = None
+        memory.release(held)
+        held = 0
+
+        for f in files:
+            part = {}
+            merge_into(part, f, aggregates)
+            f.close()
+            yield part
+    finally:
+        memory.release(held)
+        for f in files or ():
+            f.close()
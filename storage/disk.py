@@ -1,25 +1,677 @@
-import json
+# storage/disk.py
+
+import bz2
+import lzma
+import mmap
 import os
+import struct
+import sys
+import zlib
+from array import array
+from itertools import repeat
+
+try:
+    from compression import zstd
+except ImportError:     # stdlib only from Python 3.14
+    zstd = None
+
+
+MAGIC = b"RDMS"
+# 2: adds the index image section
+# 3: adds the codec header, dictionary and run-length encodings
+FORMAT_VERSION = 3
+
+# column types
+TYPE_INT = 1
+TYPE_TEXT = 2
+
+TYPE_CODES = {int: TYPE_INT, str: TYPE_TEXT}
+CODE_TYPES = {code: t for t, code in TYPE_CODES.items()}
+
+# column encodings
+ENC_INT64 = 1       # fixed-width little-endian int64
+ENC_VARLEN = 2      # u32 offsets + utf-8 blob (TEXT, or INT beyond 64 bits)
+ENC_DICT = 3        # distinct values (plain encoded) + narrow codes
+ENC_RLE = 4         # values of each run (plain encoded) + u32 run ends
+
+# encodings are only considered for columns with at least this many rows
+MIN_ENCODED_ROWS = 16
+
+# whole-body compression codecs
+CODEC_NONE = 0
+CODECS = {"zlib": 1, "lzma": 2, "bz2": 3}
+if zstd is not None:
+    CODECS["zstd"] = 4
+CODEC_NAMES = {code: name for name, code in CODECS.items()}
+
+# read size when stream-decompressing a segment body
+READ_CHUNK = 1024 * 1024
+
+HEADER = struct.Struct("<4sHIH")          # magic, version, rows, columns
+COLUMN = struct.Struct("<BBBH")           # type, encoding, has_nulls, name len
+BLOCK = struct.Struct("<QQ")              # offset, length
+COUNT = struct.Struct("<H")               # number of index images
+NAME = struct.Struct("<H")                # index column name length
+IMAGE = struct.Struct("<B7xII")           # image kind, ids, bounds
+CODEC = struct.Struct("<B3xIQ")           # codec, body offset, raw body size
+NESTED = struct.Struct("<IBB2x")          # entries, code width, value encoding
+
+# index image kinds
+IMAGE_GROUPED = 0   # ids grouped by key + bucket boundaries
+IMAGE_UNIQUE = 1    # one row per key, ids of the non-NULL rows
+IMAGE_DENSE = 2     # one row per key and no NULLs: ids are implied
+
+INT64_MIN = -(2 ** 63)
+INT64_MAX = 2 ** 63 - 1
+
+
+class DiskStorageError(Exception):
+    pass
+
+
+def atomic_write(path, data: bytes):
+    """Writes to a temp file, fsyncs and renames it over path."""
+    tmp = path + ".tmp"
+
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp, path)
+
+    dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+# ================= ENCODING =================
+
+def _pad(buf: bytearray):
+    buf.extend(b"\0" * (-len(buf) % 8))
+
+
+def _null_bitmap(values):
+    bitmap = bytearray((len(values) + 7) // 8)
+    for i, v in enumerate(values):
+        if v is None:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    return bytes(bitmap)
+
+
+def _native(arr: array):
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr
+
+
+def _encode_int64(values):
+    return _native(array("q", [0 if v is None else v for v in values]))
+
+
+def _encode_varlen(values):
+    offsets = array("I", [0])
+    blob = bytearray()
+    for v in values:
+        if v is not None:
+            blob.extend(str(v).encode("utf-8"))
+        offsets.append(len(blob))
+    return _native(offsets).tobytes() + bytes(blob)
+
+
+def _encode_plain(col_type, values):
+    """Returns (encoding, payload) with the payload 8-byte aligned."""
+    if col_type is int and all(
+        v is None or INT64_MIN <= v <= INT64_MAX for v in values
+    ):
+        return ENC_INT64, _encode_int64(values).tobytes()
+    return ENC_VARLEN, _encode_varlen(values)
+
+
+def _code_format(count):
+    if count <= 0xFF:
+        return "B"
+    if count <= 0xFFFF:
+        return "H"
+    return "I"
+
+
+CODE_FORMATS = {1: "B", 2: "H", 4: "I"}
+
+
+def _choose_encoding(col_type, values):
+    """
+    Picks by cardinality: run-length when runs are long on average,
+    dictionary when values repeat (and, for INT, codes fit 16 bits),
+    else the plain encoding.
+    """
+    count = len(values)
+    if count < MIN_ENCODED_ROWS:
+        return None
+
+    runs = 1 + sum(1 for a, b in zip(values, values[1:]) if a != b)
+    if runs * 4 <= count:
+        return ENC_RLE
+
+    distinct = len(set(values))
+    if distinct * 2 <= count and (col_type is str or distinct <= 0xFFFF):
+        return ENC_DICT
+    return None
+
+
+def _encode_dict(col_type, values):
+    distinct = sorted({v for v in values if v is not None})
+    codes = {v: i for i, v in enumerate(distinct)}
+    fmt = _code_format(len(distinct))
+
+    code_array = _native(array(fmt, [codes.get(v, 0) for v in values]))
+    encoding, payload = _encode_plain(col_type, distinct)
+
+    body = bytearray(NESTED.pack(len(distinct), code_array.itemsize, encoding))
+    body += code_array.tobytes()
+    _pad(body)
+    return bytes(body) + payload
+
+
+def _encode_rle(col_type, values):
+    ends = array("I")
+    run_values = []
+    for i, v in enumerate(values):
+        if run_values and v == run_values[-1]:
+            ends[-1] = i + 1
+        else:
+            run_values.append(v)
+            ends.append(i + 1)
+
+    encoding, payload = _encode_plain(col_type, run_values)
+
+    body = bytearray(NESTED.pack(len(run_values), 0, encoding))
+    body += _native(ends).tobytes()
+    _pad(body)
+    return bytes(body) + payload
+
+
+def encode_column(col_type, values):
+    """Returns (encoding, has_nulls, payload bytes) for one column."""
+    has_nulls = any(v is None for v in values)
+    prefix = _null_bitmap(values) if has_nulls else b""
+
+    encoding = _choose_encoding(col_type, values)
+    if encoding == ENC_RLE:
+        payload = _encode_rle(col_type, values)
+    elif encoding == ENC_DICT:
+        payload = _encode_dict(col_type, values)
+    else:
+        encoding, payload = _encode_plain(col_type, values)
+
+    if encoding != ENC_VARLEN:
+        # keep the arrays 8-byte aligned after the bitmap
+        prefix += b"\0" * (-len(prefix) % 8)
+    return encoding, has_nulls, prefix + payload
+
+
+def encode_index(rows, column):
+    """
+    Index image of one segment: row ids grouped by key and the bucket
+    boundaries in that array. Unique keys need no boundaries, and no ids
+    either when no row is NULL.
+    """
+    buckets = {}
+    for i, row in enumerate(rows):
+        value = row.get(column)
+        if value is not None:
+            buckets.setdefault(value, []).append(i)
+
+    ids = array("I")
+    bounds = array("I", [0])
+    for bucket in buckets.values():
+        ids.extend(bucket)
+        bounds.append(len(ids))
+
+    kind = IMAGE_GROUPED
+    if len(bounds) - 1 == len(ids):
+        kind = IMAGE_DENSE if len(ids) == len(rows) else IMAGE_UNIQUE
+        bounds = array("I")
+        if kind == IMAGE_DENSE:
+            ids = array("I")
+
+    return (
+        IMAGE.pack(kind, len(ids), len(bounds))
+        + _native(ids).tobytes()
+        + _native(bounds).tobytes()
+    )
+
+
+# ================= DECODING =================
+
+def _apply_nulls(values, bitmap):
+    for i in range(len(values)):
+        if bitmap[i >> 3] & (1 << (i & 7)):
+            values[i] = None
+    return values
+
+
+def _cast(view, fmt):
+    if sys.byteorder == "little":
+        return view.cast(fmt)
+    # big-endian hosts pay for a copy
+    arr = array(fmt, view.tobytes())
+    arr.byteswap()
+    return memoryview(arr)
+
+
+def _decode_plain(view, count, col_type, encoding):
+    if encoding == ENC_INT64:
+        return _cast(view[: 8 * count], "q").tolist()
+
+    if encoding == ENC_VARLEN:
+        offsets = _cast(view[: 4 * (count + 1)], "I")
+        blob = view[4 * (count + 1) :]
+        values = [
+            str(blob[offsets[i] : offsets[i + 1]], "utf-8")
+            for i in range(count)
+        ]
+        if col_type is int:
+            values = [int(v) if v else None for v in values]
+        return values
 
+    raise DiskStorageError(f"Unknown column encoding {encoding}")
+
+
+def _decode_dict(view, row_count, col_type):
+    count, width, encoding = NESTED.unpack_from(view)
+    pos = NESTED.size
+    codes = _cast(view[pos : pos + width * row_count], CODE_FORMATS[width])
+    pos += width * row_count
+    pos += -pos % 8
+
+    # every row shares the dictionary's objects
+    distinct = _decode_plain(view[pos:], count, col_type, encoding)
+    return list(map(distinct.__getitem__, codes))
+
+
+def _decode_rle(view, col_type):
+    count, _, encoding = NESTED.unpack_from(view)
+    pos = NESTED.size
+    ends = _cast(view[pos : pos + 4 * count], "I")
+    pos += 4 * count
+    pos += -pos % 8
+
+    run_values = _decode_plain(view[pos:], count, col_type, encoding)
+    values = []
+    start = 0
+    for end, value in zip(ends, run_values):
+        values.extend(repeat(value, end - start))
+        start = end
+    return values
+
+
+def decode_column(view, row_count, col_type, encoding, has_nulls):
+    bitmap = None
+    pos = 0
+    if has_nulls:
+        bitmap = view[: (row_count + 7) // 8]
+        pos = len(bitmap)
+    if encoding != ENC_VARLEN:
+        pos += -pos % 8
+
+    if encoding == ENC_DICT:
+        values = _decode_dict(view[pos:], row_count, col_type)
+    elif encoding == ENC_RLE:
+        values = _decode_rle(view[pos:], col_type)
+    else:
+        values = _decode_plain(view[pos:], row_count, col_type, encoding)
+
+    if bitmap is not None:
+        _apply_nulls(values, bitmap)
+    return values
+
+
+# ================= COMPRESSION =================
+
+def _compressor(codec):
+    if codec == CODECS["zlib"]:
+        return zlib.compressobj(6)
+    if codec == CODECS["lzma"]:
+        return lzma.LZMACompressor()
+    if codec == CODECS["bz2"]:
+        return bz2.BZ2Compressor()
+    if codec == CODECS.get("zstd"):
+        return zstd.ZstdCompressor()
+    raise DiskStorageError(f"Unknown codec {codec}")
+
+
+def _decompressor(codec):
+    if codec == CODECS["zlib"]:
+        return zlib.decompressobj()
+    if codec == CODECS["lzma"]:
+        return lzma.LZMADecompressor()
+    if codec == CODECS["bz2"]:
+        return bz2.BZ2Decompressor()
+    if codec == CODECS.get("zstd"):
+        return zstd.ZstdDecompressor()
+    raise DiskStorageError(f"Codec {codec} is not available")
+
+
+def codec_code(name):
+    """Maps a codec name (None or "none" for no compression) to its code."""
+    if name is None or name.lower() == "none":
+        return CODEC_NONE
+    try:
+        return CODECS[name.lower()]
+    except KeyError:
+        raise DiskStorageError(
+            f"Unknown compression '{name}' "
+            f"(available: {', '.join(CODECS)})"
+        ) from None
+
+
+def _stream_decompress(file, codec, offset, out: memoryview):
+    """Fills out with the decompressed stream starting at offset."""
+    decompressor = _decompressor(codec)
+    file.seek(offset)
+    pos = 0
+
+    while True:
+        chunk = file.read(READ_CHUNK)
+        if not chunk:
+            break
+        data = decompressor.decompress(chunk)
+        out[pos : pos + len(data)] = data
+        pos += len(data)
+
+    if pos != len(out):
+        raise DiskStorageError("Truncated compressed segment")
+
+
+# ================= FILES =================
 
 class DiskStorage:
-    def __init__(self, table_name, data_dir="data"):
-        self.table_name = table_name
-        self.data_dir = data_dir
-        self.path = os.path.join(data_dir, f"{table_name}.table")
+    """
+    Binary columnar segment file.
+
+    Layout: header (magic, format version, row count, column count),
+    one descriptor per column (type code, encoding, null flag, name,
+    block offset and length), the index image descriptors (column name,
+    block offset and length) and then the 8-byte aligned blocks.
+    INT columns are fixed-width int64 arrays; TEXT columns are u32
+    offsets followed by a utf-8 blob. Columns with long runs are stored
+    run-length encoded and columns with few distinct values as a sorted
+    dictionary plus 1, 2 or 4 byte codes. A column with NULLs is
+    prefixed by a null bitmap.
+
+    With a compression codec the blocks after the descriptors are
+    compressed as one stream; the descriptors keep the uncompressed
+    offsets.
+
+    Uncompressed files are read through mmap: `open()` exposes each
+    column block as a memoryview over the page cache, which is decoded
+    once when the segment is loaded; scans and aggregates then read the
+    materialized rows. Compressed files are stream-decompressed into
+    memory once on open.
+    """
+
+    def __init__(self, path, compression=None):
+        self.path = path
+        self.codec = codec_code(compression)
+
+    def save(self, columns: dict, rows: list, indexes=()):
+        """Writes the segment; returns (raw bytes, stored bytes)."""
+        data, raw_size = self._compress(self.encode(columns, rows, indexes))
+        atomic_write(self.path, data)
+        return raw_size, len(data)
+
+    def _compress(self, data: bytes):
+        _, body_offset, _ = CODEC.unpack_from(data, HEADER.size)
+        if self.codec == CODEC_NONE:
+            return data, len(data)
+
+        compressor = _compressor(self.codec)
+        body = compressor.compress(data[body_offset:]) + compressor.flush()
+        header = bytearray(data[:body_offset])
+        CODEC.pack_into(
+            header, HEADER.size, self.codec, body_offset,
+            len(data) - body_offset,
+        )
+        return bytes(header) + body, len(data)
+
+    def encode(self, columns: dict, rows: list, indexes=()) -> bytes:
+        names = list(columns)
+        encoded = [
+            encode_column(columns[name], [row.get(name) for row in rows])
+            for name in names
+        ]
+
+        header = bytearray(
+            HEADER.pack(MAGIC, FORMAT_VERSION, len(rows), len(names))
+        )
+        header += CODEC.pack(CODEC_NONE, 0, 0)
+        images = [encode_index(rows, col) for col in indexes]
+
+        descriptors_size = sum(
+            COLUMN.size + len(n.encode("utf-8")) + BLOCK.size for n in names
+        ) + COUNT.size + sum(
+            NAME.size + len(c.encode("utf-8")) + BLOCK.size for c in indexes
+        )
+        offset = len(header) + descriptors_size
+        offset += -offset % 8
 
-        os.makedirs(data_dir, exist_ok=True)
+        body = bytearray()
+        for name, (encoding, has_nulls, payload) in zip(names, encoded):
+            raw_name = name.encode("utf-8")
+            header += COLUMN.pack(
+                TYPE_CODES[columns[name]], encoding, has_nulls, len(raw_name)
+            )
+            header += raw_name
+            header += BLOCK.pack(offset + len(body), len(payload))
+            body += payload
+            _pad(body)
 
-    def save(self, schema: dict, rows: list):
-        with open(self.path, "w") as f:
-            json.dump({
-                "schema": schema,
-                "rows": rows,
-            }, f)
+        header += COUNT.pack(len(indexes))
+        for col, image in zip(indexes, images):
+            raw_name = col.encode("utf-8")
+            header += NAME.pack(len(raw_name)) + raw_name
+            header += BLOCK.pack(offset + len(body), len(image))
+            body += image
+            _pad(body)
+
+        _pad(header)
+        CODEC.pack_into(
+            header, HEADER.size, CODEC_NONE, len(header), len(body)
+        )
+        return bytes(header) + bytes(body)
+
+    # ================= READ =================
+
+    def open(self):
+        return SegmentReader(self.path)
 
     def load(self):
-        if not os.path.exists(self.path):
-            return None
+        """Returns (columns, rows) with rows as dicts."""
+        with self.open() as reader:
+            return reader.columns, reader.rows()
+
+    def load_with_indexes(self):
+        """
+        Returns (columns, rows, images) where images maps an indexed
+        column to (keys, ids, bounds) as returned by index_image.
+        """
+        with self.open() as reader:
+            return reader.load_with_indexes()
+
+
+class SegmentReader:
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            raise DiskStorageError(f"Empty segment file '{path}'")
+
+        self._mmap = mmap.mmap(
+            self._file.fileno(), 0, access=mmap.ACCESS_READ
+        )
+        self._view = memoryview(self._mmap)
+        self.stored_size = size
+        self.raw_size = size
+        self.codec = CODEC_NONE
+
+        magic, version, self.row_count, ncols = HEADER.unpack_from(
+            self._view
+        )
+        if magic != MAGIC:
+            raise DiskStorageError(f"'{path}' is not a segment file")
+        if version > FORMAT_VERSION:
+            raise DiskStorageError(f"Unsupported segment version {version}")
+
+        self.columns = {}
+        self._blocks = {}
+
+        pos = HEADER.size
+        if version >= 3:
+            self.codec, body_offset, body_size = CODEC.unpack_from(
+                self._view, pos
+            )
+            pos += CODEC.size
+            if self.codec != CODEC_NONE:
+                self._decompress(body_offset, body_size)
+        for _ in range(ncols):
+            type_code, encoding, has_nulls, name_len = COLUMN.unpack_from(
+                self._view, pos
+            )
+            pos += COLUMN.size
+            name = str(self._view[pos : pos + name_len], "utf-8")
+            pos += name_len
+            offset, length = BLOCK.unpack_from(self._view, pos)
+            pos += BLOCK.size
+
+            self.columns[name] = CODE_TYPES[type_code]
+            self._blocks[name] = (offset, length, encoding, bool(has_nulls))
+
+        # column -> (offset, length) of its index image
+        self.indexes = {}
+        if version >= 2:
+            (count,) = COUNT.unpack_from(self._view, pos)
+            pos += COUNT.size
+            for _ in range(count):
+                (name_len,) = NAME.unpack_from(self._view, pos)
+                pos += NAME.size
+                name = str(self._view[pos : pos + name_len], "utf-8")
+                pos += name_len
+                self.indexes[name] = BLOCK.unpack_from(self._view, pos)
+                pos += BLOCK.size
+
+    def _decompress(self, body_offset, body_size):
+        """Replaces the mapping with the decompressed file image."""
+        image = bytearray(body_offset + body_size)
+        image[:body_offset] = self._view[:body_offset]
+        out = memoryview(image)
+        try:
+            _stream_decompress(
+                self._file, self.codec, body_offset, out[body_offset:]
+            )
+        finally:
+            out.release()
+
+        self._view.release()
+        self._mmap.close()
+        self._mmap = None
+        self._view = memoryview(image)
+        self.raw_size = len(image)
+
+    def block(self, name):
+        """Raw memoryview of a column block (valid until close)."""
+        offset, length, _, _ = self._blocks[name]
+        return self._view[offset : offset + length]
+
+    def column(self, name):
+        _, _, encoding, has_nulls = self._blocks[name]
+        block = self.block(name)
+        try:
+            return decode_column(
+                block, self.row_count, self.columns[name], encoding, has_nulls
+            )
+        finally:
+            block.release()
+
+    def index_image(self, name, keys):
+        """
+        Maps an index image back using the decoded key column. Returns
+        (keys, ids, bounds): row ids grouped by key with one key per
+        bucket, and the bucket boundaries, or bounds=None when every
+        bucket has one row. ids is None when it is every row in order.
+        """
+        offset, _ = self.indexes[name]
+        kind, nids, nbounds = IMAGE.unpack_from(self._view, offset)
+        pos = offset + IMAGE.size
+
+        if kind == IMAGE_DENSE:
+            return keys, None, None
+
+        ids = _cast(self._view[pos : pos + 4 * nids], "I").tolist()
+        pos += 4 * nids
+        if kind == IMAGE_UNIQUE:
+            return [keys[i] for i in ids], ids, None
+
+        bounds = _cast(self._view[pos : pos + 4 * nbounds], "I").tolist()
+        return [keys[ids[start]] for start in bounds[:-1]], ids, bounds
+
+    def load_with_indexes(self):
+        names = list(self.columns)
+        values = [self.column(name) for name in names]
+        decoded = dict(zip(names, values))
+
+        images = {
+            col: self.index_image(col, decoded[col])
+            for col in self.indexes
+            if col in decoded
+        }
+        return self.columns, self.rows(values), images
+
+    def rows(self, values=None):
+        """Rows as dicts, optionally from already decoded columns."""
+        names = list(self.columns)
+        if values is None:
+            values = [self.column(name) for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def close(self):
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ================= CONVERSION =================
+
+def convert_data_dir(data_dir):
+    """
+    Rewrites every table in data_dir (legacy JSON files, JSON snapshots
+    or JSON segments) in the binary segment format by opening it and
+    forcing a full checkpoint. Returns the number of segments written.
+    """
+    from core.database import Database
+
+    db = Database(data_dir=data_dir)
+    try:
+        stats = db.checkpoint(full=True)
+    finally:
+        db.close()
+
+    return stats["segments_written"] if stats else 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "convert":
+        print("usage: python -m storage.disk convert <data_dir>")
+        sys.exit(2)
 
-        with open(self.path, "r") as f:
-            return json.load(f)
+    count = convert_data_dir(sys.argv[2])
+    print(f"Converted {count} segment(s) to the binary format")
@@ -1,42 +1,178 @@
 # storage/memory.py
 
+from itertools import chain
+
+
+DEFAULT_SEGMENT_ROWS = 4096
+
+
+class Segment:
+    """
+    A fixed-capacity run of rows, the unit of persistence. `dirty` is set
+    whenever a row in it changes; `file` names its last persisted image.
+    `version` counts the changes and, unlike `dirty`, is never reset.
+    `synopsis` (storage.synopsis) summarizes the rows so that scans can
+    skip the segment; None until one is built.
+    """
+
+    __slots__ = ("id", "rows", "dirty", "file", "synopsis", "version")
+
+    def __init__(self, segment_id, rows=None, file=None, synopsis=None):
+        self.id = segment_id
+        self.rows = rows or []
+        self.dirty = file is None
+        self.file = file
+        self.synopsis = synopsis
+        self.version = 0
+
+
 class MemoryStorage:
     """
     Simple in-memory storage for table rows.
     Does not enforce schema or constraints.
+
+    Rows are kept in segments of at most `segment_rows` rows so that
+    persistence can rewrite only the segments touched since the last
+    flush. Rows are core.record records; each one points back at its
+    segment through its `_segment` slot.
     """
 
-    def __init__(self):
-        self._rows = []
+    def __init__(self, segment_rows=DEFAULT_SEGMENT_ROWS):
+        self.segment_rows = segment_rows
+        self._segments = []
+        self._next_segment_id = 0
+        self._count = 0
+
+    # ================= SEGMENTS =================
+
+    def _new_segment(self):
+        segment = Segment(self._next_segment_id)
+        self._next_segment_id += 1
+        self._segments.append(segment)
+        return segment
+
+    def segments(self):
+        return list(self._segments)
+
+    def load_segment(self, segment_id, rows, file=None, synopsis=None):
+        """Adds a persisted segment as is (used when loading from disk)."""
+        segment = Segment(segment_id, rows, file, synopsis)
+        self._segments.append(segment)
+        self._next_segment_id = max(self._next_segment_id, segment_id + 1)
+
+        for row in rows:
+            row._segment = segment
+        self._count += len(rows)
+        return segment
+
+    def touch(self, row: dict, changes: dict = None):
+        """
+        Marks the segment holding row as changed; its synopsis is widened
+        to cover the changed values.
+        """
+        segment = row._segment
+        segment.dirty = True
+        segment.version += 1
+        if changes and segment.synopsis is not None:
+            segment.synopsis.widen(changes)
+
+    def mark_all_dirty(self):
+        for segment in self._segments:
+            segment.dirty = True
+            segment.version += 1
+
+    # ================= ROWS =================
 
     def insert(self, row: dict):
-        self._rows.append(row)
+        if not self._segments or (
+            len(self._segments[-1].rows) >= self.segment_rows
+        ):
+            self._new_segment()
+
+        segment = self._segments[-1]
+        segment.rows.append(row)
+        segment.dirty = True
+        segment.version += 1
+        segment.synopsis = None
+        row._segment = segment
+        self._count += 1
+
+    def insert_many(self, rows):
+        pos = 0
+        while pos < len(rows):
+            if not self._segments or (
+                len(self._segments[-1].rows) >= self.segment_rows
+            ):
+                self._new_segment()
+
+            segment = self._segments[-1]
+            batch = rows[pos : pos + self.segment_rows - len(segment.rows)]
+            segment.rows.extend(batch)
+            segment.dirty = True
+            segment.version += 1
+            segment.synopsis = None
+            for row in batch:
+                row._segment = segment
+            pos += len(batch)
+        self._count += len(rows)
 
     def all(self):
-        return list(self._rows)
+        return list(chain.from_iterable(s.rows for s in self._segments))
+
+    def __len__(self):
+        return self._count
 
     def filter(self, predicate):
-        return [row for row in self._rows if predicate(row)]
+        return [
+            row
+            for segment in self._segments
+            for row in segment.rows
+            if predicate(row)
+        ]
 
     def delete(self, predicate):
-        remaining = []
         deleted = 0
 
-        for row in self._rows:
-            if predicate(row):
-                deleted += 1
-            else:
-                remaining.append(row)
+        for segment in self._segments:
+            remaining = []
+            for row in segment.rows:
+                if predicate(row):
+                    deleted += 1
+                else:
+                    remaining.append(row)
+
+            if len(remaining) != len(segment.rows):
+                segment.rows = remaining
+                segment.dirty = True
+                segment.version += 1
 
-        self._rows = remaining
+        # empty segments simply drop out of the next manifest
+        self._segments = [s for s in self._segments if s.rows]
+        self._count -= deleted
         return deleted
 
+    def remove(self, rows):
+        """Deletes the given stored rows, touching only their segments."""
+        ids = {id(row) for row in rows}
+        affected = {row._segment.id: row._segment for row in rows}
+
+        for segment in affected.values():
+            segment.rows = [r for r in segment.rows if id(r) not in ids]
+            segment.dirty = True
+            segment.version += 1
+
+        self._segments = [s for s in self._segments if s.rows]
+        self._count -= len(ids)
+        return len(ids)
+
     def update(self, predicate, updates: dict):
         updated = 0
 
-        for row in self._rows:
-            if predicate(row):
-                row.update(updates)
-                updated += 1
+        for segment in self._segments:
+            for row in segment.rows:
+                if predicate(row):
+                    row.update(updates)
+                    self.touch(row, updates)
+                    updated += 1
 
         return updated
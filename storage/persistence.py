@@ -2,19 +2,48 @@
 
 import json
 import os
+import time
+
+from storage.disk import DiskStorage, atomic_write
+
+
+MANIFEST_NAME = "CHECKPOINT"
 
 
 class PersistenceManager:
+    """
+    On-disk layout:
+
+        data/CHECKPOINT                        manifest of the last checkpoint
+        data/tables/<t>/manifest.<lsn>.json    segment list of table <t>
+        data/tables/<t>/<segment>.<lsn>.seg    rows of one segment (binary)
+        data/tables/<t>.<p>/...                partition <p> of table <t>
+        data/wal/                              write-ahead log segments
+        data/<t>.json                          legacy single-file tables
+
+    Every file under tables/ is immutable once written: a checkpoint
+    writes new files for changed segments only and the CHECKPOINT swap
+    makes them visible atomically.
+    """
+
     def __init__(self, data_dir="data"):
         self.data_dir = data_dir
+        # totals over every segment read, for compression ratio and
+        # read throughput
+        self.read_stats = {
+            "segments": 0, "raw_bytes": 0, "stored_bytes": 0, "seconds": 0.0,
+        }
+        self.tables_dir = os.path.join(data_dir, "tables")
+        self.wal_dir = os.path.join(data_dir, "wal")
+        self.manifest_path = os.path.join(data_dir, MANIFEST_NAME)
+
         os.makedirs(self.data_dir, exist_ok=True)
+        os.makedirs(self.tables_dir, exist_ok=True)
 
     # ================= SAVE =================
 
-    def save_table(self, table):
-        path = os.path.join(self.data_dir, f"{table.name}.json")
-
-        data = {
+    def table_schema(self, table):
+        return {
             "name": table.name,
             "columns": {
                 col: table.columns[col].__name__
@@ -24,28 +53,143 @@ class PersistenceManager:
             "unique_keys": table.unique_keys,
             "indexes": list(table._indexes.keys()),
             "foreign_keys": table.foreign_keys,
-            "rows": table.rows,
+            "compression": table.compression,
+            "view": table.view,
+            "secondary_indexes": [
+                index.definition() for index in table.secondary.values()
+            ],
+            "partitioning": (
+                table.partitioning.definition()
+                if table.partitioning is not None else None
+            ),
+            "partition_of": table.partition_of,
+            "bloom_filters": table.bloom_filters,
         }
 
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+    def write_segment(
+        self, table_name, segment_id, columns, rows, lsn, indexes=(),
+        compression=None,
+    ):
+        """
+        Writes a segment with an index image for each of indexes.
+        Returns (relpath, raw bytes, stored bytes).
+        """
+        self._table_dir(table_name)
+        relpath = f"{table_name}/{segment_id}.{lsn}.seg"
+
+        raw, stored = DiskStorage(self.table_path(relpath), compression).save(
+            columns, rows, indexes
+        )
+        return relpath, raw, stored
+
+    def write_table_manifest(self, schema, segments, lsn):
+        """
+        segments: [{"id", "file", "synopsis"}] in storage order; the
+        synopsis (storage.synopsis) lets scans skip a segment unread.
+        """
+        return self._write_json(
+            schema["name"],
+            f"manifest.{lsn}.json",
+            {"schema": schema, "segments": segments},
+        )
+
+    def _table_dir(self, table_name):
+        os.makedirs(os.path.join(self.tables_dir, table_name), exist_ok=True)
+
+    def _write_json(self, table_name, filename, data):
+        self._table_dir(table_name)
+        relpath = f"{table_name}/{filename}"
+
+        atomic_write(
+            self.table_path(relpath),
+            json.dumps(data, separators=(",", ":")).encode("utf-8"),
+        )
+        return relpath
+
+    def write_manifest(self, manifest):
+        atomic_write(
+            self.manifest_path,
+            json.dumps(manifest, indent=2).encode("utf-8"),
+        )
 
     # ================= LOAD =================
 
+    def read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def table_path(self, relpath):
+        return os.path.join(self.tables_dir, *relpath.split("/"))
+
+    def read_file(self, relpath):
+        with open(self.table_path(relpath), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def read_segment(self, relpath):
+        """
+        Returns (columns, rows, index images) of a segment file. Older
+        JSON segments carry neither column types nor index images.
+        """
+        if relpath.endswith(".json"):
+            return None, self.read_file(relpath), {}
+
+        started = time.perf_counter()
+        with DiskStorage(self.table_path(relpath)).open() as reader:
+            result = reader.load_with_indexes()
+            stats = self.read_stats
+            stats["segments"] += 1
+            stats["raw_bytes"] += reader.raw_size
+            stats["stored_bytes"] += reader.stored_size
+        stats["seconds"] += time.perf_counter() - started
+        return result
+
     def load_table(self, path):
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
 
-        columns = {
+        return data, self.load_columns(data)
+
+    def load_columns(self, schema):
+        return {
             name: self._map_type(dtype)
-            for name, dtype in data["columns"].items()
+            for name, dtype in schema["columns"].items()
         }
 
-        return data, columns
+    # ================= CLEANUP =================
+
+    def remove_unreferenced(self, live, tables):
+        """
+        Deletes files of the given tables that are not in the set of
+        live paths, plus single-file snapshots from the older layout.
+        """
+        for table_name in os.listdir(self.tables_dir):
+            path = os.path.join(self.tables_dir, table_name)
+            if not os.path.isdir(path) and table_name not in live:
+                os.remove(path)
+
+        for table_name in tables:
+            table_dir = os.path.join(self.tables_dir, table_name)
+            if not os.path.isdir(table_dir):
+                continue
+
+            for filename in os.listdir(table_dir):
+                if f"{table_name}/{filename}" not in live:
+                    os.remove(os.path.join(table_dir, filename))
+
+            if not os.listdir(table_dir):
+                os.rmdir(table_dir)
+
+    def remove_legacy_tables(self):
+        for filename in self.list_tables():
+            os.remove(os.path.join(self.data_dir, filename))
 
     # ================= UTIL =================
 
     def list_tables(self):
+        """Legacy single-file tables from before checkpoints existed."""
         return [
             f for f in os.listdir(self.data_dir)
             if f.endswith(".json")
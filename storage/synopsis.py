@@ -0,0 +1,211 @@
+# storage/synopsis.py
+
+import base64
+from bisect import bisect_left, bisect_right
+from hashlib import blake2b
+
+
+# Bloom filter size and probes: ~1.7% false positives
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 3
+
+# join keys looked up one by one in a block's Bloom filter, at most
+BLOOM_PROBE_KEYS = 64
+
+
+class BloomFilter:
+    """
+    Set membership with false positives only, over the distinct values
+    of one column of a block. Hashes are stable across processes, so
+    filters can be persisted.
+    """
+
+    __slots__ = ("bits", "size")
+
+    def __init__(self, bits: bytearray):
+        self.bits = bits
+        self.size = len(bits) * 8
+
+    @classmethod
+    def of(cls, values):
+        values = set(values)
+        size = max(64, len(values) * BLOOM_BITS_PER_KEY)
+        bloom = cls(bytearray((size + 7) // 8))
+        for value in values:
+            bloom.add(value)
+        return bloom
+
+    def _positions(self, value):
+        digest = blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        h = int.from_bytes(digest, "little")
+        first, step = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(first + i * step) % self.size for i in range(BLOOM_HASHES)]
+
+    def add(self, value):
+        bits = self.bits
+        for pos in self._positions(value):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all(
+            bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value)
+        )
+
+    def to_json(self):
+        return base64.b64encode(bytes(self.bits)).decode("ascii")
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(bytearray(base64.b64decode(data)))
+
+
+class Synopsis:
+    """
+    What is known about the rows of one block (a storage segment)
+    without reading them: per column the smallest and largest non-NULL
+    value and whether NULLs occur (a zone map), plus a Bloom filter for
+    selected columns. Scans skip blocks whose synopsis rules out a
+    match.
+
+    A synopsis may cover more than the block holds, never less: it
+    stays valid when rows are deleted, and widen() extends it to
+    updated values.
+    """
+
+    __slots__ = ("zones", "blooms")
+
+    def __init__(self, zones: dict, blooms: dict = None):
+        # column -> [min, max, has NULLs]; min and max None if all NULL
+        self.zones = zones
+        self.blooms = blooms or {}
+
+    # ================= MAINTENANCE =================
+
+    def widen(self, values: dict):
+        """Covers a row (or updated columns) written into the block."""
+        for col, value in values.items():
+            zone = self.zones.get(col)
+            if zone is None:
+                continue
+            if value is None:
+                zone[2] = True
+                continue
+            if zone[0] is None or value < zone[0]:
+                zone[0] = value
+            if zone[1] is None or value > zone[1]:
+                zone[1] = value
+            bloom = self.blooms.get(col)
+            if bloom is not None:
+                bloom.add(value)
+
+    # ================= PRUNING =================
+
+    def may_match(self, where) -> bool:
+        """False if no row of the block can match a bound WHERE tree."""
+        if where is None:
+            return True
+
+        op = where["op"]
+        if op == "AND":
+            return self.may_match(where["left"]) and self.may_match(
+                where["right"]
+            )
+        if op == "OR":
+            return self.may_match(where["left"]) or self.may_match(
+                where["right"]
+            )
+
+        zone = self.zones.get(where["left"])
+        value = where["right"]
+        if value is None:
+            # a comparison with NULL is never true
+            return False
+        if zone is None:
+            return True
+
+        low, high, _ = zone
+        try:
+            if op == "=":
+                if low is None or value < low or value > high:
+                    return False
+                bloom = self.blooms.get(where["left"])
+                return bloom is None or value in bloom
+            if op == "!=":
+                # NULLs never match, so all-NULL and all-equal blocks fail
+                return low is not None and (low != value or high != value)
+            if low is None:
+                return False
+            if op == "<":
+                return low < value
+            if op == ">":
+                return high > value
+        except TypeError:
+            # literal of another type: leave it to the scan
+            return True
+        return True
+
+    def may_contain(self, column, keys) -> bool:
+        """
+        False if no value of column in the block is one of keys (a
+        sorted list without NULLs), as for the probe side of a join.
+        """
+        zone = self.zones.get(column)
+        if zone is None:
+            return True
+        low, high, _ = zone
+        if low is None:
+            return False
+
+        start = bisect_left(keys, low)
+        end = bisect_right(keys, high)
+        if start == end:
+            return False
+
+        bloom = self.blooms.get(column)
+        if bloom is None or end - start > BLOOM_PROBE_KEYS:
+            return True
+        return any(keys[i] in bloom for i in range(start, end))
+
+    # ================= PERSISTENCE =================
+
+    def to_json(self):
+        data = {"zones": self.zones}
+        if self.blooms:
+            data["blooms"] = {
+                col: bloom.to_json() for col, bloom in self.blooms.items()
+            }
+        return data
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            {col: list(zone) for col, zone in data["zones"].items()},
+            {
+                col: BloomFilter.from_json(bits)
+                for col, bits in data.get("blooms", {}).items()
+            },
+        )
+
+
+def summarize(rows, columns, bloom_columns=()):
+    """
+    Exact synopsis of a block of rows (records or dicts whose values()
+    follow columns).
+    """
+    zones = {}
+    blooms = {}
+
+    by_column = zip(*(row.values() for row in rows))
+    for col, values in zip(columns, by_column):
+        present = [value for value in values if value is not None]
+        if present:
+            nulls = len(present) < len(values)
+            zones[col] = [min(present), max(present), nulls]
+        else:
+            zones[col] = [None, None, True]
+
+        if col in bloom_columns:
+            blooms[col] = BloomFilter.of(present)
+
+    return Synopsis(zones, blooms)
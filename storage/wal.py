@@ -0,0 +1,464 @@
+# storage/wal.py
+
+import json
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: the writer lock is skipped
+    fcntl = None
+
+
+DEFAULT_SEGMENT_SIZE = 4 * 1024 * 1024
+DEFAULT_FLUSH_INTERVAL = 0.010
+DEFAULT_QUEUE_SIZE = 10000
+
+DURABILITY_MODES = ("sync", "async")
+
+LOCK_FILE = "LOCK"
+
+# writer queue markers
+_ROTATE = "rotate"
+_FLUSH = "flush"
+_STOP = "stop"
+
+
+class WALError(Exception):
+    pass
+
+
+class LogLockedError(WALError):
+    """Another log instance owns the directory (see WriteAheadLog.lock)."""
+
+
+class LogGapError(WALError):
+    """Records a tailer still needed were truncated away."""
+
+
+def _acquire_writer_lock(log_dir):
+    """
+    Takes the exclusive writer lock of a log directory and returns the
+    open lock file, which holds it until closed. The lock belongs to
+    that file, not to the process: a second log opened on the same
+    directory, in this process or another, is refused.
+    """
+    if fcntl is None:
+        return None
+
+    f = open(os.path.join(log_dir, LOCK_FILE), "a+b")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        raise LogLockedError(
+            f"Log '{log_dir}' is owned by another writer"
+        ) from None
+    return f
+
+
+def list_segments(log_dir):
+    """Returns [(first_lsn, path)] of the log segments in LSN order."""
+    result = []
+    for filename in os.listdir(log_dir):
+        if filename.endswith(".log"):
+            first = int(filename[: -len(".log")])
+            result.append((first, os.path.join(log_dir, filename)))
+    return sorted(result)
+
+
+def _parse(line):
+    if not line.endswith(b"\n"):
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+class WriteAheadLog:
+    """
+    Append-only log of logical changes, one JSON record per line.
+
+    The log is split into segment files named after the first LSN they
+    contain, so everything covered by a checkpoint can be dropped by
+    deleting whole files. A torn record at the tail of the last segment
+    (crash mid-write) is ignored on replay.
+
+    Records are written by a single background writer thread that drains
+    a bounded queue (appends block while it is full) and fsyncs once per
+    batch:
+
+        "sync"   callers wait in wait_durable() until their record is
+                 fsynced; concurrent writers share one fsync
+        "async"  callers return at once; the writer flushes every
+                 flush_interval seconds
+    """
+
+    def __init__(
+        self,
+        log_dir,
+        segment_size=DEFAULT_SEGMENT_SIZE,
+        durability="sync",
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        queue_size=DEFAULT_QUEUE_SIZE,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise WALError(f"Unknown durability mode '{durability}'")
+
+        self.log_dir = log_dir
+        self.segment_size = segment_size
+        self.durability = durability
+        self.flush_interval = flush_interval
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        self.last_lsn = 0
+        self.durable_lsn = 0
+        self.bytes_since_checkpoint = 0
+
+        self._file = None
+        self._segment_bytes = 0
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._append_lock = threading.Lock()
+        self._durable = threading.Condition()
+        self._error = None
+        self._writer = None
+        # open LOCK file while this log is the writer (see lock())
+        self._lock_file = None
+        self._locked = False
+
+    # ================= SEGMENTS =================
+
+    def _segment_path(self, first_lsn):
+        return os.path.join(self.log_dir, f"{first_lsn:020d}.log")
+
+    def segments(self):
+        """Returns [(first_lsn, path)] in LSN order."""
+        return list_segments(self.log_dir)
+
+    def _open_segment(self, first_lsn):
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+        path = self._segment_path(first_lsn)
+        self._file = open(path, "ab")
+        self._segment_bytes = self._file.tell()
+
+    # ================= WRITE =================
+
+    def lock(self):
+        """
+        Claims the log for this instance; raises LogLockedError if
+        another one (in any process) is the writer. open() needs the
+        lock.
+        """
+        if not self._locked:
+            self._lock_file = _acquire_writer_lock(self.log_dir)
+            self._locked = True
+
+    def open(self, last_lsn):
+        """
+        Starts appending after last_lsn, the highest LSN seen during
+        recovery (replayed record or checkpoint).
+        """
+        self.lock()
+
+        segments = self.segments()
+        if segments:
+            self._repair_tail(segments[-1][1])
+
+        self.last_lsn = last_lsn
+        self.durable_lsn = last_lsn
+        self._open_segment(self.last_lsn + 1)
+
+        self._writer = threading.Thread(
+            target=self._run, name="wal-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _repair_tail(self, path):
+        """Cuts a torn record off the end of a segment."""
+        valid = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if _parse(line) is None:
+                    break
+                valid += len(line)
+
+        if valid < os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(valid)
+
+    def append(self, record: dict) -> int:
+        """
+        Queues a record and returns its LSN. Blocks while the queue is
+        full; durability is only guaranteed after wait_durable(lsn).
+        """
+        self._check()
+
+        with self._append_lock:
+            self.last_lsn += 1
+            lsn = self.last_lsn
+            record = {"lsn": lsn, **record}
+            data = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+
+            self.bytes_since_checkpoint += len(data)
+            self._queue.put((lsn, data))
+
+        return lsn
+
+    def wait_durable(self, lsn):
+        """Blocks until every record up to lsn is fsynced."""
+        with self._durable:
+            while self.durable_lsn < lsn and self._error is None:
+                self._durable.wait()
+        self._check()
+
+    @property
+    def is_open(self):
+        return self._writer is not None
+
+    def _check(self):
+        if self._error is not None:
+            raise WALError(f"Log writer failed: {self._error}")
+        if self._writer is None:
+            raise WALError("Log is not open")
+
+    def _control(self, marker):
+        """Queues a marker behind every record appended so far."""
+        self._check()
+        with self._append_lock:
+            lsn = self.last_lsn
+            self._queue.put((marker, lsn))
+        return lsn
+
+    def rotate(self):
+        """Starts a new segment after the records appended so far."""
+        self.wait_durable(self._control(_ROTATE))
+
+    def begin_checkpoint(self) -> int:
+        """
+        Seals the current segment so that everything up to the returned
+        LSN can be truncated once the checkpoint is durable.
+        """
+        lsn = self._control(_ROTATE)
+        self.wait_durable(lsn)
+        self.bytes_since_checkpoint = 0
+        return lsn
+
+    def sync(self):
+        self.wait_durable(self._control(_FLUSH))
+
+    def close(self):
+        """
+        Flushes everything queued, stops the writer thread and releases
+        the writer lock.
+        """
+        if self._writer is not None:
+            if self._error is None:
+                self._queue.put((_STOP, self.last_lsn))
+            self._writer.join()
+            self._writer = None
+
+            if self._file:
+                self._file.close()
+                self._file = None
+
+        if self._locked:
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+            self._locked = False
+
+    # ================= WRITER =================
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+
+            if self.durability == "async" and batch[0][0] not in (
+                _FLUSH, _STOP
+            ):
+                # let more records pile up before paying for an fsync
+                time.sleep(self.flush_interval)
+
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                stop = self._write_batch(batch)
+            except OSError as e:
+                with self._durable:
+                    self._error = e
+                    self._durable.notify_all()
+                return
+
+    def _write_batch(self, batch):
+        durable = self.durable_lsn
+        stop = False
+
+        for first, second in batch:
+            if first == _ROTATE:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._open_segment(second + 1)
+                durable = max(durable, second)
+                continue
+
+            if first in (_FLUSH, _STOP):
+                durable = max(durable, second)
+                stop = stop or first == _STOP
+                continue
+
+            lsn, data = first, second
+            if self._segment_bytes >= self.segment_size:
+                self._open_segment(lsn)
+            self._file.write(data)
+            self._segment_bytes += len(data)
+            durable = lsn
+
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        with self._durable:
+            self.durable_lsn = durable
+            self._durable.notify_all()
+        return stop
+
+    # ================= READ =================
+
+    def read_from(self, after_lsn):
+        """Yields records with lsn > after_lsn, in order."""
+        segments = self.segments()
+
+        for i, (first, path) in enumerate(segments):
+            # skip segments that end before after_lsn
+            if i + 1 < len(segments) and segments[i + 1][0] <= after_lsn + 1:
+                continue
+
+            with open(path, "rb") as f:
+                for line in f:
+                    record = _parse(line)
+                    if record is None:
+                        # torn write at the tail of the log
+                        break
+                    if record["lsn"] > after_lsn:
+                        yield record
+
+    # ================= TRUNCATE =================
+
+    def truncate(self, upto_lsn):
+        """Deletes segments whose records are all <= upto_lsn."""
+        segments = self.segments()
+
+        for i, (first, path) in enumerate(segments):
+            if i + 1 >= len(segments):
+                break
+            if segments[i + 1][0] - 1 <= upto_lsn:
+                os.remove(path)
+
+
+class LogTailer:
+    """
+    Follows a log written by another process: poll() returns the
+    complete records appended since the last call, in LSN order.
+
+    Segment files are read from where the previous poll stopped; an
+    incomplete last line (a write in progress) is left for the next
+    poll. The writer only starts a segment after finishing the previous
+    one, so the tailer moves on once a newer segment exists. An open
+    segment stays readable after the writer deletes it; when records
+    were truncated before they were read, poll() raises LogGapError.
+    """
+
+    def __init__(self, log_dir, after_lsn):
+        self.log_dir = log_dir
+        self.last_lsn = after_lsn
+
+        self._file = None
+        self._first = None    # first LSN of the open segment
+        self._offset = 0
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _open(self, first, path):
+        self.close()
+        try:
+            self._file = open(path, "rb")
+        except FileNotFoundError:
+            raise LogGapError(f"Log segment {first} was removed") from None
+        self._first = first
+        self._offset = 0
+
+    def _open_first(self):
+        """Opens the segment holding last_lsn + 1, if it exists yet."""
+        wanted = self.last_lsn + 1
+        segments = list_segments(self.log_dir)
+        if not segments:
+            return False
+        if segments[0][0] > wanted:
+            raise LogGapError(
+                f"Log starts at LSN {segments[0][0]}, need {wanted}"
+            )
+
+        first, path = [s for s in segments if s[0] <= wanted][-1]
+        self._open(first, path)
+        return True
+
+    def _next_segment(self):
+        for first, path in list_segments(self.log_dir):
+            if first > self._first:
+                return first, path
+        return None
+
+    def _read(self, records):
+        self._file.seek(self._offset)
+        for line in self._file:
+            record = _parse(line)
+            if record is None:
+                # written only partly so far
+                break
+            self._offset += len(line)
+
+            lsn = record["lsn"]
+            if lsn <= self.last_lsn:
+                continue
+            if lsn != self.last_lsn + 1:
+                raise LogGapError(
+                    f"Log jumps from LSN {self.last_lsn} to {lsn}"
+                )
+            self.last_lsn = lsn
+            records.append(record)
+
+    def poll(self):
+        records = []
+        if self._file is None and not self._open_first():
+            return records
+
+        while True:
+            self._read(records)
+
+            following = self._next_segment()
+            if following is None:
+                return records
+
+            # the writer has moved on, so this segment is complete
+            self._read(records)
+            if following[0] != self.last_lsn + 1:
+                raise LogGapError(
+                    f"Log segment {following[0]} follows LSN "
+                    f"{self.last_lsn}"
+                )
+            self._open(*following)
@@ -11,3 +11,75 @@ users.insert({"id": 1, "name": "Alice"})
 users.insert({"id": 2, "name": "Bob"})
 
 print(users.select())
+
+# comparisons with NULL are false, interpreted or compiled
+from sql.expressions import SQLExecutionError, compile_where, evaluate_where
+
+scores = Table(name="scores", columns={"id": int, "v": int, "tag": str})
+scores.insert({"id": 1, "v": 5, "tag": "a"})
+scores.insert({"id": 2, "v": None, "tag": None})
+
+for op in ("=", "!=", "<", ">"):
+    for col, value in (("v", 10), ("tag", "b")):
+        where = {"op": op, "left": col, "right": value}
+        assert 2 not in [row["id"] for row in scores.select(where)]
+        assert not evaluate_where(where, {"v": None, "tag": None})
+        assert not compile_where(where)({"v": None, "tag": None})
+
+try:
+    evaluate_where({"op": "<", "left": "v", "right": "x"}, {"v": 5})
+except SQLExecutionError:
+    pass
+else:
+    raise AssertionError("mistyped comparison did not raise")
+
+# an index on a partitioned table survives a restart
+import shutil
+import tempfile
+
+from core.database import Database
+from sql.executor import SQLExecutor
+from sql.parser import SQLParseError, SQLParser
+
+data_dir = tempfile.mkdtemp()
+try:
+    db = Database(data_dir=data_dir)
+    run = lambda q: SQLExecutor(db).execute(SQLParser().parse(q))
+    run(
+        "CREATE TABLE ev (ts INT, kind TEXT) PARTITION BY RANGE (ts) "
+        "(PARTITION p0 VALUES LESS THAN (100), "
+        "PARTITION p1 VALUES LESS THAN (200));"
+    )
+    run("INSERT INTO ev VALUES (50, 'a');")
+    run("INSERT INTO ev VALUES (150, 'b');")
+    run("CREATE INDEX kind_idx ON ev (kind);")
+    db.close()
+
+    db = Database(data_dir=data_dir)
+    assert "kind_idx" in db.get_table("ev").secondary
+    assert run("SELECT ts FROM ev WHERE kind = 'b';") == [{"ts": 150}]
+    db.close()
+finally:
+    shutil.rmtree(data_dir)
+
+# clause keywords inside quoted values are values
+parser = SQLParser()
+for keyword in ("limit", "order", "LIMIT"):
+    query = parser.parse(f"SELECT * FROM t WHERE status = '{keyword}';")
+    assert query["where"]["right"] == keyword
+    assert query["limit"] is None and query["order_by"] is None
+
+query = parser.parse(
+    "SELECT * FROM t WHERE status = 'order' ORDER BY id DESC LIMIT 2;"
+)
+assert query["order_by"] == [("id", True)] and query["limit"] == 2
+
+query = parser.parse("SELECT * FROM t WHERE s = 'group';")
+assert query["where"]["right"] == "group" and query["group_by"] is None
+for bad in ("SELECT s FROM t GROUP BY LIMIT 5;", "SELECT s FROM t GROUP;"):
+    try:
+        parser.parse(bad)
+    except SQLParseError:
+        pass
+    else:
+        raise AssertionError(f"{bad} parsed")
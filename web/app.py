@@ -1,14 +1,42 @@
+import atexit
+import os
+
 from flask import Flask, request, render_template
 from core.database import Database
 from sql.parser import SQLParser, SQLParseError
 from sql.executor import SQLExecutor, SQLExecutionError
+from sql.admission import DEFAULT_HEAVY_QUERIES
+from sql.cancel import parse_timeout
+from sql.spill import DEFAULT_MEMORY_LIMIT, DEFAULT_QUERY_MEMORY
 
 app = Flask(__name__)
 
-# Shared RDBMS components (same engine as REPL)
-db = Database()
+# Shared RDBMS components (same engine as REPL). Writes are not routed
+# between processes, so the app runs as one worker: a second writer
+# fails to start. Read-only replicas set RDMS_ROLE=follower.
+db = Database(
+    durability=os.environ.get("RDMS_DURABILITY", "sync"),
+    role=os.environ.get("RDMS_ROLE", "writer"),
+)
+atexit.register(db.close)
 parser = SQLParser()
-executor = SQLExecutor(db)
+executor = SQLExecutor(
+    db,
+    parallelism=int(os.environ.get("RDMS_PARALLELISM", "1")),
+    query_memory=int(
+        os.environ.get("RDMS_QUERY_MEMORY", DEFAULT_QUERY_MEMORY)
+    ),
+    memory_limit=int(
+        os.environ.get("RDMS_MEMORY_LIMIT", DEFAULT_MEMORY_LIMIT)
+    ),
+    statement_timeout=parse_timeout(
+        os.environ.get("RDMS_STATEMENT_TIMEOUT", "30s")
+    ),
+    heavy_queries=int(
+        os.environ.get("RDMS_HEAVY_QUERIES", DEFAULT_HEAVY_QUERIES)
+    ),
+    adaptive_indexes=os.environ.get("RDMS_ADAPTIVE_INDEXES") == "1",
+)
 
 
 @app.route("/", methods=["GET", "POST"])